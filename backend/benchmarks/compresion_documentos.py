@@ -0,0 +1,136 @@
+"""Benchmark de compresión del contenido de los documentos generados.
+
+Uso (desde backend/):
+
+    python -m benchmarks.compresion_documentos --documentos 2000 --umbral 512
+
+Genera documentos sintéticos con la forma de cada tipo de respuesta y texto en español,
+y compara el espacio ahorrado y el costo de comprimir y descomprimir con zlib, zlib con
+un diccionario entrenado con documentos de muestra y, si están instalados, lz4 (el
+algoritmo que usa PostgreSQL para la columna) y zstd con diccionario. `--umbral`
+simula toast_tuple_target: solo se comprimen los documentos más grandes que el umbral.
+"""
+import argparse
+import json
+import random
+import time
+import zlib
+from services.ai_content_service.providers import instancia_de_esquema
+from services.ai_content_service.schemas import (
+    DetallesCampana,
+    PublicoUbicaciones,
+    FormatoCTA,
+    ContenidoCreativo,
+    Encabezados,
+)
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+TIPOS = {
+    "definir_campana": DetallesCampana,
+    "definir_publico_ubicaciones": PublicoUbicaciones,
+    "elegir_formato_cta": FormatoCTA,
+    "crear_contenido_creativo": ContenidoCreativo,
+    "create_heading": Encabezados,
+}
+
+PALABRAS = (
+    "campaña anuncio producto público objetivo marca calidad oferta descubre nuevo mejor precio "
+    "envío gratis clientes jóvenes adultos intereses compra online tienda estilo vida experiencia "
+    "sabor natural café altura tecnología moda hogar familia ahorro exclusivo temporada lanzamiento "
+    "conversión alcance presupuesto semanas redes sociales Instagram Facebook TikTok video imagen "
+    "llamada acción ahora hoy aprovecha únete conoce más para con sin de la el los las un una que y en"
+).split()
+
+def frase(rnd: random.Random) -> str:
+    palabras = [rnd.choice(PALABRAS) for _ in range(rnd.randint(4, 28))]
+    return " ".join(palabras).capitalize() + "."
+
+def en_espanol(valor, rnd: random.Random):
+    """Reemplaza los textos de relleno del esquema por frases en español."""
+    if isinstance(valor, dict):
+        return {clave: en_espanol(v, rnd) for clave, v in valor.items()}
+    if isinstance(valor, list):
+        return [en_espanol(v, rnd) for v in valor]
+    if isinstance(valor, str):
+        return frase(rnd)
+    return valor
+
+def documentos(cantidad: int, semilla: int) -> list:
+    rnd = random.Random(semilla)
+    esquemas = {tipo: modelo.model_json_schema() for tipo, modelo in TIPOS.items()}
+    generados = []
+    for i in range(cantidad):
+        tipo = list(TIPOS)[i % len(TIPOS)]
+        pistas = {"encabezados": rnd.randint(5, 40)}
+        contenido = en_espanol(instancia_de_esquema(esquemas[tipo], rnd, pistas), rnd)
+        generados.append(json.dumps(contenido, ensure_ascii=False).encode("utf-8"))
+    return generados
+
+def codecs(muestras: list) -> dict:
+    """(comprimir, descomprimir) por algoritmo; los diccionarios se entrenan con `muestras`."""
+    # zlib acepta hasta 32 KB de diccionario: las secuencias más útiles van al final
+    diccionario = b"".join(muestras)[-32768:]
+    resultado = {
+        "zlib-6": (lambda d: zlib.compress(d, 6), zlib.decompress),
+        "zlib-6+dict": (
+            lambda d: _zlib_dict(d, diccionario),
+            lambda d: zlib.decompressobj(zdict=diccionario).decompress(d),
+        ),
+    }
+    if lz4 is not None:
+        resultado["lz4"] = (lz4.frame.compress, lz4.frame.decompress)
+    if zstandard is not None:
+        entrenado = zstandard.train_dictionary(16384, muestras)
+        compresor = zstandard.ZstdCompressor(level=3, dict_data=entrenado)
+        descompresor = zstandard.ZstdDecompressor(dict_data=entrenado)
+        resultado["zstd-3+dict"] = (compresor.compress, descompresor.decompress)
+    return resultado
+
+def _zlib_dict(datos: bytes, diccionario: bytes) -> bytes:
+    compresor = zlib.compressobj(6, zdict=diccionario)
+    return compresor.compress(datos) + compresor.flush()
+
+def medir(docs: list, umbral: int, comprimir, descomprimir) -> tuple:
+    """(bytes almacenados, µs por documento al comprimir, µs por documento al descomprimir)."""
+    grandes = [doc for doc in docs if len(doc) > umbral]
+    inicio = time.perf_counter()
+    comprimidos = [comprimir(doc) for doc in grandes]
+    codificar = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    for comprimido, original in zip(comprimidos, grandes):
+        assert descomprimir(comprimido) == original
+    decodificar = time.perf_counter() - inicio
+    # Como en TOAST, un valor que no se achica se guarda sin comprimir
+    almacenado = sum(min(len(c), len(o)) for c, o in zip(comprimidos, grandes))
+    almacenado += sum(len(doc) for doc in docs if len(doc) <= umbral)
+    por_doc = 1e6 / max(1, len(grandes))
+    return almacenado, codificar * por_doc, decodificar * por_doc
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documentos", type=int, default=2000)
+    parser.add_argument("--umbral", type=int, default=512, help="Bytes; 0 comprime todo")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    docs = documentos(args.documentos, args.semilla)
+    # El diccionario se entrena con documentos distintos de los que se miden
+    muestras = documentos(200, args.semilla + 1)
+    total = sum(len(doc) for doc in docs)
+    tamanos = sorted(len(doc) for doc in docs)
+    print(f"{len(docs)} documentos, {total / 1024:.0f} KB, mediana {tamanos[len(tamanos) // 2]} B, "
+          f"{sum(t > args.umbral for t in tamanos) / len(tamanos):.0%} sobre el umbral de {args.umbral} B\n")
+    print(f"{'algoritmo':<12} | {'almacenado':>10} | {'ahorro':>6} | {'comprimir':>11} | {'descomprimir':>12}")
+    for nombre, (comprimir, descomprimir) in codecs(muestras).items():
+        almacenado, codificar, decodificar = medir(docs, args.umbral, comprimir, descomprimir)
+        print(f"{nombre:<12} | {almacenado / 1024:>7.0f} KB | {1 - almacenado / total:>6.1%} | "
+              f"{codificar:>8.1f} µs | {decodificar:>9.1f} µs")
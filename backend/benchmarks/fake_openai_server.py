@@ -0,0 +1,133 @@
+"""Servidor falso compatible con la API de OpenAI para pruebas de carga.
+
+Uso:
+    FAKE_OPENAI_LATENCY=1.5 uvicorn benchmarks.fake_openai_server:app --port 9000
+
+Luego arrancar el backend con OPENAI_BASE_URL=http://localhost:9000/v1 y
+ejecutar `locust -f locustfile.py ContentServiceUser`.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Latencia simulada por respuesta (en segundos)
+FAKE_OPENAI_LATENCY = float(os.getenv("FAKE_OPENAI_LATENCY", "1.0"))
+# Fracción de respuestas que fallan con FAKE_OPENAI_ERROR_STATUS (para probar reintentos y circuit breaker)
+FAKE_OPENAI_ERROR_RATE = float(os.getenv("FAKE_OPENAI_ERROR_RATE", "0"))
+FAKE_OPENAI_ERROR_STATUS = int(os.getenv("FAKE_OPENAI_ERROR_STATUS", "503"))
+
+app = FastAPI(title="Fake OpenAI")
+
+# Respuestas válidas para cada uno de los esquemas que piden los handlers
+RESPUESTAS = {
+    "detalles_campana": {
+        "detalles_campana": {
+            "objetivo_campana": {"objetivo": "Ventas", "explicacion": "Impulsar conversiones."},
+            "presupuesto_total": {"cantidad": "1500 soles", "explicacion": "Alcance medio."},
+            "duracion_optima": {"duracion": "4 semanas", "explicacion": "Tiempo de aprendizaje."},
+        }
+    },
+    "publico_objetivo": {
+        "publico_objetivo": {
+            "demografico": {
+                "edad": "25-40",
+                "genero": "Todos",
+                "ubicaciones": [{"distrito": "Miraflores", "provincia": "Lima", "departamento": "Lima"}],
+                "otros": "Profesionales",
+            },
+            "psicografico": {"intereses": "Tecnología", "comportamientos": "Compras en línea"},
+        },
+        "ubicaciones_anuncios": {
+            "ubicaciones_seleccionadas": ["Feed de Instagram", "Feed de Facebook"],
+            "justificacion": "Mayor alcance.",
+        },
+    },
+    "formato_anuncio": {
+        "formato_anuncio": {"formato": "Anuncios en carrusel", "explicacion": "Muestra varios beneficios."},
+        "cta": {"llamada_a_la_accion": "Comprar", "explicacion": "Acción directa."},
+    },
+    "variaciones": {
+        "variaciones": [
+            {"titulo": f"Variación {i}", "contenido": f"Contenido de la variación {i}"}
+            for i in range(1, 4)
+        ]
+    },
+    "encabezados": {
+        "encabezados": [f"Encabezado de prueba {i}" for i in range(1, 11)]
+    },
+}
+
+def elegir_respuesta(prompt: str) -> dict:
+    """Devuelve la respuesta cuyo esquema aparece en el prompt."""
+    pedidos = re.search(r"Número de encabezados: (\d+)", prompt)
+    if pedidos:
+        # Tantos encabezados como pida el prompt, distintos entre llamadas
+        lote = uuid.uuid4().hex[:6]
+        return {"encabezados": [f"Encabezado {lote} {i}" for i in range(1, int(pedidos.group(1)) + 1)]}
+    for clave, respuesta in RESPUESTAS.items():
+        if f'"{clave}"' in prompt:
+            return respuesta
+    return {"resultado": "ok"}
+
+def uso(prompt: str, contenido: str) -> dict:
+    """Conteo aproximado de tokens (4 caracteres por token) con el formato de `usage`."""
+    return {
+        "prompt_tokens": len(prompt) // 4,
+        "completion_tokens": len(contenido) // 4,
+        "total_tokens": len(prompt) // 4 + len(contenido) // 4,
+    }
+
+async def stream_chunks(body: dict, prompt: str, contenido: str, tamano: int = 8):
+    """Emite la respuesta en fragmentos con el formato de streaming de OpenAI."""
+    id_respuesta = f"chatcmpl-{uuid.uuid4().hex}"
+    base = {
+        "id": id_respuesta,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-3.5-turbo"),
+    }
+    for i in range(0, len(contenido), tamano):
+        chunk = {
+            **base,
+            "choices": [{"index": 0, "delta": {"content": contenido[i:i + tamano]}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        await asyncio.sleep(0)
+    if (body.get("stream_options") or {}).get("include_usage"):
+        # Igual que OpenAI: un último chunk sin choices con el uso total
+        yield f"data: {json.dumps({**base, 'choices': [], 'usage': uso(prompt, contenido)})}\n\n"
+    yield "data: [DONE]\n\n"
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    prompt = body["messages"][-1]["content"]
+    await asyncio.sleep(FAKE_OPENAI_LATENCY)
+    if random.random() < FAKE_OPENAI_ERROR_RATE:
+        return JSONResponse(
+            status_code=FAKE_OPENAI_ERROR_STATUS,
+            content={"error": {"message": "Error simulado", "type": "server_error"}},
+            headers={"Retry-After": "1"},
+        )
+    contenido = json.dumps(elegir_respuesta(prompt), ensure_ascii=False)
+    if body.get("stream"):
+        return StreamingResponse(stream_chunks(body, prompt, contenido), media_type="text/event-stream")
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-3.5-turbo"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": contenido},
+            "finish_reason": "stop",
+        }],
+        "usage": uso(prompt, contenido),
+    }
@@ -0,0 +1,37 @@
+"""Benchmark de la extracción de JSON de respuestas del modelo.
+
+Los casos de regresión y el fuzzing están en tests/test_json_repair.py.
+
+Uso (desde backend/):
+
+    python -m benchmarks.json_extraction
+"""
+import time
+from services.ai_content_service.json_repair import extraer_objeto_json
+
+def medir(texto: str, repeticiones: int = 3) -> float:
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        try:
+            extraer_objeto_json(texto)
+        except ValueError:
+            pass
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+def benchmark():
+    """Mide salidas grandes y malformadas; el tiempo debe crecer linealmente con el tamaño."""
+    for tamano in (10_000, 100_000, 1_000_000):
+        escenarios = {
+            "objeto grande con comas finales": '{"items": [' + '{"a": "x", "b": [1, 2,],},' * (tamano // 26) + "]}",
+            "llaves sin cerrar": "{" * tamano,
+            "objetos inválidos repetidos": "{nota} " * (tamano // 7),
+            "cadena truncada": '{"texto": "' + "a" * tamano,
+        }
+        for nombre, texto in escenarios.items():
+            segundos = medir(texto)
+            print(f"{len(texto):>9} chars | {nombre:<32} | {segundos * 1000:9.2f} ms")
+
+if __name__ == "__main__":
+    benchmark()
@@ -1,5 +1,6 @@
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -38,8 +39,40 @@ else:
     )
 
 
-# Crear la sesión de SQLAlchemy
+def convertir_url_async(url: str) -> str:
+    """Traduce la URL síncrona al driver asíncrono equivalente (asyncpg / aiosqlite)."""
+    equivalencias = (
+        ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+        ("postgresql://", "postgresql+asyncpg://"),
+        ("postgres://", "postgresql+asyncpg://"),
+        ("sqlite+pysqlite://", "sqlite+aiosqlite://"),
+        ("sqlite://", "sqlite+aiosqlite://"),
+    )
+    for prefijo, prefijo_async in equivalencias:
+        if url.startswith(prefijo):
+            return prefijo_async + url[len(prefijo):]
+    return url
+
+# URL para el motor asíncrono (se puede sobrescribir con ASYNC_DATABASE_URL)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or convertir_url_async(DATABASE_URL)
+
+if 'sqlite' in ASYNC_DATABASE_URL:
+    async_engine = create_async_engine(ASYNC_DATABASE_URL)
+else:
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_size=20,
+        max_overflow=10,
+        pool_timeout=30,
+        pool_recycle=1800,
+        pool_pre_ping=True
+    )
+
+
+# Crear la sesión de SQLAlchemy (síncrona, usada por scripts y migraciones)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Sesiones asíncronas usadas por los servicios
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 # Dependencia para obtener la sesión de la base de datos
@@ -50,4 +83,7 @@ def get_db():
     finally:
         db.close()
 
-
+# Dependencia para obtener una sesión asíncrona de la base de datos
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -2,9 +2,11 @@ import os
 from dotenv import load_dotenv
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from sqlalchemy.orm import Session
-from common.database.database import get_db
+from jose import JWTError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from common.database.database import get_async_db
+from common.utils.token_verifier import TokenVerifier, revocaciones, digest_token
 from services.auth_service.models import Usuario
 
 # Cargar las variables de entorno desde el archivo .env en la carpeta config
@@ -18,13 +20,20 @@ if not SECRET_KEY:
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+# Verificador con caché: el mismo token se presenta muchas veces durante su vida
+verificador = TokenVerifier(SECRET_KEY, "HS256")
+
 # Middleware para obtener el usuario actual
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=401, detail="No se pudo validar el token", headers={"WWW-Authenticate": "Bearer"},
     )
+    digest = digest_token(token)
+    # El filtro de Bloom local descarta sin consultar Redis los tokens no revocados
+    if await revocaciones.esta_revocado(digest):
+        raise credentials_exception
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        payload = verificador.decodificar(token, digest)
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
@@ -32,7 +41,8 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         raise credentials_exception
 
     # Buscar al usuario en la base de datos
-    usuario = db.query(Usuario).filter(Usuario.email == email).first()
+    result = await db.execute(select(Usuario).where(Usuario.email == email))
+    usuario = result.scalars().first()
     if usuario is None:
         raise credentials_exception
 
@@ -1,4 +1,5 @@
 from .usuario import Usuario
+from .uso import RegistroUso
 from services.ai_content_service.models import Documento
 
 # Puedes agregar más importaciones aquí si tienes otros modelos
\ No newline at end of file
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float
+from common.database.database import Base
+from datetime import datetime, timezone
+
+class RegistroUso(Base):
+    """Libro de uso de IA: una fila por generación facturada. Solo se insertan filas."""
+    __tablename__ = "registros_uso"
+
+    id_registro = Column(Integer, primary_key=True, index=True)
+    # Identificador asignado al encolar: la liquidación puede reintentar un lote sin duplicar filas
+    id_evento = Column(String(32), nullable=True, unique=True, index=True)
+    # Se conserva el registro aunque el usuario se elimine
+    id_usuario = Column(Integer, ForeignKey("usuarios.id_usuario", ondelete="SET NULL"), nullable=True, index=True)
+    endpoint = Column(String, nullable=False)
+    modelo = Column(String, nullable=False)
+    tokens_prompt = Column(Integer, nullable=False)
+    tokens_respuesta = Column(Integer, nullable=False)
+    tokens_total = Column(Integer, nullable=False)
+    costo = Column(Float, nullable=False)
+    fecha = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    fecha_liquidacion = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
@@ -0,0 +1,41 @@
+from collections import defaultdict
+import threading
+
+class Metrics:
+    """Registro en memoria de contadores y gauges del proceso."""
+    _lock = threading.Lock()
+    _counters = defaultdict(int)
+    _gauges = {}
+
+    @classmethod
+    def incr(cls, name: str, value: int = 1):
+        """Incrementa un contador."""
+        with cls._lock:
+            cls._counters[name] += value
+
+    @classmethod
+    def set_gauge(cls, name: str, value: float):
+        """Fija el valor actual de un gauge."""
+        with cls._lock:
+            cls._gauges[name] = value
+
+    @classmethod
+    def get(cls, name: str):
+        """Devuelve el valor de un contador o gauge (0 si no existe)."""
+        with cls._lock:
+            if name in cls._gauges:
+                return cls._gauges[name]
+            return cls._counters.get(name, 0)
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        """Devuelve una copia de todas las métricas registradas."""
+        with cls._lock:
+            return {"counters": dict(cls._counters), "gauges": dict(cls._gauges)}
+
+    @classmethod
+    def reset(cls):
+        """Reinicia todas las métricas."""
+        with cls._lock:
+            cls._counters.clear()
+            cls._gauges.clear()
@@ -0,0 +1,43 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+from fastapi import HTTPException, status
+
+PAGINA_POR_DEFECTO = int(os.getenv("PAGINA_POR_DEFECTO", "20"))
+PAGINA_MAXIMA = int(os.getenv("PAGINA_MAXIMA", "100"))  # Tope duro de elementos por página
+
+# Clave propia para los cursores, derivada de SECRET_KEY (no se reutiliza la de los JWT tal cual)
+_CLAVE_CURSOR = hashlib.sha256(b"cursor:" + os.getenv("SECRET_KEY", "").encode("utf-8")).digest()
+
+def _b64(datos: bytes) -> str:
+    return base64.urlsafe_b64encode(datos).rstrip(b"=").decode("ascii")
+
+def _desde_b64(texto: str) -> bytes:
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+def _firma(listado: str, id_usuario: int, carga: str) -> str:
+    # El listado y el usuario entran en la firma: un cursor no sirve para otro listado ni para otra cuenta
+    mensaje = f"{listado}:{id_usuario}:{carga}".encode("utf-8")
+    return _b64(hmac.new(_CLAVE_CURSOR, mensaje, hashlib.sha256).digest()[:16])
+
+def codificar_cursor(listado: str, id_usuario: int, valores: list) -> str:
+    """Cursor opaco y firmado con la posición (valores de la clave de orden) del último elemento."""
+    carga = _b64(json.dumps(valores, separators=(",", ":")).encode("utf-8"))
+    return f"{carga}.{_firma(listado, id_usuario, carga)}"
+
+def decodificar_cursor(cursor: str, listado: str, id_usuario: int) -> list:
+    """Valores guardados en el cursor. Responde 400 si el cursor fue alterado o es de otro listado."""
+    carga, _, firma = cursor.partition(".")
+    if not carga or not hmac.compare_digest(firma.encode("utf-8"), _firma(listado, id_usuario, carga).encode("utf-8")):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor de paginación inválido.")
+    return json.loads(_desde_b64(carga))
+
+def pagina(filas: list, limite: int, clave) -> dict:
+    """Arma la página a partir de `limite + 1` filas: la fila extra solo indica que hay más.
+
+    `clave(fila)` devuelve el cursor de la fila, que se usa como `next_cursor`.
+    """
+    items = filas[:limite]
+    return {"items": items, "next_cursor": clave(items[-1]) if len(filas) > limite else None}
@@ -1,6 +1,8 @@
 import redis.asyncio as aioredis
-from datetime import timedelta
+from datetime import datetime, timedelta, timezone
 import os
+import json
+import secrets
 import asyncio
 import logging
 
@@ -8,7 +10,19 @@ import logging
 logger = logging.getLogger("uvicorn.error")
 logger.setLevel(logging.INFO)
 
-SESSION_TIMEOUT = timedelta(minutes=30)
+SESSION_TIMEOUT = timedelta(minutes=int(os.getenv("SESSION_TIMEOUT_MINUTES", "30")))
+# El índice de sesiones por usuario vive más que cada sesión; las expiradas se depuran al listar
+SESSION_INDEX_TIMEOUT = timedelta(days=30)
+
+# Reemplaza el JWT solo si la sesión sigue existiendo y renueva su TTL; si expiró no la recrea
+UPDATE_JWT_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'jwt', ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
 
 class SessionManager:
     redis_client = None
@@ -48,32 +62,132 @@ class SessionManager:
             raise Exception("Redis no está inicializado. Llama a 'SessionManager.initialize_redis()' primero.")
         self.redis = SessionManager.redis_client
 
-    async def store_jwt(self, session_id: str, jwt_token: str):
-        """Almacena un JWT asociado a una sesión."""
+    @staticmethod
+    def _session_key(session_id: str) -> str:
+        return f"session:{session_id}"
+
+    @staticmethod
+    def _user_sessions_key(id_usuario: int) -> str:
+        return f"user_sessions:{id_usuario}"
+
+    async def create_session(self, id_usuario: int, jwt_token: str, metadata: dict = None) -> str:
+        """Crea una sesión nueva con un id opaco y aleatorio. Devuelve el session_id.
+
+        La sesión se guarda en `session:{id}` (con su propio TTL) y se registra en el
+        hash `user_sessions:{id_usuario}` para poder listarla y revocarla. Todo se
+        envía en un solo pipeline (un round trip).
+        """
+        session_id = secrets.token_urlsafe(32)
+        ttl = int(SESSION_TIMEOUT.total_seconds())
+        info = {"creada": datetime.now(timezone.utc).isoformat(), **(metadata or {})}
         try:
-            await self.redis.set(session_id, jwt_token, ex=int(SESSION_TIMEOUT.total_seconds()))
-            logger.info(f"JWT almacenado para sesión: {session_id}")
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(self._session_key(session_id), mapping={"jwt": jwt_token, "id_usuario": id_usuario})
+                pipe.expire(self._session_key(session_id), ttl)
+                pipe.hset(self._user_sessions_key(id_usuario), session_id, json.dumps(info))
+                pipe.expire(self._user_sessions_key(id_usuario), int(SESSION_INDEX_TIMEOUT.total_seconds()))
+                await pipe.execute()
+            logger.info(f"Sesión creada para el usuario: {id_usuario}")
+            return session_id
         except Exception as e:
-            logger.error(f"Error almacenando JWT: {e}")
+            logger.error(f"Error creando la sesión: {e}")
             raise
 
-    async def get_jwt(self, session_id: str):
-        """Recupera un JWT asociado a una sesión."""
+    async def get_jwt(self, session_id: str, sliding: bool = True):
+        """Recupera el JWT de una sesión. Con `sliding`, renueva el TTL en el mismo round trip."""
         try:
-            jwt = await self.redis.get(session_id)
-            logger.info(f"JWT recuperado para sesión: {session_id}")
-            return jwt
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.hget(self._session_key(session_id), "jwt")
+                if sliding:
+                    pipe.expire(self._session_key(session_id), int(SESSION_TIMEOUT.total_seconds()))
+                resultados = await pipe.execute()
+            return resultados[0]
         except Exception as e:
             logger.error(f"Error obteniendo JWT: {e}")
             raise
 
-    async def delete_jwt(self, session_id: str):
-        """Elimina un JWT asociado a una sesión."""
+    async def update_jwt(self, session_id: str, jwt_token: str) -> bool:
+        """Reemplaza el JWT de una sesión existente (por ejemplo, al renovarlo) y renueva su TTL.
+
+        Devuelve False si la sesión ya expiró: en ese caso no se crea de nuevo.
+        """
+        try:
+            ttl = int(SESSION_TIMEOUT.total_seconds())
+            return bool(await self.redis.eval(UPDATE_JWT_SCRIPT, 1, self._session_key(session_id), jwt_token, ttl))
+        except Exception as e:
+            logger.error(f"Error actualizando JWT: {e}")
+            raise
+
+    async def list_sessions(self, id_usuario: int) -> list:
+        """Lista las sesiones activas de un usuario y limpia las que ya expiraron."""
+        try:
+            sesiones = await self.redis.hgetall(self._user_sessions_key(id_usuario))
+            if not sesiones:
+                return []
+            ids = list(sesiones)
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for session_id in ids:
+                    pipe.ttl(self._session_key(session_id))
+                ttls = await pipe.execute()
+
+            activas, expiradas = [], []
+            for session_id, ttl in zip(ids, ttls):
+                if ttl is None or ttl < 0:
+                    expiradas.append(session_id)
+                    continue
+                activas.append({"session_id": session_id, "expira_en": ttl, **json.loads(sesiones[session_id])})
+            if expiradas:
+                await self.redis.hdel(self._user_sessions_key(id_usuario), *expiradas)
+            return activas
+        except Exception as e:
+            logger.error(f"Error listando sesiones: {e}")
+            raise
+
+    async def delete_session(self, session_id: str, id_usuario: int = None):
+        """Elimina una sesión. Si se indica `id_usuario`, solo la elimina si le pertenece.
+
+        Devuelve el JWT de la sesión eliminada (para revocarlo) o None si no existía.
+        """
+        try:
+            datos = await self.redis.hgetall(self._session_key(session_id))
+            if not datos:
+                if id_usuario is not None:
+                    await self.redis.hdel(self._user_sessions_key(id_usuario), session_id)
+                return None
+            propietario = int(datos["id_usuario"])
+            if id_usuario is not None and propietario != id_usuario:
+                return None
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(self._session_key(session_id))
+                pipe.hdel(self._user_sessions_key(propietario), session_id)
+                await pipe.execute()
+            logger.info(f"Sesión eliminada: {session_id}")
+            return datos.get("jwt")
+        except Exception as e:
+            logger.error(f"Error eliminando la sesión: {e}")
+            raise
+
+    async def delete_user_sessions(self, id_usuario: int, except_session_id: str = None) -> list:
+        """Elimina todas las sesiones de un usuario (salvo `except_session_id`). Devuelve sus JWT."""
         try:
-            await self.redis.delete(session_id)
-            logger.info(f"JWT eliminado para sesión: {session_id}")
+            ids = [
+                session_id for session_id in await self.redis.hkeys(self._user_sessions_key(id_usuario))
+                if session_id != except_session_id
+            ]
+            if not ids:
+                return []
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for session_id in ids:
+                    pipe.hget(self._session_key(session_id), "jwt")
+                tokens = await pipe.execute()
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(*[self._session_key(session_id) for session_id in ids])
+                pipe.hdel(self._user_sessions_key(id_usuario), *ids)
+                await pipe.execute()
+            logger.info(f"{len(ids)} sesiones eliminadas para el usuario: {id_usuario}")
+            return [token for token in tokens if token]
         except Exception as e:
-            logger.error(f"Error eliminando JWT: {e}")
+            logger.error(f"Error eliminando las sesiones del usuario: {e}")
             raise
 
     @staticmethod
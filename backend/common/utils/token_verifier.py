@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from jose import jwt
+from jose.exceptions import ExpiredSignatureError
+from common.utils.session_manager import SessionManager
+from common.utils.metrics import Metrics
+
+# Configuración básica de logging
+logger = logging.getLogger("uvicorn.error")
+
+TOKEN_CACHE_MAX_ITEMS = int(os.getenv("TOKEN_CACHE_MAX_ITEMS", "10000"))
+REVOCATION_BLOOM_BITS = int(os.getenv("REVOCATION_BLOOM_BITS", str(2 ** 18)))
+REVOCATION_BLOOM_HASHES = int(os.getenv("REVOCATION_BLOOM_HASHES", "7"))
+REVOCATION_SYNC_INTERVAL = float(os.getenv("REVOCATION_SYNC_INTERVAL", "5"))      # Segundos
+# Vida máxima de un token: pasado este tiempo un token revocado ya expiró por sí solo
+REVOCATION_WINDOW = float(os.getenv("REVOCATION_WINDOW", str(30 * 60)))             # Segundos
+
+REVOKED_KEY = "auth:revoked_tokens"  # sorted set: digest -> momento de la revocación
+
+def digest_token(token: str) -> str:
+    """Huella SHA-256 (hex) de un token."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+class BloomFilter:
+    """Filtro de Bloom sobre huellas SHA-256 en hexadecimal."""
+
+    def __init__(self, bits: int = REVOCATION_BLOOM_BITS, hashes: int = REVOCATION_BLOOM_HASHES):
+        self.bits = bits
+        self.hashes = hashes
+        self._datos = bytearray((bits + 7) // 8)
+
+    def _posiciones(self, digest: str):
+        # Cada posición sale de 8 caracteres hex (32 bits) distintos de la huella
+        for i in range(self.hashes):
+            yield int(digest[i * 8:(i + 1) * 8], 16) % self.bits
+
+    def agregar(self, digest: str):
+        for pos in self._posiciones(digest):
+            self._datos[pos >> 3] |= 1 << (pos & 7)
+
+    def contiene(self, digest: str) -> bool:
+        return all(self._datos[pos >> 3] & (1 << (pos & 7)) for pos in self._posiciones(digest))
+
+class RevocationList:
+    """Lista de tokens revocados: filtro de Bloom local respaldado por Redis.
+
+    El filtro local responde "seguro no revocado" sin salir del proceso. Solo los
+    positivos (revocados o falsos positivos) se confirman contra Redis. Se usan dos
+    generaciones que rotan cada REVOCATION_WINDOW para que el filtro no crezca.
+    """
+
+    def __init__(self, window: float = REVOCATION_WINDOW, sync_interval: float = REVOCATION_SYNC_INTERVAL):
+        self.window = window
+        self.sync_interval = sync_interval
+        self._actual = BloomFilter()
+        self._anterior = BloomFilter()
+        self._rotado_en = time.time()
+        self._ultima_sync = None
+        self._tarea_sync = None
+
+    def _rotar_si_corresponde(self):
+        if time.time() - self._rotado_en >= self.window:
+            self._anterior = self._actual
+            self._actual = BloomFilter()
+            self._rotado_en = time.time()
+
+    def agregar_local(self, digest: str):
+        self._rotar_si_corresponde()
+        self._actual.agregar(digest)
+
+    def posiblemente_revocado(self, digest: str) -> bool:
+        return self._actual.contiene(digest) or self._anterior.contiene(digest)
+
+    async def revocar(self, token: str):
+        """Revoca un token en este proceso y lo publica para el resto de workers."""
+        digest = digest_token(token)
+        self.agregar_local(digest)
+        Metrics.incr("revocations.added")
+        redis = SessionManager.redis_client
+        if redis is None:
+            return
+        ahora = time.time()
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.zadd(REVOKED_KEY, {digest: ahora})
+                pipe.zremrangebyscore(REVOKED_KEY, "-inf", ahora - self.window)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error registrando la revocación del token: {e}")
+
+    async def esta_revocado(self, digest: str) -> bool:
+        """Comprueba si un token fue revocado; solo consulta Redis ante un positivo del filtro."""
+        if not self.posiblemente_revocado(digest):
+            return False
+        redis = SessionManager.redis_client
+        if redis is None:
+            return True
+        try:
+            revocado = await redis.zscore(REVOKED_KEY, digest) is not None
+        except Exception as e:
+            # Sin poder confirmar, se asume revocado (falla cerrada)
+            logger.error(f"Error confirmando la revocación del token: {e}")
+            return True
+        if not revocado:
+            Metrics.incr("revocations.false_positive")
+        return revocado
+
+    async def sincronizar(self):
+        """Incorpora al filtro local las revocaciones hechas por otros workers."""
+        redis = SessionManager.redis_client
+        if redis is None:
+            return
+        ahora = time.time()
+        desde = ahora - self.window if self._ultima_sync is None else self._ultima_sync - self.sync_interval
+        digests = await redis.zrangebyscore(REVOKED_KEY, desde, "+inf")
+        for digest in digests:
+            self.agregar_local(digest)
+        self._ultima_sync = ahora
+
+    async def _sincronizar_periodicamente(self):
+        while True:
+            try:
+                await self.sincronizar()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error sincronizando tokens revocados: {e}")
+            await asyncio.sleep(self.sync_interval)
+
+    def iniciar_sync(self):
+        """Arranca la sincronización periódica con Redis."""
+        if self._tarea_sync is None:
+            self._tarea_sync = asyncio.create_task(self._sincronizar_periodicamente())
+
+    async def detener_sync(self):
+        if self._tarea_sync is not None:
+            self._tarea_sync.cancel()
+            try:
+                await self._tarea_sync
+            except asyncio.CancelledError:
+                pass
+            self._tarea_sync = None
+
+class TokenVerifier:
+    """Decodifica JWT memorizando los ya verificados hasta su `exp`."""
+
+    def __init__(self, secret_key: str, algorithm: str = "HS256", max_items: int = TOKEN_CACHE_MAX_ITEMS):
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.max_items = max_items
+        self._verificados = OrderedDict()  # digest -> (exp, payload)
+
+    def decodificar(self, token: str, digest: str = None) -> dict:
+        """Devuelve el payload del token. Lanza JWTError si es inválido o expiró."""
+        digest = digest or digest_token(token)
+        entrada = self._verificados.get(digest)
+        if entrada is not None:
+            exp, payload = entrada
+            if exp is not None and exp <= time.time():
+                del self._verificados[digest]
+                raise ExpiredSignatureError("Signature has expired.")
+            self._verificados.move_to_end(digest)
+            Metrics.incr("token_cache.hit")
+            return dict(payload)
+
+        Metrics.incr("token_cache.miss")
+        payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        self._verificados[digest] = (payload.get("exp"), payload)
+        while len(self._verificados) > self.max_items:
+            self._verificados.popitem(last=False)
+        return dict(payload)
+
+    def olvidar(self, token: str):
+        """Elimina un token de la caché de verificados."""
+        self._verificados.pop(digest_token(token), None)
+
+# Lista de revocaciones compartida por todo el proceso
+revocaciones = RevocationList()
@@ -18,3 +18,80 @@ class AuthServiceUser(HttpUser):
             print("Registro exitoso")
         else:
             print("Error en el registro:", response.json())
+
+class ContentServiceUser(HttpUser):
+    """Mide el throughput concurrente de /content/* por worker.
+
+    Ejecutar contra el servidor falso de OpenAI (ver benchmarks/fake_openai_server.py)
+    para aislar la latencia del modelo del overhead del backend.
+    """
+    wait_time = between(0, 0.5)
+    host = "http://localhost:8000"
+
+    producto = {
+        "nombreProducto": "Zapatillas Andinas",
+        "descripcionProducto": "Zapatillas de trekking hechas con lana de alpaca.",
+    }
+
+    def on_start(self):
+        random_id = random.randint(100000, 999999)
+        register_data = {
+            "nombre": "loaduser",
+            "email": f"loaduser{random_id}@example.com",
+            "password": "password123"
+        }
+        # El registro deja la cookie de sesión en el cliente
+        self.client.post("/auth/register", json=register_data)
+
+    @task(3)
+    def create_heading(self):
+        self.client.post("/content/create_heading", json={
+            **self.producto,
+            "palabrasClave": ["trekking", "alpaca"],
+            "estiloEscritura": "inspirador",
+            "longitudMaxima": 60,
+            "variantes": 5,
+        })
+
+    @task
+    def definir_campana(self):
+        self.client.post("/content/definir_campana", json={
+            **self.producto,
+            "tipoCampana": "Mediana",
+            "duracionPreferida": "Corta",
+        })
+
+    @task
+    def elegir_formato_cta(self):
+        self.client.post("/content/elegir_formato_cta", json=self.producto)
+
+class DataServiceUser(HttpUser):
+    """Carga sobre los endpoints que solo consultan la base de datos.
+
+    Sirve para comparar el throughput entre el motor síncrono y el asíncrono
+    (AsyncSession) con el mismo número de workers.
+    """
+    wait_time = between(0, 0.5)
+    host = "http://localhost:8000"
+
+    def on_start(self):
+        random_id = random.randint(100000, 999999)
+        register_data = {
+            "nombre": "datauser",
+            "email": f"datauser{random_id}@example.com",
+            "password": "password123"
+        }
+        self.client.post("/auth/register", json=register_data)
+        self.client.post("/productos/", json={"nombre": "Producto de carga", "precio": 10.0})
+
+    @task(3)
+    def listar_productos(self):
+        self.client.get("/productos/")
+
+    @task(3)
+    def listar_documentos(self):
+        self.client.get("/documents/")
+
+    @task
+    def check_session(self):
+        self.client.get("/auth/check_session")
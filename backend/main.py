@@ -47,17 +47,45 @@ app.add_middleware(
 @app.on_event("startup")
 async def startup_event():
     from common.utils.session_manager import SessionManager
+    from services.auth_service.principal_cache import principal_cache
+    from common.utils.token_verifier import revocaciones
+    from services.ai_content_service.jobs import job_queue
+    from services.ai_content_service.usage import libro_uso
+    from services.ai_content_service.prompts import registro_prompts
+    # Cargar y compilar las plantillas de prompts (falla al arrancar si alguna es inválida)
+    registro_prompts.cargar()
     try:
         await SessionManager.initialize_redis()
     except Exception as e:
         logger.error(f"Fallo en la inicialización de Redis: {e}")
         # Dependiendo de la lógica, podrías querer terminar la aplicación o manejar el error de otra manera
+    # Escuchar invalidaciones de la caché de usuarios enviadas por otros workers
+    principal_cache.iniciar_listener()
+    # Sincronizar periódicamente el filtro de tokens revocados
+    revocaciones.iniciar_sync()
+    # Workers de la cola de generación asíncrona
+    job_queue.iniciar_workers()
+    # Liquidación del uso de IA (registros y descuento de saldo) por lotes
+    libro_uso.iniciar_liquidacion()
 
 # Cierre de servicios al cerrar la aplicación
 @app.on_event("shutdown")
 async def shutdown_event():
     from common.utils.session_manager import SessionManager
+    from services.ai_content_service.config import close_client
+    from services.auth_service.password_pool import password_pool
+    from services.auth_service.principal_cache import principal_cache
+    from common.utils.token_verifier import revocaciones
+    from services.ai_content_service.jobs import job_queue
+    from services.ai_content_service.usage import libro_uso
+    await job_queue.detener_workers()
+    # Después de los workers, para liquidar también el uso de sus últimos trabajos
+    await libro_uso.detener_liquidacion()
+    await principal_cache.detener_listener()
+    await revocaciones.detener_sync()
     await SessionManager.close_redis()
+    await close_client()
+    password_pool.cerrar()
 
 # Incluir routers
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
@@ -71,6 +99,12 @@ app.include_router(product_router, prefix="/productos", tags=["productos"])
 async def root():
     return {"message": "Bienvenido a la API publicitaria"}
 
+# Métricas internas del proceso (caché, colas, etc.)
+@app.get("/metrics", response_class=JSONResponse)
+async def metrics():
+    from common.utils.metrics import Metrics
+    return Metrics.snapshot()
+
 # Adaptador Mangum para ejecutar en AWS Lambda
 handler = Mangum(app)
 
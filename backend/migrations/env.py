@@ -13,6 +13,7 @@ from common.database.database import Base  # Eliminado 'engine' ya que no se usa
 # Importar todos los modelos aquí, asegurando que 'Cuenta' se importe antes que 'Usuario'
 from common.database.database import Base
 from common.models.usuario import Usuario, Cuenta
+from common.models.uso import RegistroUso
 from services.ai_content_service.models import Documento
 from services.product_service.models import Producto
 
@@ -26,6 +27,13 @@ if config.config_file_name is not None:
 # Establece el target_metadata con la información de tus modelos
 target_metadata = Base.metadata
 
+# Objetos que solo crean las migraciones (PostgreSQL) y no están en los modelos
+SOLO_EN_MIGRACIONES = {("column", "busqueda"), ("index", "ix_documentos_busqueda")}
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Evita que la autogeneración proponga borrar la columna de búsqueda y su índice."""
+    return not (reflected and (type_, name) in SOLO_EN_MIGRACIONES)
+
 # Configuración para ejecutar migraciones offline
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode."""
@@ -35,6 +43,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -52,7 +61,8 @@ def run_migrations_online() -> None:
     with connectable.connect() as connection:
         context.configure(
             connection=connection,
-            target_metadata=target_metadata
+            target_metadata=target_metadata,
+            include_object=include_object,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,43 @@
+"""Registro de uso de IA
+
+Revision ID: 9b1f4c2d7e10
+Revises: 72332e4bcd55
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b1f4c2d7e10'
+down_revision: Union[str, None] = '72332e4bcd55'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('registros_uso',
+    sa.Column('id_registro', sa.Integer(), nullable=False),
+    sa.Column('id_usuario', sa.Integer(), nullable=True),
+    sa.Column('endpoint', sa.String(), nullable=False),
+    sa.Column('modelo', sa.String(), nullable=False),
+    sa.Column('tokens_prompt', sa.Integer(), nullable=False),
+    sa.Column('tokens_respuesta', sa.Integer(), nullable=False),
+    sa.Column('tokens_total', sa.Integer(), nullable=False),
+    sa.Column('costo', sa.Float(), nullable=False),
+    sa.Column('fecha', sa.DateTime(), nullable=False),
+    sa.Column('fecha_liquidacion', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['id_usuario'], ['usuarios.id_usuario'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id_registro')
+    )
+    op.create_index(op.f('ix_registros_uso_id_registro'), 'registros_uso', ['id_registro'], unique=False)
+    op.create_index(op.f('ix_registros_uso_id_usuario'), 'registros_uso', ['id_usuario'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_registros_uso_id_usuario'), table_name='registros_uso')
+    op.drop_index(op.f('ix_registros_uso_id_registro'), table_name='registros_uso')
+    op.drop_table('registros_uso')
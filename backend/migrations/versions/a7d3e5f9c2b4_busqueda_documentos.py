@@ -0,0 +1,48 @@
+"""Búsqueda de texto completo en documentos
+
+Revision ID: a7d3e5f9c2b4
+Revises: f6c9d2e4b8a1
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3e5f9c2b4'
+down_revision: Union[str, None] = 'f6c9d2e4b8a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Solo PostgreSQL: en otras bases la búsqueda usa el índice invertido en memoria
+    # (services/document_service/busqueda.py). La columna y el índice no están en el
+    # modelo; migrations/env.py los excluye de la autogeneración.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    # Columna generada con los textos del JSON (no las claves ni los números) en español.
+    # Agregarla reescribe la tabla una vez para calcularla en las filas existentes.
+    op.execute(
+        "ALTER TABLE documentos ADD COLUMN busqueda tsvector GENERATED ALWAYS AS "
+        "(jsonb_to_tsvector('spanish'::regconfig, contenido, '[\"string\"]'::jsonb)) STORED"
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_documentos_busqueda',
+            'documentos',
+            ['busqueda'],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_documentos_busqueda', table_name='documentos', postgresql_concurrently=True)
+    op.drop_column('documentos', 'busqueda')
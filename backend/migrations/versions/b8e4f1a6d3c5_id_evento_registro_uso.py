@@ -0,0 +1,29 @@
+"""Identificador de evento en el registro de uso
+
+Revision ID: b8e4f1a6d3c5
+Revises: a7d3e5f9c2b4
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e4f1a6d3c5'
+down_revision: Union[str, None] = 'a7d3e5f9c2b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Nullable: las filas ya liquidadas no tienen identificador
+    op.add_column('registros_uso', sa.Column('id_evento', sa.String(length=32), nullable=True))
+    op.create_index(op.f('ix_registros_uso_id_evento'), 'registros_uso', ['id_evento'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_registros_uso_id_evento'), table_name='registros_uso')
+    op.drop_column('registros_uso', 'id_evento')
@@ -0,0 +1,26 @@
+"""Versión del prompt en documentos
+
+Revision ID: c3e8a1f05b27
+Revises: 9b1f4c2d7e10
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e8a1f05b27'
+down_revision: Union[str, None] = '9b1f4c2d7e10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('documentos', sa.Column('version_prompt', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('documentos', 'version_prompt')
@@ -0,0 +1,43 @@
+"""Índices compuestos para los listados por usuario
+
+Revision ID: d4a7e2b91c36
+Revises: c3e8a1f05b27
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a7e2b91c36'
+down_revision: Union[str, None] = 'c3e8a1f05b27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # En PostgreSQL se crean sin bloquear las escrituras (CONCURRENTLY no admite transacción)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_documentos_usuario_fecha',
+            'documentos',
+            ['id_usuario', sa.text('fecha_creacion DESC'), sa.text('id_documento DESC')],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_productos_usuario_producto',
+            'productos',
+            ['id_usuario', 'id_producto'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_productos_usuario_producto', table_name='productos', postgresql_concurrently=True)
+        op.drop_index('ix_documentos_usuario_fecha', table_name='documentos', postgresql_concurrently=True)
@@ -0,0 +1,99 @@
+"""Contenido de documentos como JSONB
+
+Revision ID: e5b8c3d1a7f4
+Revises: d4a7e2b91c36
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b8c3d1a7f4'
+down_revision: Union[str, None] = 'd4a7e2b91c36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LOTE = 1000
+TIPO_JSON = sa.JSON().with_variant(postgresql.JSONB(), 'postgresql')
+
+
+def a_json(tipo_documento: str, texto: str):
+    """Texto guardado con json.dumps -> valor JSON. El texto libre queda como cadena JSON."""
+    try:
+        valor = json.loads(texto)
+    except (TypeError, ValueError):
+        return texto
+    # Los encabezados se guardaban como arreglo suelto; ahora con la forma de la respuesta
+    if tipo_documento == 'create_heading' and isinstance(valor, list):
+        return {'encabezados': valor}
+    return valor
+
+
+def a_texto(tipo_documento: str, valor):
+    if isinstance(valor, str):
+        return valor
+    if tipo_documento == 'create_heading' and isinstance(valor, dict) and list(valor) == ['encabezados']:
+        valor = valor['encabezados']
+    return json.dumps(valor)
+
+
+def copiar(origen: sa.Column, destino: sa.Column, convertir) -> None:
+    """Copia `origen` a `destino` por lotes de id_documento, convirtiendo cada valor en Python."""
+    documentos = sa.table(
+        'documentos', sa.column('id_documento', sa.Integer), sa.column('tipo_documento', sa.String), origen, destino
+    )
+    conexion = op.get_bind()
+    ultimo = 0
+    while True:
+        filas = conexion.execute(
+            sa.select(documentos.c.id_documento, documentos.c.tipo_documento, documentos.c[origen.name])
+            .where(documentos.c.id_documento > ultimo)
+            .order_by(documentos.c.id_documento)
+            .limit(LOTE)
+        ).all()
+        if not filas:
+            break
+        conexion.execute(
+            documentos.update()
+            .where(documentos.c.id_documento == sa.bindparam('id'))
+            .values({destino.name: sa.bindparam('valor')}),
+            [{'id': id_documento, 'valor': convertir(tipo, valor)} for id_documento, tipo, valor in filas],
+        )
+        ultimo = filas[-1][0]
+
+
+def recrear_indice_sqlite() -> None:
+    """En SQLite batch_alter_table reconstruye la tabla y el índice pierde el orden DESC."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.drop_index('ix_documentos_usuario_fecha', table_name='documentos')
+    op.create_index(
+        'ix_documentos_usuario_fecha',
+        'documentos',
+        ['id_usuario', sa.text('fecha_creacion DESC'), sa.text('id_documento DESC')],
+        unique=False,
+    )
+
+
+def upgrade() -> None:
+    op.add_column('documentos', sa.Column('contenido_json', TIPO_JSON, nullable=True))
+    copiar(sa.column('contenido', sa.Text), sa.column('contenido_json', TIPO_JSON), a_json)
+    with op.batch_alter_table('documentos') as batch_op:
+        batch_op.drop_column('contenido')
+        batch_op.alter_column('contenido_json', new_column_name='contenido', existing_type=TIPO_JSON, nullable=False)
+    recrear_indice_sqlite()
+
+
+def downgrade() -> None:
+    op.add_column('documentos', sa.Column('contenido_texto', sa.Text(), nullable=True))
+    copiar(sa.column('contenido', TIPO_JSON), sa.column('contenido_texto', sa.Text), a_texto)
+    with op.batch_alter_table('documentos') as batch_op:
+        batch_op.drop_column('contenido')
+        batch_op.alter_column('contenido_texto', new_column_name='contenido', existing_type=sa.Text(), nullable=False)
+    recrear_indice_sqlite()
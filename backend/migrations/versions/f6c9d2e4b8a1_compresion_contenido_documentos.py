@@ -0,0 +1,51 @@
+"""Compresión lz4 del contenido de documentos
+
+Revision ID: f6c9d2e4b8a1
+Revises: e5b8c3d1a7f4
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6c9d2e4b8a1'
+down_revision: Union[str, None] = 'e5b8c3d1a7f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Filas más grandes que esto (bytes) se comprimen al guardarse. PostgreSQL usa 2032 por
+# defecto, lo que deja sin comprimir la mayoría de los documentos generados (1-4 KB).
+# Ver benchmarks/compresion_documentos.py.
+UMBRAL_COMPRESION = 512
+
+
+def lz4_disponible() -> bool:
+    """PostgreSQL 14+ compilado con lz4 (pg_settings lista las opciones de compresión)."""
+    conexion = op.get_bind()
+    if conexion.dialect.name != 'postgresql':
+        return False
+    return bool(conexion.execute(sa.text(
+        "SELECT 'lz4' = ANY(enumvals) FROM pg_settings WHERE name = 'default_toast_compression'"
+    )).scalar())
+
+
+def upgrade() -> None:
+    # Compresión transparente en la base (TOAST): las consultas, la proyección con ?fields=
+    # y la búsqueda siguen viendo el JSONB; solo se descomprime el valor que se lee.
+    # Solo afecta a las filas que se escriban desde ahora; para recomprimir las existentes
+    # hace falta reescribir la tabla (VACUUM FULL documentos) en una ventana de mantenimiento.
+    if not lz4_disponible():
+        return
+    op.execute('ALTER TABLE documentos ALTER COLUMN contenido SET COMPRESSION lz4')
+    op.execute(f'ALTER TABLE documentos SET (toast_tuple_target = {UMBRAL_COMPRESION})')
+
+
+def downgrade() -> None:
+    if not lz4_disponible():
+        return
+    op.execute('ALTER TABLE documentos RESET (toast_tuple_target)')
+    op.execute('ALTER TABLE documentos ALTER COLUMN contenido SET COMPRESSION default')
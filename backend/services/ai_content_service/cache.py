@@ -0,0 +1,134 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from pydantic import BaseModel
+from common.utils.session_manager import SessionManager
+from common.utils.metrics import Metrics
+from .config import (
+    OPENAI_MODEL,
+    OPENAI_TEMPERATURE,
+    CONTENT_CACHE_ENABLED,
+    CONTENT_CACHE_TTL,
+    CONTENT_CACHE_MAX_ITEMS,
+    CONTENT_CACHE_DISABLED_ENDPOINTS,
+)
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "content_cache:"
+
+def normalizar(valor):
+    """Normaliza la entrada para que peticiones equivalentes generen la misma clave."""
+    if isinstance(valor, BaseModel):
+        valor = valor.model_dump(mode="json")
+    if isinstance(valor, dict):
+        return {k: normalizar(v) for k, v in sorted(valor.items())}
+    if isinstance(valor, (list, tuple)):
+        return [normalizar(v) for v in valor]
+    if isinstance(valor, str):
+        return " ".join(valor.split())
+    return valor
+
+class ResponseCache:
+    """Caché de respuestas de IA en dos niveles: LRU en memoria y Redis compartido."""
+
+    def __init__(
+        self,
+        ttl: int = CONTENT_CACHE_TTL,
+        max_items: int = CONTENT_CACHE_MAX_ITEMS,
+        enabled: bool = CONTENT_CACHE_ENABLED,
+        disabled_endpoints: set = None,
+    ):
+        self.ttl = ttl
+        self.max_items = max_items
+        self.enabled = enabled
+        self.disabled_endpoints = set(disabled_endpoints or ())
+        self._local = OrderedDict()  # clave -> (expira_en, JSON serializado)
+
+    def habilitado(self, endpoint: str) -> bool:
+        """Indica si la caché está activa para un endpoint."""
+        return self.enabled and endpoint not in self.disabled_endpoints
+
+    def clave(
+        self,
+        endpoint: str,
+        data,
+        model: str = OPENAI_MODEL,
+        temperature: float = OPENAI_TEMPERATURE,
+        prompt: str = None,
+    ) -> str:
+        """Calcula la clave de contenido a partir del endpoint, la entrada, los parámetros del
+        modelo y la plantilla@versión del prompt (cada versión tiene sus propias respuestas)."""
+        material = json.dumps(
+            {
+                "endpoint": endpoint,
+                "input": normalizar(data),
+                "model": model,
+                "temperature": temperature,
+                "prompt": prompt,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        return CACHE_PREFIX + hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    async def obtener(self, endpoint: str, clave: str):
+        """Busca una respuesta en memoria y luego en Redis. Devuelve None si no existe."""
+        if not self.habilitado(endpoint):
+            return None
+
+        entrada = self._local.get(clave)
+        if entrada is not None:
+            expira_en, crudo = entrada
+            if expira_en > time.monotonic():
+                self._local.move_to_end(clave)
+                Metrics.incr(f"content_cache.{endpoint}.hit_local")
+                # Se deserializa en cada acierto para no compartir objetos mutables entre peticiones
+                return json.loads(crudo)
+            del self._local[clave]
+
+        redis = SessionManager.redis_client
+        if redis is not None:
+            try:
+                crudo = await redis.get(clave)
+            except Exception as e:
+                logger.warning(f"Error leyendo la caché de Redis: {e}")
+                crudo = None
+            if crudo is not None:
+                self._guardar_local(clave, crudo)
+                Metrics.incr(f"content_cache.{endpoint}.hit_redis")
+                return json.loads(crudo)
+
+        Metrics.incr(f"content_cache.{endpoint}.miss")
+        return None
+
+    async def guardar(self, endpoint: str, clave: str, valor):
+        """Guarda una respuesta en ambos niveles de la caché."""
+        if not self.habilitado(endpoint):
+            return
+
+        crudo = json.dumps(valor, ensure_ascii=False)
+        self._guardar_local(clave, crudo)
+        redis = SessionManager.redis_client
+        if redis is not None:
+            try:
+                await redis.set(clave, crudo, ex=self.ttl)
+            except Exception as e:
+                logger.warning(f"Error escribiendo la caché de Redis: {e}")
+
+    def _guardar_local(self, clave: str, crudo: str):
+        self._local[clave] = (time.monotonic() + self.ttl, crudo)
+        self._local.move_to_end(clave)
+        while len(self._local) > self.max_items:
+            self._local.popitem(last=False)
+            Metrics.incr("content_cache.evictions")
+
+    def limpiar(self):
+        """Vacía el nivel en memoria."""
+        self._local.clear()
+
+# Instancia compartida por todos los handlers del servicio
+response_cache = ResponseCache(disabled_endpoints=CONTENT_CACHE_DISABLED_ENDPOINTS)
@@ -1,7 +1,8 @@
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
+import httpx
 import logging
+from .providers import crear_cliente, OPENAI, COMPATIBLE
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -9,11 +10,165 @@ logger = logging.getLogger(__name__)
 # Cargar las variables de entorno desde el archivo .env en la raíz del proyecto
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), '../../.env'))
 
-# Verificar que la clave de API esté configurada
+# Proveedor de LLM: "openai", "compatible" (cualquier API compatible con OpenAI en
+# OPENAI_BASE_URL) o "stub" (generador local sin red, para pruebas de carga y CI)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", OPENAI).lower()
+
+# La clave solo es obligatoria con OpenAI; los servidores compatibles suelen no pedirla
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
+if LLM_PROVIDER == OPENAI and not OPENAI_API_KEY:
     logger.error("OPENAI_API_KEY no está configurada en las variables de entorno.")
     raise ValueError("OPENAI_API_KEY no está configurada en las variables de entorno.")
 
-# Crear una instancia del cliente de OpenAI
-client = OpenAI(api_key=OPENAI_API_KEY)
+# URL base opcional con "openai" (por ejemplo, el servidor falso) y obligatoria con "compatible"
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+if LLM_PROVIDER == COMPATIBLE and not OPENAI_BASE_URL:
+    raise ValueError("LLM_PROVIDER=compatible requiere OPENAI_BASE_URL.")
+
+# Proveedor stub: latencia hasta el primer token (segundos) y velocidad de generación (0 = instantánea)
+LLM_STUB_LATENCY = float(os.getenv("LLM_STUB_LATENCY", "0.05"))
+LLM_STUB_TOKENS_PER_SECOND = float(os.getenv("LLM_STUB_TOKENS_PER_SECOND", "0"))
+
+# Modelo y temperatura usados en las generaciones
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+OPENAI_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE", "0.7"))
+# Temperatura por endpoint, por ejemplo: "create_heading=0.9,definir_campana=0.4"
+OPENAI_TEMPERATURES = {
+    endpoint.strip(): float(temperatura)
+    for endpoint, temperatura in (
+        par.split("=", 1) for par in os.getenv("OPENAI_TEMPERATURES", "").split(",") if "=" in par
+    )
+}
+
+# Enrutamiento de modelos: modelo principal, respaldos (en orden, separados por ">") y SLO de
+# latencia p95 en segundos por endpoint, por ejemplo:
+# "create_heading=gpt-4o-mini>gpt-3.5-turbo@4,definir_campana=gpt-4o>gpt-4o-mini@20".
+# Los endpoints no listados usan OPENAI_MODEL, OPENAI_FALLBACK_MODELS y OPENAI_LATENCY_SLO.
+OPENAI_FALLBACK_MODELS = [m.strip() for m in os.getenv("OPENAI_FALLBACK_MODELS", "").split(">") if m.strip()]
+OPENAI_LATENCY_SLO = float(os.getenv("OPENAI_LATENCY_SLO", "15"))  # Segundos
+OPENAI_MODEL_ROUTES = {
+    endpoint.strip(): (
+        [m.strip() for m in ruta.partition("@")[0].split(">") if m.strip()],
+        float(ruta.partition("@")[2]) if ruta.partition("@")[2] else OPENAI_LATENCY_SLO,
+    )
+    for endpoint, ruta in (
+        par.split("=", 1) for par in os.getenv("OPENAI_MODEL_ROUTES", "").split(",") if "=" in par
+    )
+}
+# Estadísticas del router: ventana deslizante, muestras mínimas para juzgar un modelo,
+# tasa de errores máxima tolerada y fracción de llamadas que sigue probando a un modelo degradado
+ROUTER_WINDOW = float(os.getenv("ROUTER_WINDOW", "300"))  # Segundos
+ROUTER_MIN_SAMPLES = int(os.getenv("ROUTER_MIN_SAMPLES", "10"))
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.2"))
+ROUTER_PROBE_RATE = float(os.getenv("ROUTER_PROBE_RATE", "0.05"))
+
+# Salida estructurada: las peticiones se restringen al JSON Schema del modelo de respuesta
+# (requiere un modelo compatible, por ejemplo gpt-4o-mini)
+CONTENT_STRUCTURED_OUTPUT = os.getenv("CONTENT_STRUCTURED_OUTPUT", "false").lower() == "true"
+# Reintentos (volviendo a preguntar) cuando la respuesta no valida contra su modelo
+CONTENT_VALIDATION_RETRIES = int(os.getenv("CONTENT_VALIDATION_RETRIES", "1"))
+
+# Caché de respuestas generadas
+CONTENT_CACHE_ENABLED = os.getenv("CONTENT_CACHE_ENABLED", "true").lower() == "true"
+CONTENT_CACHE_TTL = int(os.getenv("CONTENT_CACHE_TTL", "3600"))             # Segundos
+CONTENT_CACHE_MAX_ITEMS = int(os.getenv("CONTENT_CACHE_MAX_ITEMS", "1024"))  # Entradas en memoria por proceso
+# Endpoints excluidos de la caché, separados por comas (por ejemplo: "create_heading,crear_contenido_creativo")
+CONTENT_CACHE_DISABLED_ENDPOINTS = {
+    e.strip() for e in os.getenv("CONTENT_CACHE_DISABLED_ENDPOINTS", "").split(",") if e.strip()
+}
+
+# Deduplicación de llamadas idénticas en curso (single-flight)
+SINGLE_FLIGHT_LOCK_TTL = float(os.getenv("SINGLE_FLIGHT_LOCK_TTL", "90"))          # Segundos
+SINGLE_FLIGHT_WAIT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_WAIT_TIMEOUT", "60"))  # Segundos
+# Cuánto queda el resultado del líder para los seguidores que se suscribieron tarde
+SINGLE_FLIGHT_RESULT_TTL = float(os.getenv("SINGLE_FLIGHT_RESULT_TTL", "5"))       # Segundos
+
+# Parámetros del pool de conexiones HTTP compartido
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
+# Reintentos con espera exponencial (y jitter) ante 429/5xx, errores de red y timeouts
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+OPENAI_BACKOFF_BASE = float(os.getenv("OPENAI_BACKOFF_BASE", "0.5"))    # Segundos
+OPENAI_BACKOFF_MAX = float(os.getenv("OPENAI_BACKOFF_MAX", "8"))        # Segundos
+# Plazo total (reintentos incluidos) de una generación y excepciones por endpoint,
+# por ejemplo: "create_heading=20,crear_contenido_creativo=45"
+OPENAI_DEADLINE = float(os.getenv("OPENAI_DEADLINE", "45"))             # Segundos
+OPENAI_DEADLINES = {
+    endpoint.strip(): float(segundos)
+    for endpoint, segundos in (
+        par.split("=", 1) for par in os.getenv("OPENAI_DEADLINES", "").split(",") if "=" in par
+    )
+}
+
+# Circuit breaker: se abre cuando la tasa de errores de la ventana supera el umbral
+CIRCUIT_BREAKER_ERROR_RATE = float(os.getenv("CIRCUIT_BREAKER_ERROR_RATE", "0.5"))
+CIRCUIT_BREAKER_MIN_CALLS = int(os.getenv("CIRCUIT_BREAKER_MIN_CALLS", "20"))
+CIRCUIT_BREAKER_WINDOW = float(os.getenv("CIRCUIT_BREAKER_WINDOW", "30"))      # Segundos
+CIRCUIT_BREAKER_COOLDOWN = float(os.getenv("CIRCUIT_BREAKER_COOLDOWN", "30"))  # Segundos
+
+# Límites de la organización en OpenAI (token bucket compartido en Redis; 0 = sin límite)
+OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", "500"))          # Peticiones por minuto
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", "200000"))       # Tokens por minuto
+OPENAI_CHARS_PER_TOKEN = float(os.getenv("OPENAI_CHARS_PER_TOKEN", "4"))  # Para estimar el prompt
+
+# Facturación del uso: precio por cada 1000 tokens (se descuenta de Cuenta.saldo)
+PRECIO_1K_TOKENS_PROMPT = float(os.getenv("PRECIO_1K_TOKENS_PROMPT", "0.002"))
+PRECIO_1K_TOKENS_RESPUESTA = float(os.getenv("PRECIO_1K_TOKENS_RESPUESTA", "0.006"))
+# Cuota diaria de tokens por tipo de cuenta (0 = sin límite), por ejemplo: "Standard=50000,Premium=500000"
+CUOTAS_TIPO_CUENTA = {
+    tipo.strip(): int(tokens)
+    for tipo, tokens in (
+        par.split("=", 1)
+        for par in os.getenv("CUOTAS_TIPO_CUENTA", "Standard=50000,Premium=500000,Enterprise=0").split(",")
+        if "=" in par
+    )
+}
+CUOTA_POR_DEFECTO = int(os.getenv("CUOTA_POR_DEFECTO", "50000"))  # Tipos de cuenta no listados
+USO_LIQUIDACION_INTERVALO = float(os.getenv("USO_LIQUIDACION_INTERVALO", "10"))  # Segundos
+USO_LIQUIDACION_LOTE = int(os.getenv("USO_LIQUIDACION_LOTE", "500"))
+
+# Encabezados: por encima de este número de variantes se reparten en llamadas paralelas
+ENCABEZADOS_POR_LLAMADA = int(os.getenv("ENCABEZADOS_POR_LLAMADA", "10"))
+OPENAI_MAX_OUTPUT_TOKENS = int(os.getenv("OPENAI_MAX_OUTPUT_TOKENS", "4096"))  # Tope de max_tokens por llamada
+
+# Plantillas de prompts: directorio adicional (se carga después de las incluidas) y versión
+# activa o reparto A/B por plantilla, por ejemplo "create_heading=v1:90/v2:10,definir_campana=v1"
+CONTENT_PROMPTS_DIR = os.getenv("CONTENT_PROMPTS_DIR", "")
+CONTENT_PROMPT_VERSIONS = {
+    nombre.strip(): [
+        (version.partition(":")[0].strip(), float(version.partition(":")[2] or 1))
+        for version in versiones.split("/") if version.strip()
+    ]
+    for nombre, versiones in (
+        par.split("=", 1) for par in os.getenv("CONTENT_PROMPT_VERSIONS", "").split(",") if "=" in par
+    )
+}
+
+# Cliente HTTP compartido por todas las llamadas (reutiliza conexiones keep-alive)
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+    ),
+    timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=5.0),
+)
+
+# Cliente del proveedor configurado (misma interfaz que AsyncOpenAI) sobre el pool compartido
+client = crear_cliente(
+    LLM_PROVIDER,
+    api_key=OPENAI_API_KEY,
+    base_url=OPENAI_BASE_URL,
+    http_client=http_client,
+    stub_latencia=LLM_STUB_LATENCY,
+    stub_tokens_por_segundo=LLM_STUB_TOKENS_PER_SECOND,
+    chars_por_token=OPENAI_CHARS_PER_TOKEN,
+)
+logger.info(f"Proveedor de LLM: {LLM_PROVIDER}")
+
+async def close_client():
+    """Cierra el cliente del proveedor y el cliente HTTP compartido."""
+    await client.close()
+    await http_client.aclose()
+    logger.info("Cliente de OpenAI cerrado.")
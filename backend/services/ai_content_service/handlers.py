@@ -1,293 +1,322 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timezone
-from ..auth_service.models import Usuario
+from ..auth_service.principal_cache import UsuarioActual
 from ..ai_content_service.models import Documento
-from .utils import generar_respuesta_openai, extraer_json_de_respuesta
+from common.database.database import AsyncSessionLocal
+from .utils import generar_modelo, generar_json_stream
+from .streaming import formato_sse
+from .prompts import registro_prompts, Prompt
+from .usage import libro_uso, medir_consumo
+from .schemas import (
+    CampanaDetallesInput,
+    PublicoObjetivoUbicacionesInput,
+    FormatoCTAInput,
+    ContenidoCreativoInput,
+    DetallesCampana,
+    PublicoUbicaciones,
+    FormatoCTA,
+    ContenidoCreativo,
+    Encabezados,
+    CampanaCompleta
+)
+from .config import ENCABEZADOS_POR_LLAMADA, OPENAI_CHARS_PER_TOKEN, OPENAI_MAX_OUTPUT_TOKENS
+from common.utils.metrics import Metrics
 from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+import asyncio
 import json
-
-async def manejar_definir_campana(data, current_user: Usuario, db: Session):
-    prompt = f"""
-    Como experto en marketing digital y campañas de Meta Ads, proporciona tus recomendaciones en formato JSON **válido** siguiendo exactamente el siguiente esquema **sin agregar texto adicional**:
-
-    {{"detalles_campana": {{
-        "objetivo_campana": {{
-            "objetivo": "[Objetivo seleccionado]",
-            "explicacion": "[Explicación breve]"
-        }},
-        "presupuesto_total": {{
-            "cantidad": "[Cantidad en soles]",
-            "explicacion": "[Explicación breve]"
-        }},
-        "duracion_optima": {{
-            "duracion": "[Tiempo en días/semanas/meses]",
-            "explicacion": "[Explicación breve]"
-        }}
-    }}}}
-
-    Utiliza la información del producto a continuación para hacer tus recomendaciones.
-
-    **Detalles del Producto:**
-    - Nombre: {data.nombreProducto}
-    - Descripción: {data.descripcionProducto}
-    - tipoCampana: {data.tipoCampana}
-    - duracionPreferida: {data.duracionPreferida}
-
-    **Importante**: Proporciona **solo** la respuesta en formato JSON válido. No incluyas ninguna explicación o texto adicional antes o después del JSON.
-    """
-
-    resultado = await generar_respuesta_openai(prompt)
-    detalles_campana = extraer_json_de_respuesta(resultado)
-
-    # Manejo de la base de datos con un bloque de transacción explícito
-    nuevo_documento = Documento(
-        id_usuario=current_user.id_usuario,
-        tipo_documento="definir_campana",
-        contenido=json.dumps(detalles_campana),
+import logging
+import math
+import re
+
+logger = logging.getLogger(__name__)
+
+# Ángulos creativos que se reparten entre los lotes de encabezados para que no se repitan
+ENFOQUES_ENCABEZADOS = [
+    "los beneficios principales del producto",
+    "la urgencia o una oferta por tiempo limitado",
+    "una pregunta directa al lector",
+    "la confianza y la prueba social",
+    "la curiosidad y la sorpresa",
+    "el problema que el producto resuelve",
+    "la emoción y el estilo de vida",
+    "datos concretos y cifras",
+]
+
+def crear_documento(id_usuario: int, tipo_documento: str, contenido, version_prompt: str = None) -> Documento:
+    """Construye (sin guardar) el Documento con el resultado de una generación.
+    `version_prompt` es la plantilla@versión que produjo el contenido."""
+    return Documento(
+        id_usuario=id_usuario,
+        tipo_documento=tipo_documento,
+        contenido=jsonable_encoder(contenido),
+        version_prompt=version_prompt,
         fecha_creacion=datetime.now(timezone.utc)
     )
-    db.add(nuevo_documento)
-    db.commit()
-    db.refresh(nuevo_documento)
 
+async def guardar_documento(db: AsyncSession, id_usuario: int, tipo_documento: str, contenido, version_prompt: str = None) -> Documento:
+    """Persiste el resultado de una generación como Documento del usuario."""
+    nuevo_documento = crear_documento(id_usuario, tipo_documento, contenido, version_prompt)
+    db.add(nuevo_documento)
+    await db.commit()
+    await db.refresh(nuevo_documento)
+    return nuevo_documento
+
+def finalizar_encabezados(encabezados_data: dict, variantes: int):
+    """Recorta los encabezados al número pedido. Devuelve (contenido a guardar, respuesta)."""
+    encabezados = {"encabezados": encabezados_data.get("encabezados", [])[:variantes]}
+    return encabezados, encabezados
+
+def construir_prompt_definir_campana(data, clave=None) -> Prompt:
+    return registro_prompts.renderizar("definir_campana", {"data": data}, clave)
+
+@medir_consumo("definir_campana")
+async def manejar_definir_campana(data, current_user: UsuarioActual, db: AsyncSession):
+    prompt = construir_prompt_definir_campana(data, current_user.id_usuario)
+    detalles_campana = await generar_modelo("definir_campana", data, prompt, DetallesCampana)
+    await guardar_documento(db, current_user.id_usuario, "definir_campana", detalles_campana, prompt.etiqueta)
     return detalles_campana
 
-async def manejar_definir_publico_ubicaciones(data, current_user: Usuario, db: Session):
-    prompt = f"""
-    Como estratega de marketing enfocado en segmentación y ubicaciones de anuncios en Meta Ads, proporciona tus recomendaciones en formato JSON **válido** siguiendo exactamente el siguiente esquema **sin agregar texto adicional**:
-
-    {{
-      "publico_objetivo": {{
-        "demografico": {{
-          "edad": "[Rango de edad]",
-          "genero": "[Género(s)]",
-          "ubicaciones": [
-            {{
-              "distrito": "[Distrito 1]",
-              "provincia": "[Provincia 1]",
-              "departamento": "[Departamento 1]"
-            }},
-            "... (más ubicaciones si es necesario)"
-          ],
-          "otros": "[Otros datos demográficos clave]"
-        }},
-        "psicografico": {{
-          "intereses": "[Intereses específicos relacionados con el producto]",
-          "comportamientos": "[Comportamientos de compra y otros]"
-        }}
-      }},
-      "ubicaciones_anuncios": {{
-        "ubicaciones_seleccionadas": ["[Ubicación 1]", "..."],
-        "justificacion": "[Explicación breve de por qué se eligieron estas ubicaciones]"
-      }}
-    }}
-
-    Utiliza la información del producto y las ubicaciones base a continuación para hacer tus recomendaciones.
-
-    **Detalles del Producto:**
-    - Nombre: {data.nombreProducto}
-    - Descripción: {data.descripcionProducto}
-
-    **Ubicaciones Base:**
-    - Distrito: {data.distrito}
-    - Provincia: {data.provincia}
-    - Departamento: {data.departamento}
-
-    **Importante**: Proporciona **solo** la respuesta en formato JSON válido. No incluyas ninguna explicación o texto adicional antes o después del JSON.
-
-    **Nota**: Asegúrate de que todas las cadenas en el JSON estén entre comillas dobles y que el JSON sea estructuralmente válido.
-    """
-
-    resultado = await generar_respuesta_openai(prompt)
-    publico_ubicaciones = extraer_json_de_respuesta(resultado)
-
-    # Manejo de la base de datos con un bloque de transacción explícito
-    nuevo_documento = Documento(
-        id_usuario=current_user.id_usuario,
-        tipo_documento="definir_publico_ubicaciones",
-        contenido=json.dumps(publico_ubicaciones),
-        fecha_creacion=datetime.now(timezone.utc)
-    )
-    db.add(nuevo_documento)
-    db.commit()
-    db.refresh(nuevo_documento)
+def construir_prompt_definir_publico_ubicaciones(data, clave=None) -> Prompt:
+    return registro_prompts.renderizar("definir_publico_ubicaciones", {"data": data}, clave)
 
+@medir_consumo("definir_publico_ubicaciones")
+async def manejar_definir_publico_ubicaciones(data, current_user: UsuarioActual, db: AsyncSession):
+    prompt = construir_prompt_definir_publico_ubicaciones(data, current_user.id_usuario)
+    publico_ubicaciones = await generar_modelo("definir_publico_ubicaciones", data, prompt, PublicoUbicaciones)
+    await guardar_documento(db, current_user.id_usuario, "definir_publico_ubicaciones", publico_ubicaciones, prompt.etiqueta)
     return publico_ubicaciones
 
-async def manejar_elegir_formato_cta(data, current_user: Usuario, db: Session):
-    prompt = f"""
-    Como experto en creatividad publicitaria y plataformas de Meta Ads, proporciona tus recomendaciones en formato JSON **válido** siguiendo exactamente el siguiente esquema **sin agregar texto adicional**:
-
-    {{
-      "formato_anuncio": {{
-        "formato": "[Formato seleccionado]",
-        "explicacion": "[Explicación breve de por qué este formato es el más efectivo]"
-      }},
-      "cta": {{
-        "llamada_a_la_accion": "[CTA seleccionada]",
-        "explicacion": "[Explicación breve de por qué este CTA es el más impactante]"
-      }}
-    }}
-
-    Utiliza las opciones predefinidas a continuación para hacer tus selecciones.
-
-    **Opciones de Formato de Anuncio:**
-    Anuncios en carrusel
-    Anuncios en secuencia
-    Colecciones
-    Experiencias dinámicas
-    Anuncios de Messenger
-    Anuncios de Canvas 
-
-    **Opciones de Llamada a la Acción (CTA):**
-    Enviar solicitud
-    Reservar
-    Comprar
-    Realizar pedido
-    Cotizar
-    Obtener oferta
-    Más información
-    Contactarnos
-    Descargar
-    Registrarte
-
-    **Detalles del Producto:**
-    - Nombre: {data.nombreProducto}
-    - Descripción: {data.descripcionProducto}
-
-    **Importante**: Proporciona **solo** la respuesta en formato JSON válido. No incluyas ninguna explicación o texto adicional antes o después del JSON.
-
-    **Nota**: Asegúrate de que todas las cadenas en el JSON estén entre comillas dobles y que el JSON sea estructuralmente válido.
-    """
-
-    resultado = await generar_respuesta_openai(prompt)
-    formato_y_cta = extraer_json_de_respuesta(resultado)
-
-    # Manejo de la base de datos con un bloque de transacción explícito
-    nuevo_documento = Documento(
-        id_usuario=current_user.id_usuario,
-        tipo_documento="elegir_formato_cta",
-        contenido=json.dumps(formato_y_cta),
-        fecha_creacion=datetime.now(timezone.utc)
-    )
-    db.add(nuevo_documento)
-    db.commit()
-    db.refresh(nuevo_documento)
+def construir_prompt_elegir_formato_cta(data, clave=None) -> Prompt:
+    return registro_prompts.renderizar("elegir_formato_cta", {"data": data}, clave)
 
+@medir_consumo("elegir_formato_cta")
+async def manejar_elegir_formato_cta(data, current_user: UsuarioActual, db: AsyncSession):
+    prompt = construir_prompt_elegir_formato_cta(data, current_user.id_usuario)
+    formato_y_cta = await generar_modelo("elegir_formato_cta", data, prompt, FormatoCTA)
+    await guardar_documento(db, current_user.id_usuario, "elegir_formato_cta", formato_y_cta, prompt.etiqueta)
     return formato_y_cta
 
-async def manejar_crear_contenido_creativo(data, current_user: Usuario, db: Session):
-    prompt = f"""
-    Como redactor creativo especializado en anuncios de Meta Ads, genera **contenido publicitario persuasivo y atractivo** para "{data.nombreProducto}" en formato JSON **válido**, siguiendo exactamente el siguiente esquema **sin agregar texto adicional**:
-
-    {{
-      "variaciones": [
-        {{
-          "titulo": "[Título de la variación 1]",
-          "contenido": "[Contenido de la variación 1]"
-        }},
-        {{
-          "titulo": "[Título de la variación 2]",
-          "contenido": "[Contenido de la variación 2]"
-        }},
-        {{
-          "titulo": "[Título de la variación 3]",
-          "contenido": "[Contenido de la variación 3]"
-        }}
-      ]
-    }}
-
-    El contenido debe:
-
-    - Resaltar las **características y beneficios clave** del producto.
-    - Adaptarse al **tono y estilo** especificado: "{data.tonoEstilo}".
-    - Alinear el mensaje con los **intereses y necesidades** del público objetivo: "{data.publicoObjetivo}".
-    - Utilizar un lenguaje que **resuene** con la audiencia y **genere una conexión emocional**.
-
-    **Detalles del Producto:**
-    - Nombre: {data.nombreProducto}
-    - Descripción: {data.descripcionProducto}
-
-    **Importante**: Proporciona **solo** la respuesta en formato JSON válido. No incluyas ninguna explicación o texto adicional antes o después del JSON.
-
-    **Nota**: Asegúrate de que todas las cadenas en el JSON estén entre comillas dobles y que el JSON sea estructuralmente válido.
-    """
-
-    resultado = await generar_respuesta_openai(prompt)
-    contenido_creativo = extraer_json_de_respuesta(resultado)
-
-    # Manejo de la base de datos con un bloque de transacción explícito
-    nuevo_documento = Documento(
-        id_usuario=current_user.id_usuario,
-        tipo_documento="crear_contenido_creativo",
-        contenido=json.dumps(contenido_creativo),
-        fecha_creacion=datetime.now(timezone.utc)
-    )
-    db.add(nuevo_documento)
-    db.commit()
-    db.refresh(nuevo_documento)
+def construir_prompt_crear_contenido_creativo(data, clave=None) -> Prompt:
+    return registro_prompts.renderizar("crear_contenido_creativo", {"data": data}, clave)
 
+@medir_consumo("crear_contenido_creativo")
+async def manejar_crear_contenido_creativo(data, current_user: UsuarioActual, db: AsyncSession):
+    prompt = construir_prompt_crear_contenido_creativo(data, current_user.id_usuario)
+    contenido_creativo = await generar_modelo("crear_contenido_creativo", data, prompt, ContenidoCreativo)
+    await guardar_documento(db, current_user.id_usuario, "crear_contenido_creativo", contenido_creativo, prompt.etiqueta)
     return contenido_creativo
 
-async def manejar_create_heading(encabezado, current_user: Usuario, db: Session):
-    prompt = f"""
-    Eres un redactor publicitario experto en crear **encabezados cautivadores** para anuncios en plataformas de redes sociales.
-
-    Tu tarea es generar **encabezados concisos y atractivos** que cumplan con los siguientes requisitos y proporcionarlos en formato JSON **válido** siguiendo exactamente el siguiente esquema **sin agregar texto adicional**:
-
-    {{
-      "encabezados": [
-        "Encabezado 1",
-        "Encabezado 2",
-        "... hasta {encabezado.variantes} encabezados"
-      ]
-    }}
-
-    Un ejemplo de respuesta es este el cual podrias copiar el formato:
-    {{
-      "encabezados": [
-        "¡Descubre los beneficios únicos de nuestro String!",
-        "String: la solución perfecta para tus necesidades",
-        "Mejora tu vida con String",
-        "String: la mejor opción para ti",
-        "¡Aprovecha las propuestas de valor de String ahora mismo!"
-      ]
-    }}
-
-    Los encabezados deben:
-
-    1. **Producto**: Estar optimizados para "{encabezado.nombreProducto}", destacando sus **beneficios** y **propuestas de valor únicas**.
-
-    2. **Palabras Clave**: Incorporar las siguientes palabras clave para mejorar la optimización y relevancia del encabezado: {', '.join(encabezado.palabrasClave)}.
-
-    3. **Estilo de Escritura**: Adaptarse al estilo de escritura especificado, que es "{encabezado.estiloEscritura}".
-
-    4. **Longitud Máxima**: Limitarse a un máximo de {encabezado.longitudMaxima} caracteres, asegurando **claridad** y **poder de atracción**.
-
-    5. **Variantes**: Proporcionar {encabezado.variantes} versiones únicas del encabezado, cada una manteniendo el tono y relevancia para el producto, pero explorando diferentes enfoques creativos.
-
-    **Detalles del Producto:**
-    - Nombre: {encabezado.nombreProducto}
-    - Descripción: {encabezado.descripcionProducto}
-
-    **Importante**: Proporciona **solo** la respuesta en formato JSON válido, sin incluir texto adicional antes o después del JSON.
-
-    **Nota**: Asegúrate de que todas las cadenas en el JSON estén entre comillas dobles y que el JSON sea estructuralmente válido.
+def construir_prompt_create_heading(encabezado, variantes: int = None, lote: tuple = None, evitar: list = None, clave=None) -> Prompt:
+    """Prompt de encabezados. `variantes` permite pedir solo una parte del total, `lote`
+    (índice, total) orienta cada lote hacia un ángulo creativo distinto y `evitar` lista
+    encabezados ya generados."""
+    indicaciones = ""
+    if lote:
+        indice, total = lote
+        enfoque = ENFOQUES_ENCABEZADOS[indice % len(ENFOQUES_ENCABEZADOS)]
+        # El número de lote también evita que dos lotes con el mismo enfoque compartan la llamada (single-flight)
+        indicaciones += f"\n**Enfoque (lote {indice + 1} de {total})**: Todos los encabezados de esta respuesta deben centrarse en {enfoque}.\n"
+    if evitar:
+        indicaciones += "\n**No repitas** ninguno de estos encabezados ya generados: " + json.dumps(evitar, ensure_ascii=False) + "\n"
+    contexto = {
+        "data": encabezado,
+        "variantes": variantes or encabezado.variantes,
+        "palabras_clave": ", ".join(encabezado.palabrasClave),
+        "indicaciones": indicaciones,
+    }
+    return registro_prompts.renderizar("create_heading", contexto, clave)
+
+def tokens_encabezados(variantes: int, longitud_maxima: int) -> int:
+    """`max_tokens` para `variantes` encabezados de hasta `longitud_maxima` caracteres.
+
+    Cuenta el doble de lo que estima OPENAI_CHARS_PER_TOKEN (el español, las comillas y
+    los encabezados que se pasan del límite rinden menos) más la estructura del JSON.
     """
-
-    resultado = await generar_respuesta_openai(prompt)
-    encabezados_data = extraer_json_de_respuesta(resultado)
-    encabezados = encabezados_data.get("encabezados", [])[:encabezado.variantes]
-
-    # Manejo de la base de datos con un bloque de transacción explícito
-    nuevo_documento = Documento(
-        id_usuario=current_user.id_usuario,
-        tipo_documento="create_heading",
-        contenido=json.dumps(encabezados),
-        fecha_creacion=datetime.now(timezone.utc)
+    por_encabezado = math.ceil((longitud_maxima + 6) / OPENAI_CHARS_PER_TOKEN * 2)
+    return min(OPENAI_MAX_OUTPUT_TOKENS, max(300, 50 + variantes * por_encabezado))
+
+def repartir(total: int, partes: int) -> list:
+    """Divide `total` en `partes` tamaños que difieren a lo sumo en uno."""
+    base, resto = divmod(total, partes)
+    return [base + (1 if i < resto else 0) for i in range(partes)]
+
+def clave_encabezado(texto: str) -> str:
+    """Forma normalizada para detectar encabezados repetidos (mayúsculas, signos y espacios)."""
+    return " ".join(re.sub(r"[^\w\s]", " ", texto.casefold()).split())
+
+def unir_encabezados(listas: list, limite: int) -> list:
+    """Concatena los lotes sin repetidos, conservando el orden, hasta `limite` encabezados."""
+    vistos = set()
+    encabezados = []
+    for lista in listas:
+        for texto in lista:
+            texto = texto.strip()
+            clave = clave_encabezado(texto)
+            if not clave or clave in vistos:
+                continue
+            vistos.add(clave)
+            encabezados.append(texto)
+            if len(encabezados) == limite:
+                return encabezados
+    return encabezados
+
+async def generar_lote_encabezados(encabezado, variantes: int, lote: tuple = None, evitar: list = None, clave=None) -> list:
+    """Genera un lote de encabezados; cada lote tiene su propia entrada de caché."""
+    prompt = construir_prompt_create_heading(encabezado, variantes, lote, evitar, clave)
+    datos = {**encabezado.model_dump(), "variantes": variantes, "lote": lote, "evitar": evitar or []}
+    tokens = tokens_encabezados(variantes, encabezado.longitudMaxima)
+    resultado = await generar_modelo("create_heading", datos, prompt, Encabezados, tokens)
+    return resultado.encabezados
+
+async def generar_encabezados(encabezado, clave=None) -> list:
+    """Genera `encabezado.variantes` encabezados distintos.
+
+    Hasta ENCABEZADOS_POR_LLAMADA se pide todo en una llamada. Por encima, se reparten
+    en lotes paralelos con enfoques distintos (la latencia es la de un lote), se unen
+    sin repetidos y, si faltan por duplicados o por un lote fallido, se completa con
+    una única llamada adicional.
+    """
+    variantes = encabezado.variantes
+    if variantes <= ENCABEZADOS_POR_LLAMADA:
+        prompt = construir_prompt_create_heading(encabezado, clave=clave)
+        tokens = tokens_encabezados(variantes, encabezado.longitudMaxima)
+        resultado = await generar_modelo("create_heading", encabezado, prompt, Encabezados, tokens)
+        return unir_encabezados([resultado.encabezados], variantes)
+
+    tamanos = repartir(variantes, math.ceil(variantes / ENCABEZADOS_POR_LLAMADA))
+    resultados = await asyncio.gather(
+        *(generar_lote_encabezados(encabezado, n, (i, len(tamanos)), clave=clave) for i, n in enumerate(tamanos)),
+        return_exceptions=True,
     )
-    db.add(nuevo_documento)
-    db.commit()
-    db.refresh(nuevo_documento)
-
-    return {"encabezados": encabezados}
+    lotes = [r for r in resultados if not isinstance(r, BaseException)]
+    if not lotes:
+        raise resultados[0]
+    Metrics.incr("create_heading.shards", len(tamanos))
+    Metrics.incr("create_heading.shards_failed", len(tamanos) - len(lotes))
+    encabezados = unir_encabezados(lotes, variantes)
+
+    faltan = variantes - len(encabezados)
+    if faltan > 0:
+        Metrics.incr("create_heading.top_up")
+        try:
+            extra = await generar_lote_encabezados(encabezado, faltan, evitar=encabezados, clave=clave)
+            encabezados = unir_encabezados([encabezados, extra], variantes)
+        except HTTPException as e:
+            logger.warning(f"No se pudieron completar los encabezados ({len(encabezados)}/{variantes}): {e.detail}")
+    return encabezados
+
+@medir_consumo("create_heading")
+async def manejar_create_heading(encabezado, current_user: UsuarioActual, db: AsyncSession):
+    encabezados = await generar_encabezados(encabezado, current_user.id_usuario)
+    # Con la misma clave todos los lotes usan la misma versión de la plantilla
+    version = registro_prompts.elegir("create_heading", current_user.id_usuario).etiqueta
+
+    await guardar_documento(db, current_user.id_usuario, "create_heading", {"encabezados": encabezados}, version)
+    return Encabezados(encabezados=encabezados)
+
+def describir_publico(publico_ubicaciones: PublicoUbicaciones) -> str:
+    """Resume en una línea el público recomendado, para usarlo en el paso creativo."""
+    demografico = publico_ubicaciones.publico_objetivo.demografico
+    psicografico = publico_ubicaciones.publico_objetivo.psicografico
+    partes = [
+        f"Edad: {demografico.edad}" if demografico.edad else None,
+        f"Género: {demografico.genero}" if demografico.genero else None,
+        f"Intereses: {psicografico.intereses}" if psicografico.intereses else None,
+        f"Comportamientos: {psicografico.comportamientos}" if psicografico.comportamientos else None,
+    ]
+    return "; ".join(p for p in partes if p)
+
+@medir_consumo("campana_completa")
+async def manejar_campana_completa(data, current_user: UsuarioActual, db: AsyncSession):
+    """Ejecuta los cuatro pasos de planificación de una campaña en paralelo.
+
+    El paso creativo depende del público recomendado solo cuando el usuario no
+    indica `publicoObjetivo`. Todos los Documentos se guardan en una transacción.
+    """
+    entrada = data.model_dump()
+    campana_data = CampanaDetallesInput.model_validate(entrada)
+    publico_data = PublicoObjetivoUbicacionesInput.model_validate(entrada)
+    formato_data = FormatoCTAInput.model_validate(entrada)
+    clave = current_user.id_usuario
+    versiones = {}  # tipo de documento -> plantilla@versión usada
+
+    async def generar(tipo_documento: str, datos, prompt: Prompt, modelo: type):
+        versiones[tipo_documento] = prompt.etiqueta
+        return await generar_modelo(tipo_documento, datos, prompt, modelo)
+
+    async def generar_creativo(publico_objetivo: str):
+        creativo_data = ContenidoCreativoInput.model_validate({**entrada, "publicoObjetivo": publico_objetivo})
+        prompt = construir_prompt_crear_contenido_creativo(creativo_data, clave)
+        return await generar("crear_contenido_creativo", creativo_data, prompt, ContenidoCreativo)
+
+    async def generar_publico():
+        prompt = construir_prompt_definir_publico_ubicaciones(publico_data, clave)
+        return await generar("definir_publico_ubicaciones", publico_data, prompt, PublicoUbicaciones)
+
+    async def generar_publico_y_creativo():
+        publico = await generar_publico()
+        creativo = await generar_creativo(describir_publico(publico) or data.descripcionProducto)
+        return publico, creativo
+
+    if data.publicoObjetivo:
+        # Sin dependencia entre pasos: los cuatro se generan a la vez
+        detalles_campana, publico_ubicaciones, formato_y_cta, contenido_creativo = await asyncio.gather(
+            generar("definir_campana", campana_data, construir_prompt_definir_campana(campana_data, clave), DetallesCampana),
+            generar_publico(),
+            generar("elegir_formato_cta", formato_data, construir_prompt_elegir_formato_cta(formato_data, clave), FormatoCTA),
+            generar_creativo(data.publicoObjetivo),
+        )
+    else:
+        detalles_campana, (publico_ubicaciones, contenido_creativo), formato_y_cta = await asyncio.gather(
+            generar("definir_campana", campana_data, construir_prompt_definir_campana(campana_data, clave), DetallesCampana),
+            generar_publico_y_creativo(),
+            generar("elegir_formato_cta", formato_data, construir_prompt_elegir_formato_cta(formato_data, clave), FormatoCTA),
+        )
+
+    resultados = {
+        "definir_campana": detalles_campana,
+        "definir_publico_ubicaciones": publico_ubicaciones,
+        "elegir_formato_cta": formato_y_cta,
+        "crear_contenido_creativo": contenido_creativo,
+    }
+
+    # Todos los documentos de la campaña se guardan en una sola transacción
+    try:
+        db.add_all([
+            crear_documento(current_user.id_usuario, tipo_documento, contenido, versiones[tipo_documento])
+            for tipo_documento, contenido in resultados.items()
+        ])
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+    return CampanaCompleta(**resultados)
+
+async def manejar_stream(tipo_documento: str, data, prompt: Prompt, modelo: type, current_user: UsuarioActual, finalizar=None, max_tokens: int = 300):
+    """Genera la respuesta como Server-Sent Events y guarda el Documento al terminar.
+
+    Emite eventos `token` con cada fragmento del modelo, `item` con cada elemento de
+    un arreglo apenas se cierra, y `done` con la respuesta final validada contra `modelo`
+    (o `error`).
+    """
+    # La sesión de la dependencia se cierra antes de que termine el stream; se abre una propia
+    id_usuario = current_user.id_usuario
+    try:
+        # La cuota ya la verificó la ruta antes de abrir el stream
+        async with libro_uso.medir(current_user, tipo_documento, verificar=False):
+            async for evento, payload in generar_json_stream(tipo_documento, data, prompt, modelo, max_tokens):
+                if evento != "resultado":
+                    yield formato_sse(evento, payload)
+                    continue
+
+                contenido, respuesta = finalizar(payload) if finalizar else (payload, payload)
+                async with AsyncSessionLocal() as db:
+                    await guardar_documento(db, id_usuario, tipo_documento, contenido, prompt.etiqueta)
+                yield formato_sse("done", respuesta)
+    except HTTPException as e:
+        yield formato_sse("error", {"detail": e.detail})
+    except Exception:
+        logger.exception(f"Error en el stream de {tipo_documento}")
+        yield formato_sse("error", {"detail": "Error interno durante la generación."})
@@ -0,0 +1,366 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+import httpx
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from common.database.database import AsyncSessionLocal
+from common.utils.metrics import Metrics
+from common.utils.session_manager import SessionManager
+from services.auth_service.principal_cache import UsuarioActual
+from .handlers import (
+    manejar_definir_campana,
+    manejar_definir_publico_ubicaciones,
+    manejar_elegir_formato_cta,
+    manejar_crear_contenido_creativo,
+    manejar_create_heading,
+    manejar_campana_completa,
+)
+from .webhooks import validar_callback_url, firmar
+from .schemas import (
+    CampanaDetallesInput,
+    PublicoObjetivoUbicacionesInput,
+    FormatoCTAInput,
+    ContenidoCreativoInput,
+    EncabezadoAnuncio,
+    CampanaCompletaInput,
+)
+
+# Configuración básica de logging
+logger = logging.getLogger("uvicorn.error")
+
+# Workers que corren dentro de cada proceso de la API (0 = solo el worker dedicado)
+CONTENT_JOB_WORKERS = int(os.getenv("CONTENT_JOB_WORKERS", "4"))
+CONTENT_JOB_TTL = int(os.getenv("CONTENT_JOB_TTL", str(24 * 3600)))              # Segundos
+CONTENT_JOB_WEBHOOK_TIMEOUT = float(os.getenv("CONTENT_JOB_WEBHOOK_TIMEOUT", "10"))
+CONTENT_JOB_WEBHOOK_RETRIES = int(os.getenv("CONTENT_JOB_WEBHOOK_RETRIES", "3"))
+# Un trabajo tomado cuyo worker deja de dar señales durante este tiempo vuelve a la cola
+CONTENT_JOB_VISIBILITY_TIMEOUT = float(os.getenv("CONTENT_JOB_VISIBILITY_TIMEOUT", "300"))  # Segundos
+CONTENT_JOB_MAX_ATTEMPTS = int(os.getenv("CONTENT_JOB_MAX_ATTEMPTS", "3"))
+
+QUEUE_KEY = "content_jobs:queue"
+PROCESSING_KEY = "content_jobs:processing"
+
+# Devuelve el trabajo a la cola solo si sigue en la lista de procesamiento: si dos
+# procesos lo detectan vencido a la vez, solo uno lo reencola. Un trabajo ya terminado
+# conserva su estado (al tomarlo de nuevo solo se quita de la lista).
+REQUEUE_SCRIPT = """
+if redis.call('lrem', KEYS[1], 1, ARGV[1]) == 1 then
+    redis.call('rpush', KEYS[2], ARGV[1])
+    if redis.call('hget', KEYS[3], 'estado') == ARGV[3] then
+        redis.call('hset', KEYS[3], 'estado', ARGV[2])
+    end
+    redis.call('hdel', KEYS[3], 'tomado_en')
+    return 1
+end
+return 0
+"""
+
+# Marca el momento en que un worker tomó (o sigue procesando) el trabajo, sin recrear
+# el hash si ya expiró
+MARK_TAKEN_SCRIPT = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return redis.call('hset', KEYS[1], 'tomado_en', ARGV[1])
+end
+return 0
+"""
+
+# Estados de un trabajo
+PENDIENTE = "pendiente"
+EN_PROCESO = "en_proceso"
+COMPLETADO = "completado"
+FALLIDO = "fallido"
+
+# Tipo de trabajo -> (esquema de entrada, manejador que genera y guarda el Documento)
+MANEJADORES = {
+    "definir_campana": (CampanaDetallesInput, manejar_definir_campana),
+    "definir_publico_ubicaciones": (PublicoObjetivoUbicacionesInput, manejar_definir_publico_ubicaciones),
+    "elegir_formato_cta": (FormatoCTAInput, manejar_elegir_formato_cta),
+    "crear_contenido_creativo": (ContenidoCreativoInput, manejar_crear_contenido_creativo),
+    "create_heading": (EncabezadoAnuncio, manejar_create_heading),
+    "campana_completa": (CampanaCompletaInput, manejar_campana_completa),
+}
+
+class JobQueue:
+    """Cola de trabajos de generación respaldada por Redis.
+
+    Cada trabajo vive en el hash `content_job:{id}` (con TTL) y su id se encola en
+    una lista. Un worker lo mueve atómicamente (BLMOVE) a la lista de procesamiento,
+    ejecuta el `manejar_*` correspondiente, avisa al `callback_url` del cliente, si lo
+    indicó, y recién entonces lo quita de esa lista. Mientras trabaja renueva
+    `tomado_en`; si el proceso muere, el reaper devuelve el trabajo a la cola cuando
+    pasan CONTENT_JOB_VISIBILITY_TIMEOUT segundos sin señales.
+    """
+
+    def __init__(self, workers: int = CONTENT_JOB_WORKERS):
+        self.workers = workers
+        self._tareas = []
+        self._http = None
+
+    @staticmethod
+    def _job_key(job_id: str) -> str:
+        return f"content_job:{job_id}"
+
+    @staticmethod
+    def _redis():
+        if SessionManager.redis_client is None:
+            raise HTTPException(status_code=503, detail="La cola de trabajos no está disponible.")
+        return SessionManager.redis_client
+
+    def _transicion(self, tipo: str, estado: str):
+        Metrics.incr(f"content_jobs.{estado}")
+        Metrics.incr(f"content_jobs.{tipo}.{estado}")
+
+    async def encolar(self, tipo: str, data, current_user: UsuarioActual, callback_url: str = None) -> str:
+        """Registra un trabajo y lo encola. Devuelve su id sin esperar a la generación."""
+        if tipo not in MANEJADORES:
+            raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+        if callback_url:
+            await validar_callback_url(callback_url)
+        redis = self._redis()
+        job_id = uuid.uuid4().hex
+        trabajo = {
+            "job_id": job_id,
+            "tipo": tipo,
+            "estado": PENDIENTE,
+            "id_usuario": current_user.id_usuario,
+            "email": current_user.email,
+            "nombre": current_user.nombre,
+            "data": json.dumps(data.dict(), ensure_ascii=False),
+            "callback_url": callback_url or "",
+            "creado_en": time.time(),
+        }
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._job_key(job_id), mapping=trabajo)
+            pipe.expire(self._job_key(job_id), CONTENT_JOB_TTL)
+            pipe.rpush(QUEUE_KEY, job_id)
+            await pipe.execute()
+        self._transicion(tipo, PENDIENTE)
+        return job_id
+
+    async def obtener(self, job_id: str) -> dict:
+        """Devuelve el estado público de un trabajo o None si no existe (o ya expiró)."""
+        trabajo = await self._redis().hgetall(self._job_key(job_id))
+        if not trabajo:
+            return None
+        estado = {
+            "job_id": trabajo["job_id"],
+            "tipo": trabajo["tipo"],
+            "estado": trabajo["estado"],
+            "id_usuario": int(trabajo["id_usuario"]),
+            "creado_en": float(trabajo["creado_en"]),
+        }
+        for campo in ("iniciado_en", "finalizado_en"):
+            if trabajo.get(campo):
+                estado[campo] = float(trabajo[campo])
+        if trabajo.get("resultado"):
+            estado["resultado"] = json.loads(trabajo["resultado"])
+        if trabajo.get("error"):
+            estado["error"] = trabajo["error"]
+        return estado
+
+    async def _actualizar(self, job_id: str, campos: dict):
+        redis = self._redis()
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._job_key(job_id), mapping=campos)
+            pipe.expire(self._job_key(job_id), CONTENT_JOB_TTL)
+            await pipe.execute()
+
+    async def procesar(self, job_id: str):
+        """Ejecuta un trabajo: genera el contenido, guarda el Documento y notifica al cliente."""
+        trabajo = await self._redis().hgetall(self._job_key(job_id))
+        if not trabajo:
+            logger.warning(f"Trabajo {job_id} no encontrado (expirado antes de procesarse).")
+            return
+        tipo = trabajo["tipo"]
+        if trabajo["estado"] in (COMPLETADO, FALLIDO):
+            # El worker anterior terminó pero murió antes de quitarlo de la lista de procesamiento
+            return
+        esquema, manejador = MANEJADORES[tipo]
+        # Un trabajo que tumba al worker cada vez no se reintenta para siempre
+        intentos = await self._redis().hincrby(self._job_key(job_id), "intentos", 1)
+        if intentos > CONTENT_JOB_MAX_ATTEMPTS:
+            logger.error(f"Trabajo {job_id} ({tipo}) descartado tras {intentos - 1} intentos.")
+            campos = {"estado": FALLIDO, "error": "Se agotaron los intentos de procesamiento.", "finalizado_en": time.time()}
+            await self._actualizar(job_id, campos)
+            self._transicion(tipo, FALLIDO)
+            if trabajo.get("callback_url"):
+                await self._notificar(trabajo["callback_url"], await self.obtener(job_id))
+            return
+        inicio = time.time()
+        Metrics.set_gauge("content_jobs.queue_wait_ms", (inicio - float(trabajo["creado_en"])) * 1000)
+        await self._actualizar(job_id, {"estado": EN_PROCESO, "iniciado_en": inicio})
+        self._transicion(tipo, EN_PROCESO)
+
+        current_user = UsuarioActual(
+            id_usuario=int(trabajo["id_usuario"]), email=trabajo["email"], nombre=trabajo["nombre"]
+        )
+        try:
+            data = esquema(**json.loads(trabajo["data"]))
+            async with AsyncSessionLocal() as db:
+                resultado = await manejador(data, current_user, db)
+            campos = {"estado": COMPLETADO, "resultado": json.dumps(jsonable_encoder(resultado), ensure_ascii=False)}
+        except Exception as e:
+            detalle = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.error(f"Error procesando el trabajo {job_id} ({tipo}): {detalle}")
+            campos = {"estado": FALLIDO, "error": str(detalle)}
+        campos["finalizado_en"] = time.time()
+        await self._actualizar(job_id, campos)
+        self._transicion(tipo, campos["estado"])
+        Metrics.set_gauge("content_jobs.run_ms", (campos["finalizado_en"] - inicio) * 1000)
+
+        if trabajo.get("callback_url"):
+            await self._notificar(trabajo["callback_url"], await self.obtener(job_id))
+
+    async def _notificar(self, callback_url: str, estado: dict):
+        """Envía el estado final al webhook del cliente, firmado, con reintentos y espera exponencial."""
+        if self._http is None:
+            # Sin redirecciones: una redirección podría llevar a un host interno
+            self._http = httpx.AsyncClient(timeout=CONTENT_JOB_WEBHOOK_TIMEOUT, follow_redirects=False)
+        cuerpo = json.dumps(estado, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        for intento in range(CONTENT_JOB_WEBHOOK_RETRIES):
+            try:
+                # Se vuelve a resolver el host: pudo cambiar de dirección desde que se encoló
+                await validar_callback_url(callback_url)
+                respuesta = await self._http.post(
+                    callback_url,
+                    content=cuerpo,
+                    headers={"Content-Type": "application/json", **firmar(cuerpo)},
+                )
+                respuesta.raise_for_status()
+                Metrics.incr("content_jobs.webhook.ok")
+                return
+            except HTTPException as e:
+                logger.warning(f"Webhook {callback_url} descartado: {e.detail}")
+                break
+            except Exception as e:
+                logger.warning(f"Webhook {callback_url} falló (intento {intento + 1}): {e}")
+                if intento + 1 < CONTENT_JOB_WEBHOOK_RETRIES:
+                    await asyncio.sleep(2 ** intento)
+        Metrics.incr("content_jobs.webhook.failed")
+
+    async def _marcar_tomado(self, redis, job_id: str):
+        await redis.eval(MARK_TAKEN_SCRIPT, 1, self._job_key(job_id), time.time())
+
+    async def _reencolar(self, redis, job_id: str) -> bool:
+        return bool(await redis.eval(
+            REQUEUE_SCRIPT, 3, PROCESSING_KEY, QUEUE_KEY, self._job_key(job_id), job_id, PENDIENTE, EN_PROCESO
+        ))
+
+    async def _latir(self, job_id: str):
+        """Renueva `tomado_en` mientras el trabajo se procesa, para que el reaper no lo reencole."""
+        while True:
+            await asyncio.sleep(CONTENT_JOB_VISIBILITY_TIMEOUT / 3)
+            try:
+                await self._marcar_tomado(self._redis(), job_id)
+            except Exception as e:
+                logger.warning(f"Error renovando el trabajo {job_id}: {e}")
+
+    async def _worker(self):
+        while True:
+            redis = SessionManager.redis_client
+            if redis is None:
+                await asyncio.sleep(1)
+                continue
+            try:
+                # El timeout del BLMOVE debe ser menor que el socket_timeout del cliente
+                job_id = await redis.blmove(QUEUE_KEY, PROCESSING_KEY, 1, "LEFT", "RIGHT")
+                Metrics.set_gauge("content_jobs.queue_depth", await redis.llen(QUEUE_KEY))
+                if job_id is None:
+                    continue
+                await self._marcar_tomado(redis, job_id)
+                latido = asyncio.create_task(self._latir(job_id))
+                try:
+                    await self.procesar(job_id)
+                except asyncio.CancelledError:
+                    # Al apagar el proceso, el trabajo en curso vuelve a la cola para otro worker
+                    await self._reencolar(redis, job_id)
+                    raise
+                finally:
+                    latido.cancel()
+                await redis.lrem(PROCESSING_KEY, 1, job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en el worker de trabajos: {e}")
+                await asyncio.sleep(1)
+
+    async def reencolar_vencidos(self) -> int:
+        """Devuelve a la cola los trabajos tomados cuyo worker dejó de dar señales.
+
+        Un trabajo sin `tomado_en` (el worker murió justo después del BLMOVE) recibe
+        la marca ahora y se reencola si sigue así tras el timeout.
+        """
+        redis = self._redis()
+        ahora = time.time()
+        reencolados = 0
+        for job_id in await redis.lrange(PROCESSING_KEY, 0, -1):
+            existe, tomado_en = await asyncio.gather(
+                redis.exists(self._job_key(job_id)), redis.hget(self._job_key(job_id), "tomado_en")
+            )
+            if not existe:
+                await redis.lrem(PROCESSING_KEY, 1, job_id)
+            elif tomado_en is None:
+                await self._marcar_tomado(redis, job_id)
+            elif ahora - float(tomado_en) > CONTENT_JOB_VISIBILITY_TIMEOUT:
+                if await self._reencolar(redis, job_id):
+                    logger.warning(f"Trabajo {job_id} sin señales desde hace {ahora - float(tomado_en):.0f}s: vuelve a la cola.")
+                    Metrics.incr("content_jobs.requeued")
+                    reencolados += 1
+        return reencolados
+
+    async def _reaper(self):
+        while True:
+            await asyncio.sleep(CONTENT_JOB_VISIBILITY_TIMEOUT / 3)
+            if SessionManager.redis_client is None:
+                continue
+            try:
+                await self.reencolar_vencidos()
+            except Exception as e:
+                logger.error(f"Error revisando los trabajos en proceso: {e}")
+
+    def iniciar_workers(self):
+        """Arranca los workers de este proceso."""
+        if not self._tareas and self.workers:
+            self._tareas = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            self._tareas.append(asyncio.create_task(self._reaper()))
+
+    async def detener_workers(self):
+        """Detiene los workers y cierra el cliente de webhooks."""
+        for tarea in self._tareas:
+            tarea.cancel()
+        for tarea in self._tareas:
+            try:
+                await tarea
+            except asyncio.CancelledError:
+                pass
+        self._tareas = []
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+# Cola compartida por el servicio de contenido
+job_queue = JobQueue()
+
+async def ejecutar_worker_dedicado():
+    """Procesa la cola fuera de la API (por ejemplo, cuando la API corre en Lambda)."""
+    from .config import close_client
+    from .usage import libro_uso
+    await SessionManager.initialize_redis()
+    job_queue.workers = max(1, job_queue.workers)
+    job_queue.iniciar_workers()
+    libro_uso.iniciar_liquidacion()
+    try:
+        await asyncio.gather(*job_queue._tareas)
+    finally:
+        await job_queue.detener_workers()
+        await libro_uso.detener_liquidacion()
+        await SessionManager.close_redis()
+        await close_client()
+
+# Uso: python -m services.ai_content_service.jobs
+if __name__ == "__main__":
+    asyncio.run(ejecutar_worker_dedicado())
@@ -0,0 +1,148 @@
+import json
+import re
+
+# Caracteres que cambian el estado del escáner; el resto se copia en bloque
+_ESPECIALES = re.compile(r'[{}\[\]",:\\“”\']')
+_COMILLAS_TIPOGRAFICAS = "“”"
+# Tras estos caracteres una comilla simple abre una cadena ({'clave': 'valor'})
+_ANTES_DE_VALOR = ("{", "[", ",", ":")
+_CIERRES = {"{": "}", "[": "]"}
+_CERCA = "```"
+
+def bloques_de_codigo(texto: str) -> list:
+    """Devuelve el contenido de los bloques ``` del texto, sin la etiqueta de lenguaje."""
+    bloques = []
+    inicio = texto.find(_CERCA)
+    while inicio != -1:
+        fin = texto.find(_CERCA, inicio + len(_CERCA))
+        if fin == -1:
+            # Bloque sin cerrar (respuesta truncada): se toma hasta el final
+            fin = len(texto)
+        contenido = texto[inicio + len(_CERCA):fin]
+        salto = contenido.find("\n")
+        # La primera línea puede ser la etiqueta de lenguaje (```json)
+        if salto != -1 and "{" not in contenido[:salto]:
+            contenido = contenido[salto + 1:]
+        bloques.append(contenido)
+        inicio = texto.find(_CERCA, fin + len(_CERCA)) if fin < len(texto) else -1
+    return bloques
+
+def _reparar_objeto(texto: str, inicio: int):
+    """Recorre una vez el objeto que empieza en `inicio` y lo devuelve reparado.
+
+    Respeta cadenas y escapes, elimina comas finales, convierte comillas
+    tipográficas y simples que delimitan cadenas en comillas rectas y, si el texto
+    se corta antes de cerrar el objeto, cierra la cadena y las llaves pendientes.
+    Devuelve (json_reparado, posición_siguiente).
+    """
+    salida = []
+    pila = []
+    en_cadena = False
+    cierre = '"'            # comillas que cierran la cadena abierta
+    escape = False
+    coma_pendiente = None   # índice en `salida` de una coma que aún puede ser final
+    ultimo = None           # último carácter significativo fuera de cadenas
+    pos = inicio
+
+    for m in _ESPECIALES.finditer(texto, inicio):
+        i = m.start()
+        if i > pos:
+            tramo = texto[pos:i]
+            salida.append(tramo)
+            if en_cadena:
+                escape = False
+            elif not tramo.isspace():
+                coma_pendiente = None
+                ultimo = tramo.rstrip()[-1]
+        pos = i + 1
+        c = m.group()
+
+        if en_cadena:
+            if escape:
+                escape = False
+                if c == "'":
+                    # \' no es un escape válido en JSON: queda solo el apóstrofo
+                    salida[-1] = ""
+                salida.append(c)
+            elif c == "\\":
+                escape = True
+                salida.append(c)
+            elif c in cierre:
+                en_cadena = False
+                salida.append('"')
+            elif c == '"':
+                # Comilla recta dentro de una cadena abierta con comillas tipográficas o simples
+                salida.append('\\"')
+            else:
+                salida.append(c)
+            continue
+
+        if c == '"' or c in _COMILLAS_TIPOGRAFICAS or (c == "'" and ultimo in _ANTES_DE_VALOR):
+            en_cadena = True
+            cierre = _COMILLAS_TIPOGRAFICAS if c in _COMILLAS_TIPOGRAFICAS else c
+            salida.append('"')
+            coma_pendiente = None
+            ultimo = '"'
+        elif c in "{[":
+            pila.append(_CIERRES[c])
+            salida.append(c)
+            coma_pendiente = None
+            ultimo = c
+        elif c in "}]":
+            if coma_pendiente is not None:
+                salida[coma_pendiente] = ""
+            coma_pendiente = None
+            # Se emite el cierre esperado aunque el modelo haya usado el otro
+            salida.append(pila.pop())
+            ultimo = c
+            if not pila:
+                return "".join(salida), pos
+        elif c == ",":
+            coma_pendiente = len(salida)
+            salida.append(c)
+            ultimo = c
+        else:
+            salida.append(c)
+            coma_pendiente = None
+            ultimo = c
+
+    # El texto terminó antes de cerrar el objeto: completar lo que falta
+    resto = texto[pos:]
+    salida.append(resto)
+    if resto and not en_cadena and not resto.isspace():
+        coma_pendiente = None
+        ultimo = resto.rstrip()[-1]
+    if en_cadena:
+        if escape:
+            salida.append("\\")
+        salida.append('"')
+    elif coma_pendiente is not None:
+        salida[coma_pendiente] = ""
+    elif ultimo == ":":
+        salida.append("null")
+    salida.extend(reversed(pila))
+    return "".join(salida), len(texto)
+
+def extraer_objeto_json(texto: str) -> dict:
+    """Extrae el primer objeto JSON balanceado del texto, reparando fallas comunes.
+
+    Prioriza el contenido de los bloques ``` y luego el texto completo. Cada
+    candidato se recorre una sola vez y la búsqueda continúa después de él, por lo
+    que el costo total es lineal en el largo del texto. Lanza ValueError si no
+    encuentra ningún objeto válido o si está demasiado anidado para parsearlo.
+    """
+    for segmento in bloques_de_codigo(texto) + [texto]:
+        inicio = segmento.find("{")
+        while inicio != -1:
+            reparado, siguiente = _reparar_objeto(segmento, inicio)
+            try:
+                valor = json.loads(reparado, strict=False)
+            except ValueError:
+                valor = None
+            except RecursionError:
+                # json.loads es recursivo: una salida con miles de niveles agota la pila
+                raise ValueError("El JSON de la respuesta está demasiado anidado.")
+            if isinstance(valor, dict):
+                return valor
+            inicio = segmento.find("{", siguiente)
+    raise ValueError("No se encontró un objeto JSON válido.")
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index, JSON
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from common.database.database import Base
 from datetime import datetime, timezone
@@ -9,8 +10,17 @@ class Documento(Base):
     id_documento = Column(Integer, primary_key=True, index=True)
     id_usuario = Column(Integer, ForeignKey("usuarios.id_usuario"), nullable=False)
     tipo_documento = Column(String, nullable=False)
-    contenido = Column(Text, nullable=False)
-    fecha_creacion = Column(DateTime, default=datetime.now(timezone.utc), nullable=False)
+    # JSON del resultado (o una cadena en documentos manuales). En PostgreSQL es JSONB, así
+    # que la base puede filtrar y devolver solo parte del contenido; SQLite lo guarda como texto JSON.
+    contenido = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=False)
+    # Plantilla@versión del prompt que generó el contenido (None en documentos manuales)
+    version_prompt = Column(String, nullable=True)
+    fecha_creacion = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
 
     # Relación de vuelta con Usuario
-    usuario = relationship("Usuario", back_populates="documentos")
\ No newline at end of file
+    usuario = relationship("Usuario", back_populates="documentos")
+
+    __table_args__ = (
+        # Listado de documentos del usuario, del más reciente al más antiguo, sin ordenar en memoria
+        Index("ix_documentos_usuario_fecha", id_usuario, fecha_creacion.desc(), id_documento.desc()),
+    )
@@ -0,0 +1,197 @@
+import logging
+import os
+import random
+import re
+import zlib
+from operator import attrgetter
+from typing import NamedTuple
+from common.utils.metrics import Metrics
+from .config import CONTENT_PROMPTS_DIR, CONTENT_PROMPT_VERSIONS
+
+logger = logging.getLogger(__name__)
+
+# Plantillas incluidas en el código; CONTENT_PROMPTS_DIR puede agregar versiones o reemplazarlas
+PLANTILLAS_DIR = os.path.join(os.path.dirname(__file__), "plantillas")
+
+# {{ campo }} o {{ raiz.atributo }} se reemplaza al renderizar; {{> nombre }} incluye otra
+# plantilla al cargar. Las llaves simples son texto (los esquemas JSON no se escapan).
+_MARCA = re.compile(r"\{\{\s*(>?)\s*([\w.]+)\s*\}\}")
+
+class Prompt(NamedTuple):
+    """Prompt ya renderizado junto con la plantilla y versión que lo produjeron."""
+    texto: str
+    nombre: str
+    version: str
+
+    @property
+    def etiqueta(self) -> str:
+        return f"{self.nombre}@{self.version}"
+
+def _campo(expresion: str):
+    """Precompila el acceso a `raiz` o `raiz.atributo.atributo` del contexto."""
+    raiz, _, ruta = expresion.partition(".")
+    if not ruta:
+        return lambda contexto: str(contexto[raiz])
+    obtener = attrgetter(ruta)
+    return lambda contexto: str(obtener(contexto[raiz]))
+
+class Plantilla:
+    """Plantilla compilada: tramos de texto fijo y accesos a campos, en orden.
+
+    Las inclusiones se resuelven al compilar y los tramos fijos contiguos se unen, así
+    que renderizar es un solo recorrido y un único `join`.
+    """
+
+    __slots__ = ("nombre", "version", "partes")
+
+    def __init__(self, nombre: str, version: str, partes: list):
+        self.nombre = nombre
+        self.version = version
+        self.partes = tuple(partes)
+
+    @property
+    def etiqueta(self) -> str:
+        return f"{self.nombre}@{self.version}"
+
+    def renderizar(self, contexto: dict) -> Prompt:
+        texto = "".join([parte if isinstance(parte, str) else parte(contexto) for parte in self.partes])
+        return Prompt(texto, self.nombre, self.version)
+
+def _clave_version(version: str):
+    """Orden natural de versiones: v2 < v10."""
+    numero = re.sub(r"\D", "", version)
+    return (int(numero) if numero else 0, version)
+
+class RegistroPrompts:
+    """Registro de plantillas de prompts versionadas.
+
+    Cada plantilla vive en `<directorio>/<nombre>/<version>.txt`. Se cargan y compilan
+    una vez (al arrancar el proceso). La versión activa de cada plantilla es la más
+    reciente, salvo que CONTENT_PROMPT_VERSIONS indique otra o un reparto con pesos
+    para A/B (por ejemplo "create_heading=v1:90/v2:10"); el reparto es estable por
+    usuario. Las plantillas cuyo nombre empieza con "_" son fragmentos compartidos
+    (preámbulo, detalles del producto, cierre) que las demás incluyen, de modo que
+    todos los endpoints envían el mismo prefijo y la caché de prefijos del proveedor
+    lo reutiliza.
+    """
+
+    def __init__(self, directorios: list = None, versiones: dict = None):
+        self.directorios = directorios or [PLANTILLAS_DIR] + ([CONTENT_PROMPTS_DIR] if CONTENT_PROMPTS_DIR else [])
+        self.versiones_configuradas = CONTENT_PROMPT_VERSIONS if versiones is None else versiones
+        self._fuentes = {}      # nombre -> {version: texto}
+        self._plantillas = {}   # (nombre, version) -> Plantilla
+        self._cargado = False
+
+    def cargar(self):
+        """Lee y compila todas las plantillas. Falla al arrancar si alguna es inválida."""
+        fuentes = {}
+        for directorio in self.directorios:
+            if not os.path.isdir(directorio):
+                raise RuntimeError(f"No existe el directorio de plantillas: {directorio}")
+            for nombre in sorted(os.listdir(directorio)):
+                carpeta = os.path.join(directorio, nombre)
+                if not os.path.isdir(carpeta):
+                    continue
+                for archivo in sorted(os.listdir(carpeta)):
+                    version, extension = os.path.splitext(archivo)
+                    if extension != ".txt":
+                        continue
+                    with open(os.path.join(carpeta, archivo), encoding="utf-8") as f:
+                        # Los directorios posteriores reemplazan versiones con el mismo nombre
+                        fuentes.setdefault(nombre, {})[version] = f.read().strip("\n")
+
+        self._fuentes = fuentes
+        self._plantillas = {}
+        for nombre, versiones in fuentes.items():
+            for version in versiones:
+                self._compilar(nombre, version, ())
+        for nombre, reparto in self.versiones_configuradas.items():
+            for version, _ in reparto:
+                if (nombre, version) not in self._plantillas:
+                    raise RuntimeError(f"CONTENT_PROMPT_VERSIONS: no existe la plantilla {nombre}@{version}")
+        self._cargado = True
+        logger.info(f"Plantillas de prompts cargadas: {sorted(p.etiqueta for p in self._plantillas.values())}")
+
+    def _compilar(self, nombre: str, version: str, incluyendo: tuple) -> Plantilla:
+        plantilla = self._plantillas.get((nombre, version))
+        if plantilla is not None:
+            return plantilla
+        if nombre in incluyendo:
+            raise RuntimeError(f"Inclusión circular de plantillas: {' -> '.join(incluyendo + (nombre,))}")
+
+        partes = []
+        def agregar_texto(texto: str):
+            if not texto:
+                return
+            if partes and isinstance(partes[-1], str):
+                partes[-1] += texto
+            else:
+                partes.append(texto)
+
+        fuente = self._fuentes[nombre][version]
+        pos = 0
+        for marca in _MARCA.finditer(fuente):
+            agregar_texto(fuente[pos:marca.start()])
+            pos = marca.end()
+            incluir, expresion = marca.groups()
+            if not incluir:
+                partes.append(_campo(expresion))
+                continue
+            if expresion not in self._fuentes:
+                raise RuntimeError(f"La plantilla {nombre}@{version} incluye {expresion}, que no existe")
+            incluida = self._compilar(expresion, self.predeterminada(expresion), incluyendo + (nombre,))
+            for parte in incluida.partes:
+                if isinstance(parte, str):
+                    agregar_texto(parte)
+                else:
+                    partes.append(parte)
+        agregar_texto(fuente[pos:])
+
+        plantilla = Plantilla(nombre, version, partes)
+        self._plantillas[(nombre, version)] = plantilla
+        return plantilla
+
+    def _asegurar_cargado(self):
+        if not self._cargado:
+            self.cargar()
+
+    def versiones(self, nombre: str) -> list:
+        self._asegurar_cargado()
+        return sorted(self._fuentes.get(nombre, {}), key=_clave_version)
+
+    def predeterminada(self, nombre: str) -> str:
+        """Versión de la plantilla sin reparto A/B: la de más peso configurada o la más reciente."""
+        reparto = self.versiones_configuradas.get(nombre)
+        if reparto:
+            return max(reparto, key=lambda par: par[1])[0]
+        return max(self._fuentes[nombre], key=_clave_version)
+
+    def elegir(self, nombre: str, clave=None) -> Plantilla:
+        """Plantilla activa. Con reparto A/B, `clave` (el id de usuario) fija la versión."""
+        self._asegurar_cargado()
+        if nombre not in self._fuentes:
+            raise KeyError(f"No existe la plantilla de prompt {nombre}")
+        reparto = self.versiones_configuradas.get(nombre)
+        if not reparto or len(reparto) == 1:
+            return self._plantillas[(nombre, self.predeterminada(nombre))]
+
+        total = sum(peso for _, peso in reparto)
+        if clave is None:
+            punto = random.random() * total
+        else:
+            # crc32 es estable entre procesos (hash() no lo es)
+            punto = zlib.crc32(f"{nombre}:{clave}".encode("utf-8")) / 0xFFFFFFFF * total
+        for version, peso in reparto:
+            punto -= peso
+            if punto < 0:
+                break
+        return self._plantillas[(nombre, version)]
+
+    def renderizar(self, nombre: str, contexto: dict, clave=None) -> Prompt:
+        """Renderiza la versión activa de `nombre` con el contexto dado."""
+        plantilla = self.elegir(nombre, clave)
+        Metrics.incr(f"prompts.{plantilla.etiqueta}")
+        return plantilla.renderizar(contexto)
+
+# Registro compartido por el servicio de contenido
+registro_prompts = RegistroPrompts()
@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+import uuid
+from types import SimpleNamespace
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from .schemas import RespuestaModelo
+
+# Proveedores disponibles para LLM_PROVIDER
+OPENAI = "openai"
+COMPATIBLE = "compatible"   # Cualquier API compatible con OpenAI (vLLM, Ollama, LiteLLM, servidor falso...)
+STUB = "stub"               # Generador local determinista, sin red
+
+# "Número de encabezados: 10" en el prompt fija el largo del arreglo `encabezados`
+_PISTA_CANTIDAD = re.compile(r"Número de (\w+): (\d+)")
+
+def crear_cliente(
+    proveedor: str,
+    api_key: str = None,
+    base_url: str = None,
+    http_client=None,
+    stub_latencia: float = 0.0,
+    stub_tokens_por_segundo: float = 0.0,
+    chars_por_token: float = 4.0,
+):
+    """Crea el cliente de chat completions del proveedor indicado.
+
+    Todos exponen la misma interfaz que AsyncOpenAI (`client.chat.completions.create` y
+    `client.close`), así que el resto del servicio no distingue entre ellos.
+    """
+    if proveedor == STUB:
+        return ClienteStub(stub_latencia, stub_tokens_por_segundo, chars_por_token)
+    if proveedor in (OPENAI, COMPATIBLE):
+        return AsyncOpenAI(
+            # Muchos servidores compatibles no piden clave, pero el SDK exige una
+            api_key=api_key or "sin-clave",
+            base_url=base_url,
+            http_client=http_client,
+            max_retries=0,  # Los reintentos los gestiona resilience.py
+        )
+    raise ValueError(f"LLM_PROVIDER desconocido: {proveedor} (usa {OPENAI}, {COMPATIBLE} o {STUB})")
+
+def _modelos_respuesta() -> list:
+    """Todos los modelos de respuesta declarados en schemas.py (incluidos los anidados)."""
+    pendientes, modelos = list(RespuestaModelo.__subclasses__()), []
+    while pendientes:
+        modelo = pendientes.pop()
+        modelos.append(modelo)
+        pendientes.extend(modelo.__subclasses__())
+    return modelos
+
+def esquema_para_prompt(prompt: str):
+    """Deduce el JSON Schema que pide un prompt a partir de las claves citadas en él.
+
+    Candidatos: los modelos de respuesta cuyas claves aparecen todas entre comillas.
+    Se descartan los que solo aparecen anidados dentro de otro candidato.
+    """
+    candidatos = [
+        modelo for modelo in _modelos_respuesta()
+        if all(f'"{campo}"' in prompt for campo in modelo.model_fields)
+    ]
+    anidados = set()
+    for modelo in candidatos:
+        anidados.update(modelo.model_json_schema().get("$defs", {}))
+    principales = [modelo for modelo in candidatos if modelo.__name__ not in anidados]
+    if not principales:
+        return None
+    return max(principales, key=lambda modelo: len(modelo.model_fields)).model_json_schema()
+
+def instancia_de_esquema(esquema: dict, rnd: random.Random, pistas: dict = None, definiciones: dict = None, campo: str = "valor"):
+    """Genera un valor que cumple el JSON Schema (subconjunto que produce pydantic)."""
+    pistas = pistas or {}
+    definiciones = definiciones if definiciones is not None else esquema.get("$defs", {})
+    if "$ref" in esquema:
+        return instancia_de_esquema(definiciones[esquema["$ref"].rsplit("/", 1)[-1]], rnd, pistas, definiciones, campo)
+    if "const" in esquema:
+        return esquema["const"]
+    if "enum" in esquema:
+        return rnd.choice(esquema["enum"])
+    if "anyOf" in esquema:
+        opciones = [opcion for opcion in esquema["anyOf"] if opcion.get("type") != "null"] or esquema["anyOf"]
+        return instancia_de_esquema(opciones[0], rnd, pistas, definiciones, campo)
+    tipo = esquema.get("type")
+    if tipo == "object":
+        return {
+            nombre: instancia_de_esquema(propiedad, rnd, pistas, definiciones, nombre)
+            for nombre, propiedad in esquema.get("properties", {}).items()
+        }
+    if tipo == "array":
+        cantidad = pistas.get(campo, esquema.get("minItems", 3))
+        return [instancia_de_esquema(esquema.get("items", {}), rnd, pistas, definiciones, campo) for _ in range(cantidad)]
+    if tipo == "integer":
+        return rnd.randint(1, 100)
+    if tipo == "number":
+        return round(rnd.uniform(1, 100), 2)
+    if tipo == "boolean":
+        return rnd.random() < 0.5
+    if tipo == "null":
+        return None
+    return f"{campo.replace('_', ' ').capitalize()} {rnd.getrandbits(32):08x}"
+
+class ClienteStub:
+    """Proveedor local que imita a AsyncOpenAI sin salir del proceso.
+
+    Responde JSON válido para el esquema pedido (el `response_format` si viene, o el
+    modelo de respuesta cuyas claves cita el prompt). La salida depende solo de los
+    mensajes, así que es reproducible. Simula la latencia hasta el primer token, la
+    velocidad de generación y el corte por `max_tokens`, e informa `usage`.
+    """
+
+    def __init__(self, latencia: float = 0.0, tokens_por_segundo: float = 0.0, chars_por_token: float = 4.0):
+        self.latencia = latencia
+        self.tokens_por_segundo = tokens_por_segundo
+        self.chars_por_token = chars_por_token
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._crear))
+
+    def _tokens(self, texto: str) -> int:
+        return math.ceil(len(texto) / self.chars_por_token) if texto else 0
+
+    def _generar(self, mensajes: list, formato: dict = None) -> str:
+        prompt = "\n".join(mensaje.get("content") or "" for mensaje in mensajes)
+        semilla = int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:8], "big")
+        if formato and formato.get("type") == "json_schema":
+            esquema = formato["json_schema"]["schema"]
+        else:
+            # En una repregunta el esquema está en el primer mensaje de la conversación
+            esquema = esquema_para_prompt(mensajes[0].get("content") or "")
+        if esquema is None:
+            return json.dumps({"resultado": "ok"})
+        pistas = {campo: int(cantidad) for campo, cantidad in _PISTA_CANTIDAD.findall(prompt)}
+        return json.dumps(instancia_de_esquema(esquema, random.Random(semilla), pistas), ensure_ascii=False)
+
+    async def _crear(self, model: str, messages: list, max_tokens: int = None, response_format: dict = None,
+                     stream: bool = False, stream_options: dict = None, **_):
+        contenido = self._generar(messages, response_format)
+        fin = "stop"
+        if max_tokens and self._tokens(contenido) > max_tokens:
+            # Igual que el modelo real: la salida se corta y queda JSON incompleto
+            contenido = contenido[:int(max_tokens * self.chars_por_token)]
+            fin = "length"
+        uso = {
+            "prompt_tokens": sum(self._tokens(mensaje.get("content") or "") for mensaje in messages),
+            "completion_tokens": self._tokens(contenido),
+        }
+        uso["total_tokens"] = uso["prompt_tokens"] + uso["completion_tokens"]
+        base = {"id": f"chatcmpl-stub-{uuid.uuid4().hex}", "created": int(time.time()), "model": f"stub/{model}"}
+
+        await asyncio.sleep(self.latencia)
+        if stream:
+            incluir_uso = bool((stream_options or {}).get("include_usage"))
+            return self._stream(base, contenido, fin, uso if incluir_uso else None)
+        if self.tokens_por_segundo > 0:
+            await asyncio.sleep(uso["completion_tokens"] / self.tokens_por_segundo)
+        return ChatCompletion.model_validate({
+            **base,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": contenido}, "finish_reason": fin}],
+            "usage": uso,
+        })
+
+    async def _stream(self, base: dict, contenido: str, fin: str, uso: dict = None):
+        # Fragmentos de ~50 ms de generación (o de 16 tokens si no se simula la velocidad)
+        tokens_por_fragmento = max(1, int(self.tokens_por_segundo * 0.05)) if self.tokens_por_segundo > 0 else 16
+        paso = max(1, int(tokens_por_fragmento * self.chars_por_token))
+        for inicio in range(0, len(contenido), paso):
+            fragmento = contenido[inicio:inicio + paso]
+            if self.tokens_por_segundo > 0:
+                await asyncio.sleep(self._tokens(fragmento) / self.tokens_por_segundo)
+            ultimo = inicio + paso >= len(contenido)
+            yield ChatCompletionChunk.model_validate({
+                **base,
+                "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {"content": fragmento}, "finish_reason": fin if ultimo else None}],
+            })
+        if uso is not None:
+            yield ChatCompletionChunk.model_validate({**base, "object": "chat.completion.chunk", "choices": [], "usage": uso})
+
+    async def close(self):
+        pass
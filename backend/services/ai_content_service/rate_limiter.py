@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import math
+import time
+from fastapi import HTTPException, status
+from common.utils.session_manager import SessionManager
+from common.utils.metrics import Metrics
+from .config import OPENAI_RPM_LIMIT, OPENAI_TPM_LIMIT, OPENAI_CHARS_PER_TOKEN
+
+logger = logging.getLogger(__name__)
+
+REQUESTS_KEY = "ratelimit:openai:requests"
+TOKENS_KEY = "ratelimit:openai:tokens"
+
+# Dos token buckets (peticiones y tokens) que se rellenan de forma continua. Con el
+# modo "consumir" descuenta ambos solo si los dos alcanzan; si no, devuelve cuántos
+# segundos faltan. El reloj es el de Redis, común a todos los workers.
+TOKEN_BUCKET_SCRIPT = """
+local t = redis.call('TIME')
+local ahora = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local req_cap, req_rate = tonumber(ARGV[1]), tonumber(ARGV[2])
+local tok_cap, tok_rate = tonumber(ARGV[3]), tonumber(ARGV[4])
+local cantidad, modo = tonumber(ARGV[5]), ARGV[6]
+
+local function nivel(clave, capacidad, ritmo)
+    local v = redis.call('HMGET', clave, 'nivel', 'ts')
+    local actual, ts = tonumber(v[1]), tonumber(v[2])
+    if actual == nil then
+        return capacidad
+    end
+    return math.min(capacidad, actual + math.max(0, ahora - ts) * ritmo)
+end
+
+local peticiones = nivel(KEYS[1], req_cap, req_rate)
+local tokens = nivel(KEYS[2], tok_cap, tok_rate)
+local espera = 0
+
+if modo == 'consumir' then
+    if peticiones < 1 then
+        espera = math.max(espera, (1 - peticiones) / req_rate)
+    end
+    if tokens < cantidad then
+        espera = math.max(espera, (cantidad - tokens) / tok_rate)
+    end
+    if espera == 0 then
+        peticiones = peticiones - 1
+        tokens = tokens - cantidad
+    end
+elseif modo == 'devolver' then
+    tokens = math.min(tok_cap, tokens + cantidad)
+end
+
+if modo ~= 'consultar' then
+    redis.call('HSET', KEYS[1], 'nivel', tostring(peticiones), 'ts', tostring(ahora))
+    redis.call('HSET', KEYS[2], 'nivel', tostring(tokens), 'ts', tostring(ahora))
+    redis.call('PEXPIRE', KEYS[1], 120000)
+    redis.call('PEXPIRE', KEYS[2], 120000)
+end
+return {tostring(espera), tostring(peticiones), tostring(tokens)}
+"""
+
+def estimar_tokens(mensajes: list, max_tokens: int) -> int:
+    """Tokens que puede consumir una llamada: el prompt estimado más el máximo de salida."""
+    caracteres = sum(len(mensaje.get("content") or "") for mensaje in mensajes)
+    return math.ceil(caracteres / OPENAI_CHARS_PER_TOKEN) + max_tokens
+
+class RateLimiter:
+    """Limitador distribuido de peticiones y tokens por minuto hacia OpenAI.
+
+    Antes de cada llamada se reservan una petición y los tokens estimados (prompt +
+    `max_tokens`). Dentro de un proceso los llamadores esperan su turno en orden de
+    llegada (asyncio.Lock es FIFO), de modo que una llamada grande no queda relegada
+    indefinidamente por otras pequeñas; la espera del turno también respeta el plazo del
+    llamador. Si Redis no está disponible, deja pasar.
+    """
+
+    def __init__(self, rpm: int = OPENAI_RPM_LIMIT, tpm: int = OPENAI_TPM_LIMIT, nombre: str = "openai"):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.nombre = nombre
+        self._turno = asyncio.Lock()
+        self._esperando = 0
+        self._script = None
+
+    @property
+    def habilitado(self) -> bool:
+        return self.rpm > 0 and self.tpm > 0
+
+    async def _ejecutar(self, modo: str, cantidad: int = 0):
+        redis = SessionManager.redis_client
+        if redis is None:
+            return None
+        if self._script is None:
+            self._script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+        espera, peticiones, tokens = await self._script(
+            keys=[REQUESTS_KEY, TOKENS_KEY],
+            args=[self.rpm, self.rpm / 60, self.tpm, self.tpm / 60, cantidad, modo],
+        )
+        Metrics.set_gauge(f"{self.nombre}.ratelimit.requests_level", round(float(peticiones), 2))
+        Metrics.set_gauge(f"{self.nombre}.ratelimit.tokens_level", round(float(tokens), 2))
+        return float(espera)
+
+    def _rechazo(self, espera: float) -> HTTPException:
+        Metrics.incr(f"{self.nombre}.ratelimit.rejected")
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Hay demasiadas generaciones en curso, intenta nuevamente en unos segundos.",
+            headers={"Retry-After": str(max(1, math.ceil(espera)))},
+        )
+
+    async def adquirir(self, tokens: int, limite: float = None) -> int:
+        """Reserva una petición y `tokens`, esperando en la cola si hace falta.
+
+        `limite` es el instante (time.monotonic) en que vence el plazo del llamador; si
+        la espera (por el turno o por el bucket) no cabe en él, responde 503 en lugar de
+        esperar en vano. Devuelve los tokens efectivamente reservados (0 si no se reservó).
+        """
+        if not self.habilitado:
+            return 0
+        tokens = min(tokens, self.tpm)
+        self._esperando += 1
+        Metrics.set_gauge(f"{self.nombre}.ratelimit.waiting", self._esperando)
+        inicio = time.monotonic()
+        try:
+            # El turno también consume el plazo: quien está en la cabeza puede dormir
+            # hasta que el bucket se rellene, y los de atrás no deben esperarlo a ciegas.
+            if limite is None:
+                await self._turno.acquire()
+            else:
+                try:
+                    await asyncio.wait_for(self._turno.acquire(), max(0, limite - time.monotonic()))
+                except asyncio.TimeoutError:
+                    raise self._rechazo(1)
+            try:
+                while True:
+                    try:
+                        espera = await self._ejecutar("consumir", tokens)
+                    except Exception as e:
+                        logger.error(f"Error consultando el rate limiter: {e}")
+                        Metrics.incr(f"{self.nombre}.ratelimit.unavailable")
+                        return 0
+                    if espera is None:
+                        return 0
+                    if not espera:
+                        return tokens
+                    if limite is not None and time.monotonic() + espera >= limite:
+                        raise self._rechazo(espera)
+                    Metrics.incr(f"{self.nombre}.ratelimit.throttled")
+                    await asyncio.sleep(espera)
+            finally:
+                self._turno.release()
+        finally:
+            self._esperando -= 1
+            Metrics.set_gauge(f"{self.nombre}.ratelimit.waiting", self._esperando)
+            Metrics.set_gauge(f"{self.nombre}.ratelimit.wait_ms", round((time.monotonic() - inicio) * 1000, 1))
+
+    async def devolver(self, tokens: int):
+        """Devuelve al bucket los tokens reservados de más (estimado - uso real)."""
+        if not self.habilitado or tokens <= 0:
+            return
+        try:
+            await self._ejecutar("devolver", tokens)
+        except Exception as e:
+            logger.error(f"Error devolviendo tokens al rate limiter: {e}")
+
+    def reserva(self, tokens: int) -> "Reserva":
+        return Reserva(self, tokens)
+
+    async def niveles(self) -> dict:
+        """Nivel actual de los buckets, sin consumir."""
+        niveles = {
+            "habilitado": self.habilitado,
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "esperando": self._esperando,
+        }
+        if self.habilitado and SessionManager.redis_client is not None:
+            await self._ejecutar("consultar")
+            niveles["peticiones_disponibles"] = Metrics.get(f"{self.nombre}.ratelimit.requests_level")
+            niveles["tokens_disponibles"] = Metrics.get(f"{self.nombre}.ratelimit.tokens_level")
+        return niveles
+
+class Reserva:
+    """Tokens reservados por una llamada a lo largo de sus intentos.
+
+    Cada intento reserva el estimado completo; al terminar, `liquidar(usados)` devuelve
+    al bucket todo lo que no se consumió, incluidas las reservas de los intentos que
+    fallaron (sin uso informado se devuelve todo).
+    """
+
+    def __init__(self, limitador: RateLimiter, tokens: int):
+        self.limitador = limitador
+        self.tokens = tokens
+        self.reservados = 0
+
+    async def adquirir(self, limite: float = None):
+        self.reservados += await self.limitador.adquirir(self.tokens, limite)
+
+    async def liquidar(self, usados: int = 0):
+        devolver, self.reservados = self.reservados - usados, 0
+        await self.limitador.devolver(devolver)
+
+# Limitador compartido por todas las llamadas a OpenAI del proceso
+limitador_openai = RateLimiter()
@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+import openai
+from fastapi import HTTPException, status
+from common.utils.metrics import Metrics
+from .config import (
+    OPENAI_MAX_RETRIES,
+    OPENAI_BACKOFF_BASE,
+    OPENAI_BACKOFF_MAX,
+    OPENAI_DEADLINE,
+    OPENAI_DEADLINES,
+    CIRCUIT_BREAKER_ERROR_RATE,
+    CIRCUIT_BREAKER_MIN_CALLS,
+    CIRCUIT_BREAKER_WINDOW,
+    CIRCUIT_BREAKER_COOLDOWN,
+)
+
+logger = logging.getLogger(__name__)
+
+# Estados del circuit breaker (el valor se exporta como gauge)
+CERRADO = 0
+SEMIABIERTO = 1
+ABIERTO = 2
+
+def plazo_para(endpoint: str = None) -> float:
+    """Plazo total en segundos de una generación del endpoint."""
+    return OPENAI_DEADLINES.get(endpoint, OPENAI_DEADLINE)
+
+def es_reintentable(error: Exception) -> bool:
+    """429, 5xx, errores de conexión y timeouts; los demás 4xx no mejoran reintentando."""
+    if isinstance(error, (openai.APIConnectionError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+def retry_after(error: Exception):
+    """Segundos indicados por el header Retry-After de la respuesta, si viene."""
+    response = getattr(error, "response", None)
+    valor = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(valor) if valor is not None else None
+    except ValueError:
+        return None
+
+class CircuitBreaker:
+    """Circuit breaker por tasa de errores sobre una ventana deslizante de tiempo.
+
+    Cerrado: deja pasar todo y registra resultados. Abierto: rechaza al instante
+    durante `cooldown`. Semiabierto: deja pasar una sola llamada de prueba que
+    decide si se vuelve a cerrar o a abrir.
+    """
+
+    def __init__(
+        self,
+        nombre: str,
+        error_rate: float = CIRCUIT_BREAKER_ERROR_RATE,
+        min_calls: int = CIRCUIT_BREAKER_MIN_CALLS,
+        window: float = CIRCUIT_BREAKER_WINDOW,
+        cooldown: float = CIRCUIT_BREAKER_COOLDOWN,
+    ):
+        self.nombre = nombre
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.estado = CERRADO
+        self._resultados = deque()  # (momento, fallo)
+        self._fallos = 0
+        self._abierto_en = 0.0
+        self._prueba_en_curso = False
+        self._publicar()
+
+    def _publicar(self):
+        Metrics.set_gauge(f"{self.nombre}.circuit.state", self.estado)
+
+    def _cambiar(self, estado: int):
+        if estado != self.estado:
+            logger.warning(f"Circuit breaker {self.nombre}: {self.estado} -> {estado}")
+            self.estado = estado
+            if estado == ABIERTO:
+                self._abierto_en = time.monotonic()
+                Metrics.incr(f"{self.nombre}.circuit.opened")
+            self._publicar()
+
+    def _depurar(self, ahora: float):
+        while self._resultados and self._resultados[0][0] < ahora - self.window:
+            _, fallo = self._resultados.popleft()
+            self._fallos -= fallo
+
+    def reintentar_en(self) -> float:
+        """Segundos que faltan para que el circuito admita una llamada de prueba."""
+        return max(0.0, self._abierto_en + self.cooldown - time.monotonic())
+
+    def permitir(self) -> bool:
+        """Indica si una llamada puede salir; en semiabierto solo pasa una prueba a la vez."""
+        if self.estado == ABIERTO:
+            if self.reintentar_en() > 0:
+                return False
+            self._cambiar(SEMIABIERTO)
+        if self.estado == SEMIABIERTO:
+            if self._prueba_en_curso:
+                return False
+            self._prueba_en_curso = True
+        return True
+
+    def registrar(self, fallo: bool):
+        """Registra el resultado de una llamada que pasó por `permitir`."""
+        if self.estado == SEMIABIERTO:
+            self._prueba_en_curso = False
+            if fallo:
+                self._cambiar(ABIERTO)
+            else:
+                self._resultados.clear()
+                self._fallos = 0
+                self._cambiar(CERRADO)
+            return
+
+        ahora = time.monotonic()
+        self._resultados.append((ahora, int(fallo)))
+        self._fallos += int(fallo)
+        self._depurar(ahora)
+        total = len(self._resultados)
+        tasa = self._fallos / total if total else 0.0
+        Metrics.set_gauge(f"{self.nombre}.circuit.error_rate", round(tasa, 3))
+        if self.estado == CERRADO and total >= self.min_calls and tasa >= self.error_rate:
+            self._cambiar(ABIERTO)
+
+    def liberar(self):
+        """Libera la prueba del estado semiabierto si la llamada terminó sin resultado."""
+        if self.estado == SEMIABIERTO:
+            self._prueba_en_curso = False
+
+class PoliticaResiliencia:
+    """Reintentos con backoff exponencial y jitter y plazo total.
+
+    El circuit breaker lo indica cada ejecución: el router usa uno por endpoint y modelo,
+    así que la política no tiene uno propio.
+    """
+
+    def __init__(
+        self,
+        nombre: str = "openai",
+        max_retries: int = OPENAI_MAX_RETRIES,
+        backoff_base: float = OPENAI_BACKOFF_BASE,
+        backoff_max: float = OPENAI_BACKOFF_MAX,
+    ):
+        self.nombre = nombre
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def espera(self, intento: int, error: Exception) -> float:
+        """Full jitter sobre la espera exponencial, sin bajar de lo que pida Retry-After."""
+        espera = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** intento))
+        pedido = retry_after(error)
+        return max(espera, pedido) if pedido is not None else espera
+
+    async def ejecutar(
+        self,
+        funcion,
+        breaker: CircuitBreaker,
+        endpoint: str = None,
+        antes=None,
+        limite: float = None,
+        max_retries: int = None,
+        plazo_intento: float = None,
+    ):
+        """Ejecuta `funcion()` (una corrutina nueva por intento) aplicando la política.
+
+        `breaker` es el circuit breaker que decide si la llamada sale y registra su resultado.
+        `antes(limite)` se espera antes de cada intento (por ejemplo, el rate limiter);
+        consume el mismo plazo pero no cuenta para el circuit breaker. `limite` (instante
+        de `time.monotonic()`) reemplaza el plazo del endpoint cuando varias ejecuciones
+        comparten uno; `max_retries` y `plazo_intento` (tope de cada intento) ajustan la
+        política para esta ejecución.
+        """
+        if limite is None:
+            limite = time.monotonic() + plazo_para(endpoint)
+        max_retries = self.max_retries if max_retries is None else max_retries
+        intento = 0
+        while True:
+            if not breaker.permitir():
+                Metrics.incr(f"{breaker.nombre}.circuit.rejected")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="El servicio de generación no está disponible temporalmente.",
+                    headers={"Retry-After": str(max(1, round(breaker.reintentar_en())))},
+                )
+            if antes is not None:
+                try:
+                    await antes(limite)
+                except BaseException:
+                    breaker.liberar()
+                    raise
+
+            restante = limite - time.monotonic()
+            if plazo_intento is not None:
+                restante = min(restante, plazo_intento)
+            try:
+                resultado = await asyncio.wait_for(funcion(), timeout=max(restante, 0.001))
+            except asyncio.CancelledError:
+                breaker.liberar()
+                raise
+            except Exception as e:
+                reintentable = es_reintentable(e)
+                breaker.registrar(fallo=reintentable)
+                if not reintentable:
+                    raise
+                espera = self.espera(intento, e)
+                if intento >= max_retries or time.monotonic() + espera >= limite:
+                    self._agotado(e, limite)
+                intento += 1
+                Metrics.incr(f"{self.nombre}.retries")
+                Metrics.incr(f"{self.nombre}.retries.{type(e).__name__}")
+                logger.warning(f"Reintento {intento} de {self.nombre} en {espera:.2f}s: {e!r}")
+                await asyncio.sleep(espera)
+                continue
+            breaker.registrar(fallo=False)
+            return resultado
+
+    def _agotado(self, error: Exception, limite: float):
+        """Traduce el último error reintentable en la respuesta HTTP adecuada."""
+        if time.monotonic() >= limite or isinstance(error, asyncio.TimeoutError):
+            Metrics.incr(f"{self.nombre}.deadline_exceeded")
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="La generación superó el tiempo máximo permitido.",
+            ) from error
+        Metrics.incr(f"{self.nombre}.retries_exhausted")
+        pedido = retry_after(error)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El servicio de generación está saturado, intenta nuevamente en unos segundos.",
+            headers={"Retry-After": str(max(1, round(pedido or self.backoff_base)))},
+        ) from error
+
+# Política compartida por todas las llamadas a OpenAI del proceso
+resiliencia_openai = PoliticaResiliencia()
@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import deque
+from typing import NamedTuple
+import openai
+from fastapi import HTTPException, status
+from common.utils.metrics import Metrics
+from .config import (
+    OPENAI_MODEL,
+    OPENAI_TEMPERATURE,
+    OPENAI_TEMPERATURES,
+    OPENAI_FALLBACK_MODELS,
+    OPENAI_LATENCY_SLO,
+    OPENAI_MODEL_ROUTES,
+    ROUTER_WINDOW,
+    ROUTER_MIN_SAMPLES,
+    ROUTER_MAX_ERROR_RATE,
+    ROUTER_PROBE_RATE,
+)
+from .resilience import CircuitBreaker, resiliencia_openai, plazo_para, es_reintentable
+
+logger = logging.getLogger(__name__)
+
+# Con un respaldo disponible, un intento que tarda más de este múltiplo del SLO se corta
+# y se pasa al siguiente modelo (el último candidato usa todo el plazo del endpoint)
+CORTE_POR_SLO = 2.0
+
+# Estado de un modelo para el router
+SANO = "sano"
+LENTO = "lento"
+FALLANDO = "fallando"
+
+class PoliticaModelo(NamedTuple):
+    """Modelos de un endpoint en orden de preferencia, SLO de latencia p95 y temperatura."""
+    modelos: tuple
+    slo: float
+    temperatura: float
+
+    @property
+    def principal(self) -> str:
+        return self.modelos[0]
+
+def politica_para(endpoint: str = None) -> PoliticaModelo:
+    """Política configurada para el endpoint (OPENAI_MODEL_ROUTES) o la predeterminada."""
+    modelos, slo = OPENAI_MODEL_ROUTES.get(endpoint, ([OPENAI_MODEL, *OPENAI_FALLBACK_MODELS], OPENAI_LATENCY_SLO))
+    return PoliticaModelo(
+        tuple(dict.fromkeys(modelos or [OPENAI_MODEL])),  # Sin repetidos, en el orden dado
+        slo,
+        OPENAI_TEMPERATURES.get(endpoint, OPENAI_TEMPERATURE),
+    )
+
+class EstadisticasModelo:
+    """Latencias y errores recientes de un modelo en un endpoint (ventana deslizante)."""
+
+    def __init__(self, window: float = ROUTER_WINDOW):
+        self.window = window
+        self._muestras = deque()  # (momento, latencia o None, fallo)
+        self._fallos = 0
+
+    def _depurar(self, ahora: float):
+        while self._muestras and self._muestras[0][0] < ahora - self.window:
+            _, _, fallo = self._muestras.popleft()
+            self._fallos -= fallo
+
+    def registrar(self, latencia: float = None, fallo: bool = False):
+        ahora = time.monotonic()
+        self._muestras.append((ahora, latencia, int(fallo)))
+        self._fallos += int(fallo)
+        self._depurar(ahora)
+
+    def resumen(self) -> tuple:
+        """(muestras, p95 de latencia en segundos o None, tasa de errores) de la ventana."""
+        self._depurar(time.monotonic())
+        total = len(self._muestras)
+        latencias = sorted(latencia for _, latencia, _ in self._muestras if latencia is not None)
+        p95 = latencias[max(0, math.ceil(len(latencias) * 0.95) - 1)] if latencias else None
+        return total, p95, self._fallos / total if total else 0.0
+
+class EnrutadorModelos:
+    """Elige el modelo de cada llamada según la política del endpoint y su salud reciente.
+
+    Cada endpoint tiene un modelo principal y respaldos en orden de preferencia (el más
+    barato primero). Un modelo con al menos `min_muestras` en la ventana queda degradado
+    si su p95 supera el SLO del endpoint o su tasa de errores supera `max_error_rate`; los
+    degradados pasan al final de la lista. Una fracción `probe_rate` de las llamadas
+    conserva el orden configurado para que el principal se vuelva a medir y recupere su
+    lugar. Cada modelo de cada endpoint tiene su propio circuit breaker: los fallos del
+    principal no bloquean a sus respaldos. Las estadísticas y los breakers son por proceso.
+    """
+
+    def __init__(
+        self,
+        min_muestras: int = ROUTER_MIN_SAMPLES,
+        max_error_rate: float = ROUTER_MAX_ERROR_RATE,
+        probe_rate: float = ROUTER_PROBE_RATE,
+        window: float = ROUTER_WINDOW,
+    ):
+        self.min_muestras = min_muestras
+        self.max_error_rate = max_error_rate
+        self.probe_rate = probe_rate
+        self.window = window
+        self._politicas = {}      # endpoint -> PoliticaModelo
+        self._estadisticas = {}   # (endpoint, modelo) -> EstadisticasModelo
+        self._breakers = {}       # (endpoint, modelo) -> CircuitBreaker
+
+    def politica(self, endpoint: str = None) -> PoliticaModelo:
+        politica = self._politicas.get(endpoint)
+        if politica is None:
+            politica = self._politicas[endpoint] = politica_para(endpoint)
+        return politica
+
+    def _estadisticas_de(self, endpoint: str, modelo: str) -> EstadisticasModelo:
+        estadisticas = self._estadisticas.get((endpoint, modelo))
+        if estadisticas is None:
+            estadisticas = self._estadisticas[(endpoint, modelo)] = EstadisticasModelo(self.window)
+        return estadisticas
+
+    def breaker(self, endpoint: str, modelo: str) -> CircuitBreaker:
+        breaker = self._breakers.get((endpoint, modelo))
+        if breaker is None:
+            breaker = self._breakers[(endpoint, modelo)] = CircuitBreaker(f"openai.{endpoint or 'default'}.{modelo}")
+        return breaker
+
+    def salud(self, endpoint: str, modelo: str) -> str:
+        """SANO, LENTO (p95 sobre el SLO) o FALLANDO (demasiados errores)."""
+        muestras, p95, tasa = self._estadisticas_de(endpoint, modelo).resumen()
+        if muestras < self.min_muestras:
+            return SANO
+        if tasa > self.max_error_rate:
+            return FALLANDO
+        if p95 is not None and p95 > self.politica(endpoint).slo:
+            return LENTO
+        return SANO
+
+    def candidatos(self, endpoint: str = None) -> list:
+        """Modelos a intentar, en orden: los sanos según la política y luego los degradados."""
+        modelos = self.politica(endpoint).modelos
+        if len(modelos) == 1:
+            return list(modelos)
+        sanos, degradados = [], []
+        for modelo in modelos:
+            (sanos if self.salud(endpoint, modelo) == SANO else degradados).append(modelo)
+        if degradados and sanos and random.random() < self.probe_rate:
+            Metrics.incr(f"router.{endpoint or 'default'}.probes")
+            return list(modelos)
+        return sanos + degradados
+
+    def registrar(self, endpoint: str, modelo: str, latencia: float = None, fallo: bool = False):
+        """Registra el resultado de un intento y publica p95 y tasa de errores como gauges."""
+        estadisticas = self._estadisticas_de(endpoint, modelo)
+        estadisticas.registrar(latencia, fallo)
+        _, p95, tasa = estadisticas.resumen()
+        nombre = f"router.{endpoint or 'default'}.{modelo}"
+        if p95 is not None:
+            Metrics.set_gauge(f"{nombre}.p95_ms", round(p95 * 1000))
+        Metrics.set_gauge(f"{nombre}.error_rate", round(tasa, 3))
+
+    async def _intento(self, endpoint: str, modelo: str, crear, medir_latencia: bool):
+        """Un intento contra `modelo`, registrando su latencia y si falló."""
+        inicio = time.monotonic()
+        try:
+            resultado = await crear(modelo)
+        except asyncio.CancelledError:
+            # Cortado por el plazo: cuenta como lento. Una cancelación temprana (el
+            # cliente se fue) no dice nada del modelo.
+            latencia = time.monotonic() - inicio
+            if latencia >= self.politica(endpoint).slo:
+                self.registrar(endpoint, modelo, latencia, fallo=True)
+            raise
+        except Exception as e:
+            fallo = es_reintentable(e) or isinstance(e, openai.NotFoundError)
+            self.registrar(endpoint, modelo, None, fallo=fallo)
+            raise
+        latencia = time.monotonic() - inicio
+        self.registrar(endpoint, modelo, latencia if medir_latencia else None)
+        return resultado
+
+    async def ejecutar(self, endpoint: str, crear, antes=None, medir_latencia: bool = True):
+        """Ejecuta `crear(modelo)` con la política de resiliencia, cambiando de modelo si falla.
+
+        Todos los candidatos comparten el plazo del endpoint. Mientras quede un respaldo,
+        un modelo que responde con errores reintentables, no existe, tiene el circuito
+        abierto o tarda más de `CORTE_POR_SLO` veces el SLO se abandona sin reintentar y se
+        pasa al siguiente;
+        el último candidato tiene los reintentos normales. `medir_latencia=False` (streams)
+        solo registra errores: abrir un stream no mide la generación completa.
+        """
+        politica = self.politica(endpoint)
+        candidatos = self.candidatos(endpoint)
+        limite = time.monotonic() + plazo_para(endpoint)
+        for posicion, modelo in enumerate(candidatos):
+            ultimo = posicion == len(candidatos) - 1
+            if posicion:
+                Metrics.incr(f"router.{endpoint or 'default'}.failover")
+                logger.warning(f"Router {endpoint}: se pasa a {modelo}")
+            try:
+                return await resiliencia_openai.ejecutar(
+                    lambda modelo=modelo: self._intento(endpoint, modelo, crear, medir_latencia),
+                    self.breaker(endpoint, modelo),
+                    endpoint,
+                    antes=antes,
+                    limite=limite,
+                    max_retries=None if ultimo else 0,
+                    plazo_intento=None if ultimo else politica.slo * CORTE_POR_SLO,
+                )
+            except openai.NotFoundError:
+                logger.error(f"Router {endpoint}: el modelo {modelo} no existe")
+                if ultimo:
+                    raise
+            except HTTPException as e:
+                agotado = e.status_code in (status.HTTP_503_SERVICE_UNAVAILABLE, status.HTTP_504_GATEWAY_TIMEOUT)
+                if ultimo or not agotado or time.monotonic() >= limite:
+                    raise
+
+    def estado(self) -> dict:
+        """Política y salud de cada modelo por endpoint, según las estadísticas de este proceso."""
+        endpoints = {endpoint for endpoint, _ in self._estadisticas} | set(OPENAI_MODEL_ROUTES)
+        estado = {}
+        for endpoint in sorted(endpoints, key=str):
+            politica = self.politica(endpoint)
+            modelos = []
+            for modelo in politica.modelos:
+                muestras, p95, tasa = self._estadisticas_de(endpoint, modelo).resumen()
+                modelos.append({
+                    "modelo": modelo,
+                    "salud": self.salud(endpoint, modelo),
+                    "muestras": muestras,
+                    "p95_ms": round(p95 * 1000) if p95 is not None else None,
+                    "error_rate": round(tasa, 3),
+                    "circuito": self.breaker(endpoint, modelo).estado,
+                })
+            estado[endpoint or "default"] = {"slo_s": politica.slo, "temperatura": politica.temperatura, "modelos": modelos}
+        return estado
+
+# Router compartido por todas las llamadas al modelo del proceso
+enrutador_modelos = EnrutadorModelos()
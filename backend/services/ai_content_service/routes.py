@@ -1,66 +1,185 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi.responses import StreamingResponse, JSONResponse
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from .handlers import (
     manejar_definir_campana,
     manejar_definir_publico_ubicaciones,
     manejar_elegir_formato_cta,
     manejar_crear_contenido_creativo,
-    manejar_create_heading
+    manejar_create_heading,
+    manejar_campana_completa,
+    manejar_stream,
+    construir_prompt_definir_campana,
+    construir_prompt_definir_publico_ubicaciones,
+    construir_prompt_elegir_formato_cta,
+    construir_prompt_crear_contenido_creativo,
+    construir_prompt_create_heading,
+    finalizar_encabezados,
+    tokens_encabezados
 )
 from .schemas import (
     CampanaDetallesInput,
     PublicoObjetivoUbicacionesInput,
     FormatoCTAInput,
     ContenidoCreativoInput,
-    EncabezadoAnuncio
+    EncabezadoAnuncio,
+    CampanaCompletaInput,
+    DetallesCampana,
+    PublicoUbicaciones,
+    FormatoCTA,
+    ContenidoCreativo,
+    Encabezados,
+    CampanaCompleta
 )
+from .jobs import job_queue
+from .rate_limiter import limitador_openai
+from .router import enrutador_modelos
+from .usage import libro_uso
 from ..auth_service.security import get_current_user
-from common.models.usuario import Usuario
-from common.database.database import get_db
+from services.auth_service.principal_cache import UsuarioActual
+from common.database.database import get_async_db
 
 router = APIRouter()
 
-@router.post("/definir_campana", summary="Definir objetivo de campaña y detalles")
+async def responder_stream(eventos, current_user: UsuarioActual) -> StreamingResponse:
+    """Envuelve un generador de eventos SSE en una respuesta HTTP en streaming."""
+    # La cuota se verifica antes de abrir el stream para poder responder 429
+    await libro_uso.verificar(current_user.id_usuario)
+    return StreamingResponse(
+        eventos,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def responder_trabajo(tipo: str, data, current_user: UsuarioActual, callback_url: Optional[str]) -> JSONResponse:
+    """Encola la generación y responde de inmediato con el id del trabajo."""
+    await libro_uso.verificar(current_user.id_usuario)
+    job_id = await job_queue.encolar(tipo, data, current_user, callback_url)
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={"job_id": job_id, "estado": "pendiente", "url": f"/content/jobs/{job_id}"},
+    )
+
+@router.post("/definir_campana", response_model=DetallesCampana, summary="Definir objetivo de campaña y detalles")
 async def definir_campana_endpoint(
     data: CampanaDetallesInput,
-    current_user: Usuario = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    stream: bool = Query(False, description="Devolver la generación como Server-Sent Events"),
+    asincrono: bool = Query(False, description="Encolar la generación y devolver el id del trabajo"),
+    callback_url: Optional[str] = Query(None, description="URL a la que se envía el resultado del trabajo"),
+    current_user: UsuarioActual = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     print(f"Usuario ID: {current_user.id_usuario} | Datos recibidos en /definir_campana: {data.dict()}")
+    if asincrono:
+        return await responder_trabajo("definir_campana", data, current_user, callback_url)
+    if stream:
+        prompt = construir_prompt_definir_campana(data, current_user.id_usuario)
+        return await responder_stream(manejar_stream("definir_campana", data, prompt, DetallesCampana, current_user), current_user)
     return await manejar_definir_campana(data, current_user, db)
 
-@router.post("/definir_publico_ubicaciones", summary="Definir público objetivo y ubicaciones")
+@router.post("/definir_publico_ubicaciones", response_model=PublicoUbicaciones, summary="Definir público objetivo y ubicaciones")
 async def definir_publico_ubicaciones_endpoint(
     data: PublicoObjetivoUbicacionesInput,
-    current_user: Usuario = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    stream: bool = Query(False, description="Devolver la generación como Server-Sent Events"),
+    asincrono: bool = Query(False, description="Encolar la generación y devolver el id del trabajo"),
+    callback_url: Optional[str] = Query(None, description="URL a la que se envía el resultado del trabajo"),
+    current_user: UsuarioActual = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     print(f"Usuario ID: {current_user.id_usuario} | Datos recibidos en /definir_publico_ubicaciones: {data.dict()}")
+    if asincrono:
+        return await responder_trabajo("definir_publico_ubicaciones", data, current_user, callback_url)
+    if stream:
+        prompt = construir_prompt_definir_publico_ubicaciones(data, current_user.id_usuario)
+        return await responder_stream(manejar_stream("definir_publico_ubicaciones", data, prompt, PublicoUbicaciones, current_user), current_user)
     return await manejar_definir_publico_ubicaciones(data, current_user, db)
 
-@router.post("/elegir_formato_cta", summary="Elegir formato y CTA")
+@router.post("/elegir_formato_cta", response_model=FormatoCTA, summary="Elegir formato y CTA")
 async def elegir_formato_cta_endpoint(
     data: FormatoCTAInput,
-    current_user: Usuario = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    stream: bool = Query(False, description="Devolver la generación como Server-Sent Events"),
+    asincrono: bool = Query(False, description="Encolar la generación y devolver el id del trabajo"),
+    callback_url: Optional[str] = Query(None, description="URL a la que se envía el resultado del trabajo"),
+    current_user: UsuarioActual = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     print(f"Usuario ID: {current_user.id_usuario} | Datos recibidos en /elegir_formato_cta: {data.dict()}")
+    if asincrono:
+        return await responder_trabajo("elegir_formato_cta", data, current_user, callback_url)
+    if stream:
+        prompt = construir_prompt_elegir_formato_cta(data, current_user.id_usuario)
+        return await responder_stream(manejar_stream("elegir_formato_cta", data, prompt, FormatoCTA, current_user), current_user)
     return await manejar_elegir_formato_cta(data, current_user, db)
 
-@router.post("/crear_contenido_creativo", summary="Crear contenido creativo")
+@router.post("/crear_contenido_creativo", response_model=ContenidoCreativo, summary="Crear contenido creativo")
 async def crear_contenido_creativo_endpoint(
     data: ContenidoCreativoInput,
-    current_user: Usuario = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    stream: bool = Query(False, description="Devolver la generación como Server-Sent Events"),
+    asincrono: bool = Query(False, description="Encolar la generación y devolver el id del trabajo"),
+    callback_url: Optional[str] = Query(None, description="URL a la que se envía el resultado del trabajo"),
+    current_user: UsuarioActual = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     print(f"Usuario ID: {current_user.id_usuario} | Datos recibidos en /crear_contenido_creativo: {data.dict()}")
+    if asincrono:
+        return await responder_trabajo("crear_contenido_creativo", data, current_user, callback_url)
+    if stream:
+        prompt = construir_prompt_crear_contenido_creativo(data, current_user.id_usuario)
+        return await responder_stream(manejar_stream("crear_contenido_creativo", data, prompt, ContenidoCreativo, current_user), current_user)
     return await manejar_crear_contenido_creativo(data, current_user, db)
 
-@router.post("/create_heading", summary="Generar encabezados de anuncio")
+@router.post("/create_heading", response_model=Encabezados, summary="Generar encabezados de anuncio")
 async def create_heading_endpoint(
     encabezado: EncabezadoAnuncio,
-    current_user: Usuario = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    stream: bool = Query(False, description="Devolver la generación como Server-Sent Events"),
+    asincrono: bool = Query(False, description="Encolar la generación y devolver el id del trabajo"),
+    callback_url: Optional[str] = Query(None, description="URL a la que se envía el resultado del trabajo"),
+    current_user: UsuarioActual = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     print(f"Usuario ID: {current_user.id_usuario} | Datos recibidos en /create_heading: {encabezado.dict()}")
+    if asincrono:
+        return await responder_trabajo("create_heading", encabezado, current_user, callback_url)
+    if stream:
+        prompt = construir_prompt_create_heading(encabezado, clave=current_user.id_usuario)
+        return await responder_stream(manejar_stream(
+            "create_heading", encabezado, prompt, Encabezados, current_user,
+            finalizar=lambda r: finalizar_encabezados(r, encabezado.variantes),
+            # En streaming no se reparte en lotes: una sola llamada con espacio para todas las variantes
+            max_tokens=tokens_encabezados(encabezado.variantes, encabezado.longitudMaxima),
+        ), current_user)
     return await manejar_create_heading(encabezado, current_user, db)
+
+@router.post("/campana_completa", response_model=CampanaCompleta, summary="Generar la planificación completa de una campaña")
+async def campana_completa_endpoint(
+    data: CampanaCompletaInput,
+    asincrono: bool = Query(False, description="Encolar la generación y devolver el id del trabajo"),
+    callback_url: Optional[str] = Query(None, description="URL a la que se envía el resultado del trabajo"),
+    current_user: UsuarioActual = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    print(f"Usuario ID: {current_user.id_usuario} | Datos recibidos en /campana_completa: {data.dict()}")
+    if asincrono:
+        return await responder_trabajo("campana_completa", data, current_user, callback_url)
+    return await manejar_campana_completa(data, current_user, db)
+
+@router.get("/jobs/{job_id}", summary="Consultar el estado de un trabajo de generación")
+async def obtener_trabajo(job_id: str, current_user: UsuarioActual = Depends(get_current_user)):
+    trabajo = await job_queue.obtener(job_id)
+    # Un trabajo ajeno se reporta igual que uno inexistente
+    if trabajo is None or trabajo["id_usuario"] != current_user.id_usuario:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado.")
+    return trabajo
+
+@router.get("/rate_limit", summary="Consultar la capacidad disponible hacia OpenAI")
+async def rate_limit(current_user: UsuarioActual = Depends(get_current_user)):
+    return await limitador_openai.niveles()
+
+@router.get("/modelos", summary="Consultar los modelos por endpoint y su latencia y errores recientes")
+async def modelos(current_user: UsuarioActual = Depends(get_current_user)):
+    return enrutador_modelos.estado()
+
+@router.get("/uso", summary="Consultar el uso de IA del día, la cuota y el saldo")
+async def uso(current_user: UsuarioActual = Depends(get_current_user)):
+    return await libro_uso.estado(current_user.id_usuario)
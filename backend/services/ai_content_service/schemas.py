@@ -1,6 +1,6 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
-from typing import List
+from typing import List, Literal, Optional, Union
 
 class ObjetivoCampanaInput(BaseModel):
     nombreProducto: str
@@ -33,8 +33,8 @@ class EncabezadoAnuncio(BaseModel):
     descripcionProducto: str
     palabrasClave: List[str]  # Cambiado a List[str]
     estiloEscritura: str
-    longitudMaxima: int
-    variantes: int  # Número de variantes a generar
+    longitudMaxima: int = Field(..., ge=1)
+    variantes: int = Field(..., ge=1, le=100)  # Número de variantes a generar
 
 class CampanaDetallesInput(BaseModel):
     nombreProducto: str
@@ -42,16 +42,127 @@ class CampanaDetallesInput(BaseModel):
     tipoCampana: str  # Por ejemplo: Pequeña, Mediana, Grande
     duracionPreferida: str  # Por ejemplo: Corta, Mediana, Larga
 
+class CampanaCompletaInput(BaseModel):
+    nombreProducto: str
+    descripcionProducto: str
+    tipoCampana: str  # Por ejemplo: Pequeña, Mediana, Grande
+    duracionPreferida: str  # Por ejemplo: Corta, Mediana, Larga
+    distrito: str
+    provincia: str
+    departamento: str
+    tonoEstilo: str
+    publicoObjetivo: Optional[str] = None  # Si no se indica, se deriva del público recomendado
+
+# Modelos de respuesta del modelo de lenguaje. `extra="forbid"` genera
+# "additionalProperties": false, requisito del modo de salida estructurada.
+
+class RespuestaModelo(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+class ObjetivoCampana(RespuestaModelo):
+    objetivo: str
+    explicacion: str
+
+class PresupuestoTotal(RespuestaModelo):
+    cantidad: str  # Cantidad en soles
+    explicacion: str
+
+class DuracionOptima(RespuestaModelo):
+    duracion: str  # Tiempo en días/semanas/meses
+    explicacion: str
+
+class PlanCampana(RespuestaModelo):
+    objetivo_campana: ObjetivoCampana
+    presupuesto_total: PresupuestoTotal
+    duracion_optima: DuracionOptima
+
+class DetallesCampana(RespuestaModelo):
+    detalles_campana: PlanCampana
+
+class Ubicacion(RespuestaModelo):
+    distrito: str
+    provincia: str
+    departamento: str
+
+class PublicoDemografico(RespuestaModelo):
+    edad: str
+    genero: str
+    ubicaciones: List[Ubicacion]
+    otros: str
+
+class PublicoPsicografico(RespuestaModelo):
+    intereses: str
+    comportamientos: str
+
+class PublicoObjetivo(RespuestaModelo):
+    demografico: PublicoDemografico
+    psicografico: PublicoPsicografico
+
+class UbicacionesAnuncios(RespuestaModelo):
+    ubicaciones_seleccionadas: List[str]
+    justificacion: str
+
+class PublicoUbicaciones(RespuestaModelo):
+    publico_objetivo: PublicoObjetivo
+    ubicaciones_anuncios: UbicacionesAnuncios
+
+class FormatoAnuncio(RespuestaModelo):
+    formato: Literal[
+        "Anuncios en carrusel",
+        "Anuncios en secuencia",
+        "Colecciones",
+        "Experiencias dinámicas",
+        "Anuncios de Messenger",
+        "Anuncios de Canvas",
+    ]
+    explicacion: str
+
+class LlamadaALaAccion(RespuestaModelo):
+    llamada_a_la_accion: Literal[
+        "Enviar solicitud",
+        "Reservar",
+        "Comprar",
+        "Realizar pedido",
+        "Cotizar",
+        "Obtener oferta",
+        "Más información",
+        "Contactarnos",
+        "Descargar",
+        "Registrarte",
+    ]
+    explicacion: str
+
+class FormatoCTA(RespuestaModelo):
+    formato_anuncio: FormatoAnuncio
+    cta: LlamadaALaAccion
+
+class VariacionCreativa(RespuestaModelo):
+    titulo: str
+    contenido: str
+
+class ContenidoCreativo(RespuestaModelo):
+    variaciones: List[VariacionCreativa]
+
+class Encabezados(RespuestaModelo):
+    encabezados: List[str]
+
+class CampanaCompleta(BaseModel):
+    definir_campana: DetallesCampana
+    definir_publico_ubicaciones: PublicoUbicaciones
+    elegir_formato_cta: FormatoCTA
+    crear_contenido_creativo: ContenidoCreativo
+
 class DocumentoCreate(BaseModel):
     tipo_documento: str = Field(..., example="Artículo")
-    contenido: str = Field(..., example="Contenido del documento...")
+    contenido: Union[dict, list, str] = Field(..., example="Contenido del documento...")
 
 class DocumentoResponse(BaseModel):
     id_documento: int
     tipo_documento: str
-    contenido: str
+    contenido: Union[dict, list, str]
     fecha_creacion: datetime
     id_usuario: int
+    version_prompt: Optional[str] = None
 
     class Config:
         from_attributes = True
\ No newline at end of file
@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from fastapi import HTTPException
+from common.utils.session_manager import SessionManager
+from common.utils.metrics import Metrics
+from .config import SINGLE_FLIGHT_LOCK_TTL, SINGLE_FLIGHT_WAIT_TIMEOUT, SINGLE_FLIGHT_RESULT_TTL
+
+logger = logging.getLogger(__name__)
+
+LOCK_PREFIX = "singleflight:lock:"
+RESULT_PREFIX = "singleflight:result:"
+CHANNEL_PREFIX = "singleflight:channel:"
+
+# Libera el lock solo si sigue perteneciendo a quien lo adquirió
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+def huella_prompt(*partes) -> str:
+    """Calcula la huella de una llamada al modelo a partir de sus parámetros."""
+    material = json.dumps(partes, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class SingleFlight:
+    """Agrupa llamadas idénticas en curso para que solo una llegue al proveedor.
+
+    Dentro de un proceso, las llamadas concurrentes con la misma huella esperan la
+    misma tarea. Entre workers, un lock en Redis elige a un líder; el resto espera
+    su resultado a través de pub/sub. El resultado y el canal llevan el token del líder:
+    solo los reciben los seguidores de ese vuelo, nunca los de uno posterior.
+    """
+
+    def __init__(
+        self,
+        lock_ttl: float = SINGLE_FLIGHT_LOCK_TTL,
+        wait_timeout: float = SINGLE_FLIGHT_WAIT_TIMEOUT,
+        result_ttl: float = SINGLE_FLIGHT_RESULT_TTL,
+    ):
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.result_ttl = result_ttl
+        self._inflight = {}  # huella -> asyncio.Task
+
+    async def ejecutar(self, huella: str, funcion):
+        """Ejecuta `funcion()` una sola vez por huella y comparte su resultado (serializable a JSON)."""
+        tarea = self._inflight.get(huella)
+        if tarea is not None:
+            Metrics.incr("singleflight.shared_local")
+        else:
+            tarea = asyncio.create_task(self._ejecutar_distribuido(huella, funcion))
+            self._inflight[huella] = tarea
+            tarea.add_done_callback(lambda t: self._finalizar(huella, t))
+        # shield: la cancelación de un llamador no cancela el trabajo compartido
+        return await asyncio.shield(tarea)
+
+    def _finalizar(self, huella: str, tarea: asyncio.Task):
+        if self._inflight.get(huella) is tarea:
+            del self._inflight[huella]
+        # Marca la excepción como recuperada aunque todos los llamadores se hayan cancelado
+        if not tarea.cancelled():
+            tarea.exception()
+
+    async def _ejecutar_distribuido(self, huella: str, funcion):
+        redis = SessionManager.redis_client
+        if redis is None:
+            return await funcion()
+
+        token = uuid.uuid4().hex
+        try:
+            # Si el líder termina entre el SET y el GET, se intenta de nuevo ser líder
+            for _ in range(2):
+                es_lider = await redis.set(LOCK_PREFIX + huella, token, nx=True, px=int(self.lock_ttl * 1000))
+                token_lider = None if es_lider else await redis.get(LOCK_PREFIX + huella)
+                if es_lider or token_lider is not None:
+                    break
+        except Exception as e:
+            logger.warning(f"Error adquiriendo el lock de single-flight: {e}")
+            return await funcion()
+
+        if not es_lider:
+            if token_lider is None:
+                return await funcion()
+            Metrics.incr("singleflight.shared_remote")
+            return await self._esperar_lider(redis, f"{huella}:{token_lider}", funcion)
+
+        vuelo = f"{huella}:{token}"
+        try:
+            resultado = await funcion()
+        except HTTPException as e:
+            await self._publicar(redis, vuelo, {"error": {"status_code": e.status_code, "detail": e.detail, "headers": e.headers}})
+            raise
+        except Exception:
+            await self._publicar(redis, vuelo, {"error": {"status_code": 500, "detail": "Error en la llamada a OpenAI: la solicitud compartida falló."}})
+            raise
+        else:
+            await self._publicar(redis, vuelo, {"resultado": resultado})
+            return resultado
+        finally:
+            try:
+                await redis.eval(RELEASE_LOCK_SCRIPT, 1, LOCK_PREFIX + huella, token)
+            except Exception as e:
+                logger.warning(f"Error liberando el lock de single-flight: {e}")
+
+    async def _publicar(self, redis, vuelo: str, mensaje: dict):
+        """Deja el resultado disponible para los workers que esperan al líder de `vuelo` (huella:token)."""
+        crudo = json.dumps(mensaje, ensure_ascii=False)
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                # Solo para quien se suscriba justo después de publicar; luego se borra solo
+                pipe.set(RESULT_PREFIX + vuelo, crudo, px=max(int(self.result_ttl * 1000), 1))
+                pipe.publish(CHANNEL_PREFIX + vuelo, crudo)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Error publicando el resultado de single-flight: {e}")
+
+    async def _esperar_lider(self, redis, vuelo: str, funcion):
+        """Espera el resultado publicado por el líder; si no llega a tiempo, llama por cuenta propia."""
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(CHANNEL_PREFIX + vuelo)
+            # El líder pudo terminar antes de la suscripción
+            crudo = await redis.get(RESULT_PREFIX + vuelo)
+            limite = time.monotonic() + self.wait_timeout
+            while crudo is None and time.monotonic() < limite:
+                mensaje = await pubsub.get_message(
+                    ignore_subscribe_messages=True,
+                    timeout=limite - time.monotonic(),
+                )
+                if mensaje and mensaje.get("type") == "message":
+                    crudo = mensaje["data"]
+        except Exception as e:
+            logger.warning(f"Error esperando el resultado de single-flight: {e}")
+            crudo = None
+        finally:
+            try:
+                await pubsub.unsubscribe()
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+        if crudo is None:
+            Metrics.incr("singleflight.wait_timeout")
+            return await funcion()
+
+        mensaje = json.loads(crudo)
+        error = mensaje.get("error")
+        if error:
+            # El mismo error que recibió el líder (429 de cuota, 503 de circuito, 504 de plazo...)
+            raise HTTPException(status_code=error["status_code"], detail=error["detail"], headers=error.get("headers"))
+        return mensaje["resultado"]
+
+# Instancia compartida por todas las llamadas al modelo
+single_flight = SingleFlight()
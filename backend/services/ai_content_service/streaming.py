@@ -0,0 +1,128 @@
+import json
+from bisect import bisect_right
+
+def formato_sse(evento: str, payload) -> str:
+    """Serializa un evento en formato Server-Sent Events."""
+    return f"event: {evento}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+class ParserJSONIncremental:
+    """Parser incremental que detecta elementos de arreglos JSON apenas se cierran.
+
+    Recibe el texto del modelo por fragmentos y devuelve, para cada elemento
+    completo de cualquier arreglo, la clave del arreglo y el valor ya decodificado.
+    Ignora el texto previo a la primera llave (por ejemplo, bloques ```json).
+
+    Los fragmentos se guardan sin concatenar (posiciones absolutas sobre el texto
+    completo): cada fragmento se recorre una sola vez y solo se une el tramo de cada
+    elemento emitido, sin volver a copiar todo lo recibido.
+    """
+
+    def __init__(self):
+        self._partes = []              # fragmentos recibidos
+        self._inicios = []             # posición absoluta donde empieza cada fragmento
+        self._largo = 0
+        self._iniciado = False
+        self._terminado = False
+        self._pila = []                # marcos [tipo, clave, inicio_elemento, es_escalar]
+        self._en_cadena = False
+        self._escape = False
+        self._inicio_cadena = None
+        self._esperando_clave = False
+        self._clave_pendiente = None
+
+    def alimentar(self, fragmento: str) -> list:
+        """Procesa un fragmento y devuelve la lista de (clave, valor) completados."""
+        completados = []
+        if not fragmento:
+            return completados
+        base = self._largo
+        self._partes.append(fragmento)
+        self._inicios.append(base)
+        self._largo += len(fragmento)
+
+        for i, c in enumerate(fragmento, base):
+            if self._terminado:
+                break
+
+            if self._en_cadena:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._en_cadena = False
+                    self._cerrar_cadena(i, completados)
+                continue
+
+            if not self._iniciado:
+                if c == "{":
+                    self._iniciado = True
+                    self._abrir("obj")
+                continue
+
+            marco = self._pila[-1]
+            if marco[0] == "arr" and marco[3] and (c in ",]" or c.isspace()):
+                self._emitir(marco, self._tramo(marco[2], i), completados)
+
+            if c == '"':
+                self._en_cadena = True
+                self._inicio_cadena = i
+                if marco[0] == "arr" and marco[2] is None:
+                    marco[2] = i
+            elif c in "{[":
+                if marco[0] == "arr" and marco[2] is None:
+                    marco[2] = i
+                self._abrir("obj" if c == "{" else "arr")
+            elif c in "}]":
+                self._pila.pop()
+                if not self._pila:
+                    self._terminado = True
+                    continue
+                padre = self._pila[-1]
+                if padre[0] == "arr" and padre[2] is not None and not padre[3]:
+                    self._emitir(padre, self._tramo(padre[2], i + 1), completados)
+            elif c == ",":
+                if marco[0] == "obj":
+                    self._esperando_clave = True
+            elif c != ":" and not c.isspace():
+                if marco[0] == "arr" and marco[2] is None:
+                    marco[2] = i
+                    marco[3] = True
+
+        return completados
+
+    def _tramo(self, inicio: int, fin: int) -> str:
+        """Texto entre dos posiciones absolutas, uniendo solo los fragmentos que abarca."""
+        primera = bisect_right(self._inicios, inicio) - 1
+        ultima = bisect_right(self._inicios, fin - 1)
+        texto = "".join(self._partes[primera:ultima])
+        desplazamiento = self._inicios[primera]
+        return texto[inicio - desplazamiento:fin - desplazamiento]
+
+    def _abrir(self, tipo: str):
+        if self._pila and self._pila[-1][0] == "arr":
+            clave = self._pila[-1][1]
+        else:
+            clave = self._clave_pendiente
+        self._pila.append([tipo, clave, None, False])
+        self._clave_pendiente = None
+        self._esperando_clave = tipo == "obj"
+
+    def _cerrar_cadena(self, fin: int, completados: list):
+        if not self._pila:
+            return
+        marco = self._pila[-1]
+        fragmento = self._tramo(self._inicio_cadena, fin + 1)
+        if marco[0] == "obj" and self._esperando_clave:
+            self._clave_pendiente = json.loads(fragmento)
+            self._esperando_clave = False
+        elif marco[0] == "arr" and marco[2] == self._inicio_cadena:
+            self._emitir(marco, fragmento, completados)
+
+    def _emitir(self, marco: list, fragmento: str, completados: list):
+        marco[2] = None
+        marco[3] = False
+        try:
+            completados.append((marco[1], json.loads(fragmento)))
+        except ValueError:
+            pass
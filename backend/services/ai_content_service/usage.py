@@ -0,0 +1,380 @@
+import asyncio
+import contextvars
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from fastapi import HTTPException, status
+from sqlalchemy import select, update
+from common.database.database import AsyncSessionLocal
+from common.models.usuario import Usuario, Cuenta
+from common.models.uso import RegistroUso
+from common.utils.metrics import Metrics
+from common.utils.session_manager import SessionManager
+from services.auth_service.principal_cache import UsuarioActual
+from .config import (
+    OPENAI_MODEL,
+    PRECIO_1K_TOKENS_PROMPT,
+    PRECIO_1K_TOKENS_RESPUESTA,
+    CUOTAS_TIPO_CUENTA,
+    CUOTA_POR_DEFECTO,
+    USO_LIQUIDACION_INTERVALO,
+    USO_LIQUIDACION_LOTE,
+)
+
+logger = logging.getLogger(__name__)
+
+PENDIENTES_KEY = "uso:pendientes"
+LIQUIDADORES_KEY = "uso:liquidadores"        # Listas de procesamiento de cada proceso
+PROCESANDO_PREFIX = "uso:procesando:"         # Lote tomado por un proceso, hasta su commit
+LEASE_PREFIX = "uso:liquidador:"              # Señal de vida del proceso dueño de la lista
+CUOTA_TTL = 2 * 24 * 3600       # El contador diario sobrevive al cambio de día UTC
+TIPO_CUENTA_TTL = 60            # Segundos que se confía en el tipo de cuenta cacheado
+
+# Mueve hasta ARGV[1] registros de la cola a la lista de procesamiento del proceso, en una
+# sola operación: un registro está siempre en una de las dos listas.
+TOMAR_LOTE_SCRIPT = """
+local movidos = 0
+for i = 1, tonumber(ARGV[1]) do
+    if not redis.call('LMOVE', KEYS[1], KEYS[2], 'LEFT', 'RIGHT') then
+        break
+    end
+    movidos = movidos + 1
+end
+return {movidos, redis.call('LLEN', KEYS[1])}
+"""
+
+# Si el proceso dueño de la lista de procesamiento dejó de renovar su lease, devuelve su
+# lote al frente de la cola (en el mismo orden) y la da de baja.
+RECUPERAR_SCRIPT = """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    return -1
+end
+local movidos = 0
+while redis.call('LMOVE', KEYS[2], KEYS[1], 'RIGHT', 'LEFT') do
+    movidos = movidos + 1
+end
+redis.call('SREM', KEYS[4], KEYS[2])
+return movidos
+"""
+
+class Consumo:
+    """Tokens que consumen las llamadas al modelo de una misma generación."""
+
+    def __init__(self):
+        self.modelo = OPENAI_MODEL
+        self.tokens_prompt = 0
+        self.tokens_respuesta = 0
+
+    @property
+    def total(self) -> int:
+        return self.tokens_prompt + self.tokens_respuesta
+
+    @property
+    def costo(self) -> float:
+        return round(
+            self.tokens_prompt / 1000 * PRECIO_1K_TOKENS_PROMPT
+            + self.tokens_respuesta / 1000 * PRECIO_1K_TOKENS_RESPUESTA,
+            6,
+        )
+
+# Consumo de la generación en curso. Las tareas hijas de asyncio.gather copian el contexto
+# y comparten la misma instancia, así que todo suma en ella. Se registra siempre en el
+# contexto de quien recibe la respuesta: una llamada compartida por single-flight corre en
+# el contexto de quien la inició, por eso devuelve su uso para que lo registre cada llamador.
+_consumo_actual = contextvars.ContextVar("consumo_actual", default=None)
+
+def registrar_tokens(tokens_prompt: int, tokens_respuesta: int, modelo: str = None):
+    """Suma los tokens de una respuesta de OpenAI a la generación en curso, si la hay."""
+    consumo = _consumo_actual.get()
+    if consumo is None:
+        return
+    consumo.tokens_prompt += tokens_prompt or 0
+    consumo.tokens_respuesta += tokens_respuesta or 0
+    if modelo:
+        consumo.modelo = modelo
+
+def segundos_hasta_manana(ahora: datetime = None) -> int:
+    """Segundos hasta la medianoche UTC, cuando se reinicia la cuota diaria."""
+    ahora = ahora or datetime.now(timezone.utc)
+    manana = (ahora + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(1, int((manana - ahora).total_seconds()))
+
+class LibroUso:
+    """Medición, cuotas y facturación del uso del modelo por usuario.
+
+    En el camino de la petición solo se toca Redis: se compara el contador diario del
+    usuario con la cuota de su `tipo_cuenta` y, al terminar, se suman los tokens y se
+    encola el registro. Una tarea de fondo liquida la cola por lotes: inserta los
+    `RegistroUso` y descuenta `Cuenta.saldo` en una sola transacción.
+
+    Cada proceso mueve su lote a una lista de procesamiento propia y la borra recién
+    después del commit; si el proceso muere, otro devuelve el lote a la cola cuando
+    vence su lease. Cada registro lleva un `id_evento` único, así que liquidar dos
+    veces el mismo lote no duplica filas ni descuenta el saldo dos veces.
+    """
+
+    def __init__(self, intervalo: float = USO_LIQUIDACION_INTERVALO, lote: int = USO_LIQUIDACION_LOTE):
+        self.intervalo = intervalo
+        self.lote = lote
+        self._tipos = {}  # id_usuario -> (expira, tipo_cuenta)
+        self._tarea = None
+        self._id = uuid.uuid4().hex
+        self._procesando = f"{PROCESANDO_PREFIX}{self._id}"
+        self._lease_ttl = max(60, int(intervalo * 6))
+
+    @staticmethod
+    def _cuota_key(id_usuario: int, dia: datetime = None) -> str:
+        dia = dia or datetime.now(timezone.utc)
+        return f"cuota:uso:{id_usuario}:{dia:%Y%m%d}"
+
+    @staticmethod
+    def limite(tipo_cuenta: str) -> int:
+        """Tokens diarios del tipo de cuenta (0 = sin límite)."""
+        return CUOTAS_TIPO_CUENTA.get(tipo_cuenta, CUOTA_POR_DEFECTO)
+
+    async def tipo_cuenta(self, id_usuario: int) -> str:
+        """Tipo de cuenta del usuario, cacheado en el proceso por `TIPO_CUENTA_TTL`."""
+        ahora = time.monotonic()
+        cacheado = self._tipos.get(id_usuario)
+        if cacheado is not None and cacheado[0] > ahora:
+            return cacheado[1]
+        async with AsyncSessionLocal() as db:
+            resultado = await db.execute(select(Cuenta.tipo_cuenta).where(Cuenta.id_usuario == id_usuario))
+            tipo = resultado.scalar_one_or_none() or "Standard"
+        self._tipos[id_usuario] = (ahora + TIPO_CUENTA_TTL, tipo)
+        return tipo
+
+    async def usado_hoy(self, id_usuario: int) -> int:
+        redis = SessionManager.redis_client
+        if redis is None:
+            return 0
+        return int(await redis.get(self._cuota_key(id_usuario)) or 0)
+
+    async def verificar(self, id_usuario: int):
+        """Responde 429 si el usuario ya agotó su cuota diaria de tokens.
+
+        Es una verificación previa: la generación que cruza el límite se completa y se
+        factura entera. Si Redis no está disponible, deja pasar.
+        """
+        limite = self.limite(await self.tipo_cuenta(id_usuario))
+        if not limite:
+            return
+        try:
+            usado = await self.usado_hoy(id_usuario)
+        except Exception as e:
+            logger.error(f"Error consultando la cuota de uso: {e}")
+            return
+        if usado >= limite:
+            Metrics.incr("usage.quota_rejected")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Alcanzaste la cuota diaria de generación de tu cuenta.",
+                headers={"Retry-After": str(segundos_hasta_manana())},
+            )
+
+    async def registrar(self, id_usuario: int, endpoint: str, consumo: Consumo):
+        """Suma el consumo a la cuota del día y lo encola para liquidarlo."""
+        redis = SessionManager.redis_client
+        if redis is None:
+            logger.error(f"Uso sin registrar ({consumo.total} tokens de {id_usuario}): Redis no disponible.")
+            Metrics.incr("usage.lost")
+            return
+        registro = {
+            "id": uuid.uuid4().hex,
+            "id_usuario": id_usuario,
+            "endpoint": endpoint,
+            "modelo": consumo.modelo,
+            "tokens_prompt": consumo.tokens_prompt,
+            "tokens_respuesta": consumo.tokens_respuesta,
+            "costo": consumo.costo,
+            "fecha": time.time(),
+        }
+        try:
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.incrby(self._cuota_key(id_usuario), consumo.total)
+                pipe.expire(self._cuota_key(id_usuario), CUOTA_TTL)
+                pipe.rpush(PENDIENTES_KEY, json.dumps(registro))
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Error registrando el uso de {id_usuario}: {e} ({registro})")
+            Metrics.incr("usage.lost")
+            return
+        Metrics.incr("usage.tokens", consumo.total)
+        Metrics.incr(f"usage.tokens.{endpoint}", consumo.total)
+
+    @asynccontextmanager
+    async def medir(self, current_user: UsuarioActual, endpoint: str, verificar: bool = True):
+        """Verifica la cuota y registra los tokens de las llamadas hechas dentro del bloque.
+
+        El consumo se registra aunque la generación falle después de llamar al modelo:
+        esos tokens igual se pagaron.
+        """
+        if verificar:
+            await self.verificar(current_user.id_usuario)
+        consumo = Consumo()
+        token = _consumo_actual.set(consumo)
+        try:
+            yield consumo
+        finally:
+            _consumo_actual.reset(token)
+            if consumo.total:
+                await self.registrar(current_user.id_usuario, endpoint, consumo)
+
+    async def estado(self, id_usuario: int) -> dict:
+        """Uso del día, cuota y saldo del usuario."""
+        tipo = await self.tipo_cuenta(id_usuario)
+        limite = self.limite(tipo)
+        usado = await self.usado_hoy(id_usuario)
+        async with AsyncSessionLocal() as db:
+            resultado = await db.execute(select(Cuenta.saldo).where(Cuenta.id_usuario == id_usuario))
+            saldo = resultado.scalar_one_or_none()
+        return {
+            "tipo_cuenta": tipo,
+            "cuota_diaria": limite or None,
+            "usado_hoy": usado,
+            "disponible_hoy": max(0, limite - usado) if limite else None,
+            "reinicio_en": segundos_hasta_manana(),
+            "saldo": saldo,
+        }
+
+    async def _tomar_lote(self, redis) -> list:
+        """Lote a liquidar: el que quedó sin confirmar en este proceso o uno nuevo de la cola."""
+        await redis.set(f"{LEASE_PREFIX}{self._id}", 1, ex=self._lease_ttl)
+        entradas = await redis.lrange(self._procesando, 0, -1)
+        if entradas:
+            return entradas
+        await redis.sadd(LIQUIDADORES_KEY, self._procesando)
+        _, pendientes = await redis.eval(TOMAR_LOTE_SCRIPT, 2, PENDIENTES_KEY, self._procesando, self.lote)
+        Metrics.set_gauge("usage.pending", pendientes)
+        return await redis.lrange(self._procesando, 0, -1)
+
+    async def liquidar(self) -> int:
+        """Pasa un lote de registros pendientes a la base de datos. Devuelve cuántos liquidó.
+
+        Si el commit falla, el lote queda en la lista de procesamiento y se reintenta
+        en la próxima llamada; los registros que ya estaban en la base se omiten.
+        """
+        redis = SessionManager.redis_client
+        if redis is None:
+            return 0
+        entradas = await self._tomar_lote(redis)
+        if not entradas:
+            return 0
+
+        registros = [json.loads(entrada) for entrada in entradas]
+        async with AsyncSessionLocal() as db:
+            # Los registros encolados antes de existir `id_evento` no traen identificador
+            eventos = [registro["id"] for registro in registros if registro.get("id")]
+            resultado = await db.execute(select(RegistroUso.id_evento).where(RegistroUso.id_evento.in_(eventos)))
+            liquidados = set(resultado.scalars())
+            nuevos = [registro for registro in registros if registro.get("id") not in liquidados]
+            ids = {registro["id_usuario"] for registro in nuevos}
+            resultado = await db.execute(select(Usuario.id_usuario).where(Usuario.id_usuario.in_(ids)))
+            existentes = set(resultado.scalars())
+            ahora = datetime.now(timezone.utc)
+            costos = defaultdict(float)
+            for registro in nuevos:
+                id_usuario = registro["id_usuario"] if registro["id_usuario"] in existentes else None
+                db.add(RegistroUso(
+                    id_evento=registro.get("id"),
+                    id_usuario=id_usuario,
+                    endpoint=registro["endpoint"],
+                    modelo=registro["modelo"],
+                    tokens_prompt=registro["tokens_prompt"],
+                    tokens_respuesta=registro["tokens_respuesta"],
+                    tokens_total=registro["tokens_prompt"] + registro["tokens_respuesta"],
+                    costo=registro["costo"],
+                    fecha=datetime.fromtimestamp(registro["fecha"], timezone.utc),
+                    fecha_liquidacion=ahora,
+                ))
+                if id_usuario is not None:
+                    costos[id_usuario] += registro["costo"]
+            # El descuento se hace en la base (saldo = saldo - costo), sin leer el saldo antes
+            for id_usuario, costo in costos.items():
+                await db.execute(
+                    update(Cuenta)
+                    .where(Cuenta.id_usuario == id_usuario)
+                    .values(saldo=Cuenta.saldo - round(costo, 6), fecha_actualizacion=ahora)
+                )
+            await db.commit()
+        # Recién ahora el lote deja de existir en Redis
+        await redis.delete(self._procesando)
+        if len(nuevos) < len(registros):
+            Metrics.incr("usage.duplicates_skipped", len(registros) - len(nuevos))
+        Metrics.incr("usage.settled", len(nuevos))
+        return len(registros)
+
+    async def recuperar_huerfanos(self) -> int:
+        """Devuelve a la cola los lotes de procesos que dejaron de renovar su lease."""
+        redis = SessionManager.redis_client
+        if redis is None:
+            return 0
+        recuperados = 0
+        for procesando in await redis.smembers(LIQUIDADORES_KEY):
+            if procesando == self._procesando:
+                continue
+            lease = f"{LEASE_PREFIX}{procesando[len(PROCESANDO_PREFIX):]}"
+            movidos = await redis.eval(RECUPERAR_SCRIPT, 4, PENDIENTES_KEY, procesando, lease, LIQUIDADORES_KEY)
+            if movidos > 0:
+                logger.warning(f"Se devolvieron a la cola {movidos} registros de uso de {procesando}")
+                recuperados += movidos
+        if recuperados:
+            Metrics.incr("usage.recovered", recuperados)
+        return recuperados
+
+    async def _liquidador(self):
+        while True:
+            try:
+                await self.recuperar_huerfanos()
+                # Vaciar la cola por lotes antes de volver a dormir
+                while await self.liquidar() >= self.lote:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error liquidando el uso: {e}")
+                Metrics.incr("usage.settle_errors")
+            await asyncio.sleep(self.intervalo)
+
+    def iniciar_liquidacion(self):
+        """Arranca la liquidación periódica de este proceso."""
+        if self._tarea is None:
+            self._tarea = asyncio.create_task(self._liquidador())
+
+    async def detener_liquidacion(self):
+        """Detiene la liquidación periódica y liquida lo que quede pendiente."""
+        if self._tarea is not None:
+            self._tarea.cancel()
+            try:
+                await self._tarea
+            except asyncio.CancelledError:
+                pass
+            self._tarea = None
+        try:
+            while await self.liquidar():
+                pass
+            # Sin lote en curso, la lista de procesamiento ya no necesita recuperarse
+            redis = SessionManager.redis_client
+            if redis is not None:
+                await redis.srem(LIQUIDADORES_KEY, self._procesando)
+                await redis.delete(f"{LEASE_PREFIX}{self._id}")
+        except Exception as e:
+            logger.error(f"Error en la liquidación final del uso: {e}")
+
+# Libro compartido por el servicio de contenido
+libro_uso = LibroUso()
+
+def medir_consumo(endpoint: str):
+    """Decorador para los `manejar_*(data, current_user, db)`: cuota y facturación del uso."""
+    def decorador(manejador):
+        @wraps(manejador)
+        async def envoltura(data, current_user: UsuarioActual, db):
+            async with libro_uso.medir(current_user, endpoint):
+                return await manejador(data, current_user, db)
+        return envoltura
+    return decorador
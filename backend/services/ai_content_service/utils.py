@@ -1,31 +1,129 @@
-import re
 import json
 import logging
+from functools import lru_cache
 from fastapi import HTTPException
-from .config import client
+from pydantic import BaseModel, ValidationError
+from common.utils.metrics import Metrics
+from .config import client, CONTENT_STRUCTURED_OUTPUT, CONTENT_VALIDATION_RETRIES
+from .cache import response_cache
+from .singleflight import single_flight, huella_prompt
+from .streaming import ParserJSONIncremental
+from .json_repair import extraer_objeto_json
+from .router import enrutador_modelos
+from .rate_limiter import limitador_openai, estimar_tokens
+from .usage import registrar_tokens
+from .prompts import Prompt
 
 logger = logging.getLogger(__name__)
 
-async def generar_respuesta_openai(prompt: str, max_tokens: int = 300) -> str:
+async def generar_respuesta_openai(
+    prompt: str,
+    max_tokens: int = 300,
+    formato: dict = None,
+    historial: list = None,
+    endpoint: str = None,
+) -> str:
+    """Genera una respuesta del modelo. `historial` son los mensajes previos de la conversación
+    y `endpoint` determina los modelos a usar y el plazo máximo de la llamada (reintentos
+    y cambios de modelo incluidos)."""
+    mensajes = [*(historial or []), {"role": "user", "content": prompt}]
+    # Las llamadas idénticas en curso comparten una sola petición a OpenAI
+    politica = enrutador_modelos.politica(endpoint)
+    huella = huella_prompt(politica.modelos, politica.temperatura, max_tokens, formato, mensajes)
+    respuesta = await single_flight.ejecutar(huella, lambda: _llamar_openai(mensajes, max_tokens, formato, endpoint))
+    # Cada llamador factura la respuesta que recibió, aunque la llamada la haya hecho otro
+    uso = respuesta["uso"]
+    if uso is not None:
+        registrar_tokens(uso["tokens_prompt"], uso["tokens_respuesta"], uso["modelo"])
+    return respuesta["texto"]
+
+async def _llamar_openai(mensajes: list, max_tokens: int, formato: dict = None, endpoint: str = None) -> dict:
+    """Hace la llamada a OpenAI. Devuelve {"texto", "uso"}; `uso` es None si OpenAI no lo informa."""
+    opciones = {"response_format": formato} if formato else {}
+    reserva = limitador_openai.reserva(estimar_tokens(mensajes, max_tokens))
+    temperatura = enrutador_modelos.politica(endpoint).temperatura
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",  # Puedes cambiar al modelo que prefieras
-            messages=[
-                {"role": "user", "content": prompt},
-            ],
-            max_tokens=max_tokens,
-            temperature=0.7,
+        response = await enrutador_modelos.ejecutar(
+            endpoint,
+            lambda modelo: client.chat.completions.create(
+                model=modelo,
+                messages=mensajes,
+                max_tokens=max_tokens,
+                temperature=temperatura,
+                **opciones,
+            ),
+            antes=reserva.adquirir,
         )
+        uso = None
+        if response.usage is not None:
+            # Se reservó el peor caso en cada intento; se devuelve lo que no se usó
+            await reserva.liquidar(response.usage.total_tokens)
+            uso = {
+                "tokens_prompt": response.usage.prompt_tokens or 0,
+                "tokens_respuesta": response.usage.completion_tokens or 0,
+                "modelo": response.model,
+            }
         # Acceder al contenido de la respuesta
         resultado = ''.join([
             choice.message.content for choice in response.choices
             if choice.message and choice.message.content
         ]).strip()
-        return resultado
+        return {"texto": resultado, "uso": uso}
+    except HTTPException:
+        # Circuito abierto, reintentos agotados o plazo vencido: no se consumió lo reservado
+        await reserva.liquidar()
+        raise
     except Exception as e:
+        await reserva.liquidar()
         logger.exception("Error en generar_respuesta_openai")
         raise HTTPException(status_code=500, detail=f"Error en la llamada a OpenAI: {str(e)}")
 
+async def generar_respuesta_openai_stream(prompt: str, max_tokens: int = 300, endpoint: str = None):
+    """Genera la respuesta del modelo como un iterador asíncrono de fragmentos de texto.
+
+    Los reintentos, el circuit breaker y el cambio de modelo se aplican al abrir el
+    stream; una vez que llegan fragmentos, un corte se reporta como error.
+    """
+    mensajes = [{"role": "user", "content": prompt}]
+    reserva = limitador_openai.reserva(estimar_tokens(mensajes, max_tokens))
+    temperatura = enrutador_modelos.politica(endpoint).temperatura
+    try:
+        stream = await enrutador_modelos.ejecutar(
+            endpoint,
+            lambda modelo: client.chat.completions.create(
+                model=modelo,
+                messages=mensajes,
+                max_tokens=max_tokens,
+                temperature=temperatura,
+                stream=True,
+                # El último chunk trae el uso total (sin choices)
+                stream_options={"include_usage": True},
+            ),
+            antes=reserva.adquirir,
+            medir_latencia=False,
+        )
+    except HTTPException:
+        await reserva.liquidar()
+        raise
+    except Exception as e:
+        await reserva.liquidar()
+        logger.exception("Error en generar_respuesta_openai_stream")
+        raise HTTPException(status_code=500, detail=f"Error en la llamada a OpenAI: {str(e)}")
+    # Si el stream se corta antes del chunk de uso, la reserva se conserva: no se sabe cuánto se consumió
+    try:
+        async for chunk in stream:
+            if chunk.usage is not None:
+                await reserva.liquidar(chunk.usage.total_tokens)
+                registrar_tokens(chunk.usage.prompt_tokens, chunk.usage.completion_tokens, chunk.model)
+            for choice in chunk.choices:
+                if choice.delta and choice.delta.content:
+                    yield choice.delta.content
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error en generar_respuesta_openai_stream")
+        raise HTTPException(status_code=500, detail=f"Error en la llamada a OpenAI: {str(e)}")
+
 def extraer_json_de_respuesta(respuesta: str) -> dict:
     if not isinstance(respuesta, str):
         raise HTTPException(status_code=500, detail="La respuesta no es un string válido.")
@@ -33,22 +131,131 @@ def extraer_json_de_respuesta(respuesta: str) -> dict:
     try:
         # Intentar cargar toda la respuesta como JSON
         data = json.loads(respuesta)
-        return data
+        if isinstance(data, dict):
+            return data
     except json.JSONDecodeError:
-        # Si falla, buscar el primer objeto JSON en la respuesta
-        match = re.search(r'\{(?:[^{}]|(?R))*\}', respuesta, re.DOTALL)
-        if match:
-            json_str = match.group()
-            try:
-                data = json.loads(json_str)
-                return data
-            except json.JSONDecodeError as e:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"Error al parsear JSON: {e.msg}\nRespuesta del modelo:\n{respuesta}"
-                )
-        else:
-            raise HTTPException(
-                status_code=500,
-                detail=f"No se pudo encontrar un JSON válido en la respuesta.\nRespuesta del modelo:\n{respuesta}"
+        pass
+
+    # Si falla, extraer el primer objeto JSON (quitando bloques ``` y reparando fallas comunes)
+    try:
+        data = extraer_objeto_json(respuesta)
+    except ValueError:
+        Metrics.incr("json_extract.failed")
+        raise HTTPException(
+            status_code=500,
+            detail=f"No se pudo encontrar un JSON válido en la respuesta.\nRespuesta del modelo:\n{respuesta}"
+        )
+    Metrics.incr("json_extract.repaired")
+    return data
+
+@lru_cache(maxsize=None)
+def formato_respuesta(modelo: type) -> dict:
+    """`response_format` de OpenAI con el JSON Schema estricto del modelo (se calcula una vez)."""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": modelo.__name__, "schema": modelo.model_json_schema(), "strict": True},
+    }
+
+def validar_respuesta(respuesta: str, modelo: type) -> BaseModel:
+    """Valida la respuesta contra el modelo. Lanza ValueError (o ValidationError) si no cumple.
+
+    El caso normal (JSON puro) se parsea y valida en un solo paso con el validador
+    compilado del modelo; solo si el texto no es JSON se recurre a la extracción.
+    """
+    try:
+        return modelo.model_validate_json(respuesta)
+    except ValidationError as e:
+        if any(error["type"] != "json_invalid" for error in e.errors()):
+            raise
+    data = extraer_objeto_json(respuesta)
+    Metrics.incr("json_extract.repaired")
+    return modelo.model_validate(data)
+
+async def generar_modelo(endpoint: str, data, prompt: Prompt, modelo: type, max_tokens: int = 300) -> BaseModel:
+    """Genera la respuesta de un endpoint como instancia validada de `modelo`.
+
+    Reutiliza la caché cuando la entrada ya fue procesada. La entrada se guarda con el
+    modelo principal del endpoint aunque haya respondido un respaldo: la caché es por
+    endpoint y política, no por el modelo que atendió. Con CONTENT_STRUCTURED_OUTPUT
+    la petición se restringe al JSON Schema del modelo. Solo cuando la respuesta no
+    valida se vuelve a preguntar, indicando los errores al modelo.
+    """
+    politica = enrutador_modelos.politica(endpoint)
+    clave = response_cache.clave(endpoint, data, politica.principal, politica.temperatura, prompt.etiqueta)
+    cacheado = await response_cache.obtener(endpoint, clave)
+    if cacheado is not None:
+        try:
+            return modelo.model_validate(cacheado)
+        except ValidationError:
+            # Entrada guardada con un formato anterior: se genera de nuevo
+            Metrics.incr(f"content_validation.{endpoint}.stale_cache")
+
+    formato = formato_respuesta(modelo) if CONTENT_STRUCTURED_OUTPUT else None
+    historial = []
+    pregunta = prompt.texto
+    for intento in range(CONTENT_VALIDATION_RETRIES + 1):
+        respuesta = await generar_respuesta_openai(pregunta, max_tokens, formato, historial, endpoint)
+        try:
+            resultado = validar_respuesta(respuesta, modelo)
+        except ValueError as e:
+            errores = str(e)[:2000]
+            Metrics.incr(f"content_validation.{endpoint}.failed")
+            logger.warning(f"Respuesta inválida para {endpoint} (intento {intento + 1}): {errores}")
+            historial += [{"role": "user", "content": pregunta}, {"role": "assistant", "content": respuesta}]
+            pregunta = (
+                f"La respuesta anterior no cumple el esquema requerido:\n{errores}\n"
+                "Devuelve únicamente el JSON corregido, sin texto adicional."
             )
+            continue
+        Metrics.incr(f"content_validation.{endpoint}.ok")
+        await response_cache.guardar(endpoint, clave, resultado.model_dump())
+        return resultado
+
+    raise HTTPException(
+        status_code=500,
+        detail=f"La respuesta del modelo no cumple el esquema esperado.\n{errores}"
+    )
+
+async def generar_json_stream(endpoint: str, data, prompt: Prompt, modelo: type, max_tokens: int = 300):
+    """Versión en streaming de `generar_modelo`.
+
+    Produce tuplas (evento, payload): `token` por cada fragmento del modelo, `item` por
+    cada elemento de arreglo completado y, al final, `resultado` con el JSON validado
+    contra `modelo`. Como los fragmentos ya se enviaron, una respuesta que no valida no
+    se vuelve a preguntar: se responde 500 y no se guarda en la caché.
+    """
+    politica = enrutador_modelos.politica(endpoint)
+    # Con el modelo principal, como en generar_modelo (también si responde un respaldo)
+    clave = response_cache.clave(endpoint, data, politica.principal, politica.temperatura, prompt.etiqueta)
+    cacheado = await response_cache.obtener(endpoint, clave)
+    if cacheado is not None:
+        try:
+            valido = modelo.model_validate(cacheado)
+        except ValidationError:
+            Metrics.incr(f"content_validation.{endpoint}.stale_cache")
+        else:
+            yield "resultado", valido.model_dump()
+            return
+
+    parser = ParserJSONIncremental()
+    fragmentos = []
+    async for fragmento in generar_respuesta_openai_stream(prompt.texto, max_tokens, endpoint):
+        fragmentos.append(fragmento)
+        yield "token", {"texto": fragmento}
+        for clave_arreglo, valor in parser.alimentar(fragmento):
+            yield "item", {"clave": clave_arreglo, "valor": valor}
+
+    try:
+        resultado = validar_respuesta("".join(fragmentos).strip(), modelo)
+    except ValueError as e:
+        errores = str(e)[:2000]
+        Metrics.incr(f"content_validation.{endpoint}.failed")
+        logger.warning(f"Respuesta inválida para {endpoint} (stream): {errores}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"La respuesta del modelo no cumple el esquema esperado.\n{errores}"
+        )
+    Metrics.incr(f"content_validation.{endpoint}.ok")
+    resultado = resultado.model_dump()
+    await response_cache.guardar(endpoint, clave, resultado)
+    yield "resultado", resultado
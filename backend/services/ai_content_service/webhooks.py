@@ -0,0 +1,59 @@
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import os
+import socket
+import time
+from urllib.parse import urlsplit
+from fastapi import HTTPException, status
+
+# Secreto compartido con los receptores para verificar la firma de los webhooks. Si no se
+# define se deriva de SECRET_KEY (los envíos quedan firmados, pero el receptor no puede
+# verificarlos hasta que se configure un secreto propio).
+CONTENT_JOB_WEBHOOK_SECRET = os.getenv("CONTENT_JOB_WEBHOOK_SECRET") or hashlib.sha256(
+    b"webhook:" + os.getenv("SECRET_KEY", "").encode("utf-8")
+).hexdigest()
+
+HEADER_FIRMA = "X-AnuncIA-Signature"
+HEADER_TIMESTAMP = "X-AnuncIA-Timestamp"
+
+def _url_invalida(detalle: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"callback_url inválida: {detalle}")
+
+async def validar_callback_url(url: str) -> str:
+    """Verifica que el webhook apunte a un host público por HTTPS; si no, responde 400.
+
+    El host se resuelve y se rechaza si alguna de sus direcciones es privada, de loopback,
+    link-local (169.254.0.0/16, metadatos de la nube) o reservada: así un usuario no puede
+    hacer que el servidor envíe peticiones a la red interna.
+    """
+    partes = urlsplit(url)
+    if partes.scheme != "https" or not partes.hostname:
+        raise _url_invalida("debe ser una URL https:// con host.")
+    if partes.username or partes.password:
+        raise _url_invalida("no puede incluir credenciales.")
+    try:
+        puerto = partes.port or 443
+    except ValueError:
+        raise _url_invalida("el puerto no es válido.")
+    try:
+        direcciones = await asyncio.get_running_loop().getaddrinfo(partes.hostname, puerto, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError):
+        raise _url_invalida("no se pudo resolver el host.")
+    for *_, sockaddr in direcciones:
+        ip = ipaddress.ip_address(sockaddr[0].split("%", 1)[0])
+        if not ip.is_global or ip.is_multicast:
+            raise _url_invalida("el host no es una dirección pública.")
+    return url
+
+def firmar(cuerpo: bytes, timestamp: int = None) -> dict:
+    """Headers con la firma HMAC-SHA256 de `{timestamp}.{cuerpo}` para el receptor.
+
+    El receptor recalcula la firma con el secreto compartido y descarta los envíos con un
+    timestamp viejo (protección contra repeticiones).
+    """
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    mensaje = f"{timestamp}.".encode("utf-8") + cuerpo
+    firma = hmac.new(CONTENT_JOB_WEBHOOK_SECRET.encode("utf-8"), mensaje, hashlib.sha256).hexdigest()
+    return {HEADER_TIMESTAMP: str(timestamp), HEADER_FIRMA: f"sha256={firma}"}
@@ -1,23 +1,25 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from .models import Usuario
 from .schemas import RegisterRequest
-from .security import get_password_hash
+from .security import get_password_hash_async
 from fastapi import HTTPException
 
-def register_user(db: Session, user: RegisterRequest) -> Usuario:
+async def register_user(db: AsyncSession, user: RegisterRequest) -> Usuario:
     # Verificar si el email ya está registrado
-    db_user = db.query(Usuario).filter(Usuario.email == user.email).first()
+    result = await db.execute(select(Usuario).where(Usuario.email == user.email))
+    db_user = result.scalars().first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email ya registrado")
 
     # Crear un nuevo usuario
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     nuevo_usuario = Usuario(
         nombre=user.nombre,
         email=user.email,
         contraseña=hashed_password
     )
     db.add(nuevo_usuario)
-    db.commit()
-    db.refresh(nuevo_usuario)
+    await db.commit()
+    await db.refresh(nuevo_usuario)
     return nuevo_usuario
\ No newline at end of file
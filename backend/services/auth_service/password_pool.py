@@ -0,0 +1,67 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+from common.utils.metrics import Metrics
+
+# Configuración básica de logging
+logger = logging.getLogger("uvicorn.error")
+
+# pbkdf2 se ejecuta en hashlib, que libera el GIL: un pool de hilos da paralelismo real
+# sin el costo de serializar entre procesos (y funciona igual en Lambda).
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_POOL_MAX_PENDING = int(os.getenv("PASSWORD_POOL_MAX_PENDING", "64"))
+PASSWORD_POOL_RETRY_AFTER = int(os.getenv("PASSWORD_POOL_RETRY_AFTER", "1"))  # Segundos
+
+class PasswordPool:
+    """Pool acotado para hashear y verificar contraseñas fuera del event loop.
+
+    Cuando hay `max_pending` operaciones en curso o en cola, rechaza nuevas
+    peticiones con 503 y Retry-After en lugar de acumular trabajo.
+    """
+
+    def __init__(self, workers: int = PASSWORD_POOL_WORKERS, max_pending: int = PASSWORD_POOL_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self._pendientes = 0
+
+    def _obtener_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password")
+        return self._executor
+
+    def _publicar_metricas(self):
+        Metrics.set_gauge("password_pool.pending", self._pendientes)
+        Metrics.set_gauge("password_pool.queue_depth", max(0, self._pendientes - self.workers))
+
+    async def ejecutar(self, funcion, *args):
+        """Ejecuta `funcion(*args)` en el pool, aplicando backpressure si está saturado."""
+        if self._pendientes >= self.max_pending:
+            Metrics.incr("password_pool.rejected")
+            logger.warning("Pool de contraseñas saturado; se rechaza la petición.")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Servicio ocupado, intenta nuevamente en unos segundos.",
+                headers={"Retry-After": str(PASSWORD_POOL_RETRY_AFTER)},
+            )
+
+        self._pendientes += 1
+        self._publicar_metricas()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._obtener_executor(), funcion, *args)
+        finally:
+            self._pendientes -= 1
+            self._publicar_metricas()
+            Metrics.incr("password_pool.completed")
+
+    def cerrar(self):
+        """Detiene los hilos del pool."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+# Instancia compartida por el servicio de autenticación
+password_pool = PasswordPool()
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from common.utils.session_manager import SessionManager
+from common.utils.metrics import Metrics
+
+# Configuración básica de logging
+logger = logging.getLogger("uvicorn.error")
+
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "30"))             # Segundos
+PRINCIPAL_CACHE_MAX_ITEMS = int(os.getenv("PRINCIPAL_CACHE_MAX_ITEMS", "10000"))
+INVALIDATION_CHANNEL = "auth:principal_invalidate"
+
+@dataclass(frozen=True)
+class UsuarioActual:
+    """Vista inmutable y compacta del usuario autenticado."""
+    id_usuario: int
+    email: str
+    nombre: str
+
+    @classmethod
+    def desde_usuario(cls, usuario) -> "UsuarioActual":
+        return cls(id_usuario=usuario.id_usuario, email=usuario.email, nombre=usuario.nombre)
+
+class PrincipalCache:
+    """Caché en proceso de usuarios autenticados, indexada por sesión y hash del token.
+
+    Las entradas viven como máximo `ttl` segundos (o hasta el `exp` del token) y se
+    invalidan en todos los workers mediante un canal pub/sub de Redis.
+    """
+
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_TTL, max_items: int = PRINCIPAL_CACHE_MAX_ITEMS):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._entradas = OrderedDict()  # (session_id, hash_token) -> (expira_en, UsuarioActual)
+        self._tarea_listener = None
+
+    def obtener(self, session_id: str, token_hash: str):
+        """Devuelve el usuario cacheado o None."""
+        clave = (session_id, token_hash)
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            Metrics.incr("principal_cache.miss")
+            return None
+        expira_en, usuario = entrada
+        if expira_en <= time.time():
+            del self._entradas[clave]
+            Metrics.incr("principal_cache.miss")
+            return None
+        self._entradas.move_to_end(clave)
+        Metrics.incr("principal_cache.hit")
+        return usuario
+
+    def guardar(self, session_id: str, token_hash: str, usuario: UsuarioActual, token_exp: float = None):
+        """Guarda el usuario hasta que venza el TTL o el token, lo que ocurra primero."""
+        expira_en = time.time() + self.ttl
+        if token_exp is not None:
+            expira_en = min(expira_en, token_exp)
+        clave = (session_id, token_hash)
+        self._entradas[clave] = (expira_en, usuario)
+        self._entradas.move_to_end(clave)
+        while len(self._entradas) > self.max_items:
+            self._entradas.popitem(last=False)
+
+    def invalidar_local(self, session_id: str = None, id_usuario: int = None):
+        """Elimina las entradas de una sesión o de un usuario en este proceso."""
+        claves = [
+            clave for clave, (_, usuario) in self._entradas.items()
+            if (session_id is not None and clave[0] == session_id)
+            or (id_usuario is not None and usuario.id_usuario == id_usuario)
+        ]
+        for clave in claves:
+            del self._entradas[clave]
+        if claves:
+            Metrics.incr("principal_cache.invalidations", len(claves))
+
+    async def invalidar(self, session_id: str = None, id_usuario: int = None):
+        """Invalida localmente y avisa al resto de workers."""
+        self.invalidar_local(session_id=session_id, id_usuario=id_usuario)
+        redis = SessionManager.redis_client
+        if redis is None:
+            return
+        try:
+            await redis.publish(INVALIDATION_CHANNEL, json.dumps({"session_id": session_id, "id_usuario": id_usuario}))
+        except Exception as e:
+            logger.error(f"Error publicando la invalidación de la caché de usuarios: {e}")
+
+    def limpiar(self):
+        self._entradas.clear()
+
+    async def _escuchar_invalidaciones(self):
+        while True:
+            redis = SessionManager.redis_client
+            if redis is None:
+                await asyncio.sleep(1)
+                continue
+            pubsub = redis.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                while True:
+                    mensaje = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if mensaje and mensaje.get("type") == "message":
+                        datos = json.loads(mensaje["data"])
+                        self.invalidar_local(session_id=datos.get("session_id"), id_usuario=datos.get("id_usuario"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Si se pierde el canal, ninguna entrada es confiable: se vacía y se reintenta
+                logger.error(f"Error escuchando invalidaciones de usuarios: {e}")
+                self.limpiar()
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def iniciar_listener(self):
+        """Arranca la tarea que recibe invalidaciones de otros workers."""
+        if self._tarea_listener is None:
+            self._tarea_listener = asyncio.create_task(self._escuchar_invalidaciones())
+
+    async def detener_listener(self):
+        """Detiene la tarea de invalidaciones."""
+        if self._tarea_listener is not None:
+            self._tarea_listener.cancel()
+            try:
+                await self._tarea_listener
+            except asyncio.CancelledError:
+                pass
+            self._tarea_listener = None
+
+# Instancia compartida por el servicio de autenticación
+principal_cache = PrincipalCache()
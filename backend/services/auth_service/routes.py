@@ -1,16 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from services.auth_service import security, schemas
-from common.database.database import get_db
+from common.database.database import get_async_db
 from datetime import timedelta
 from common.models.usuario import Usuario, Cuenta
 from common.schemas.usuario import UsuarioCreate, UsuarioResponse
 # from common.utils.session_manager import SessionManager  # Eliminar esta línea
 from services.auth_service.security import get_session_manager  # Importar la dependencia
+from services.auth_service.principal_cache import principal_cache, UsuarioActual
+from common.utils.token_verifier import revocaciones
 
 router = APIRouter()
 
+def metadata_sesion(request: Request) -> dict:
+    """Datos del dispositivo que se guardan junto a la sesión para poder identificarla."""
+    return {
+        "user_agent": request.headers.get("user-agent"),
+        "ip": request.client.host if request.client else None,
+    }
+
+async def revocar_sesion(session_id: str, token: str):
+    """Revoca el token de una sesión eliminada y la saca de la caché de usuarios."""
+    if token:
+        await revocaciones.revocar(token)
+    await principal_cache.invalidar(session_id=session_id)
+
 @router.post(
     "/register",
     response_model=UsuarioResponse,
@@ -20,20 +36,22 @@ router = APIRouter()
 async def register_usuario(
     usuario: UsuarioCreate,
     response: Response,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
     session_manager: security.SessionManager = Depends(get_session_manager)  # Usar la dependencia
 ):
     logs = [
         f"Datos de registro recibidos - Nombre: {usuario.nombre}, Email: {usuario.email}, Contraseña: {usuario.password}"
     ]
 
-    db_usuario = db.query(Usuario).filter(Usuario.email == usuario.email).first()
+    result = await db.execute(select(Usuario).where(Usuario.email == usuario.email))
+    db_usuario = result.scalars().first()
     if db_usuario:
         raise HTTPException(status_code=400, detail="El email ya está registrado.")
 
     try:
         # Crear el usuario con campos básicos
-        hashed_password = security.get_password_hash(usuario.password)
+        hashed_password = await security.get_password_hash_async(usuario.password)
         nuevo_usuario = Usuario(
             nombre=usuario.nombre,
             email=usuario.email,
@@ -51,8 +69,8 @@ async def register_usuario(
 
         # Guardar en la base de datos
         db.add(nuevo_usuario)
-        db.commit()
-        db.refresh(nuevo_usuario)
+        await db.commit()
+        await db.refresh(nuevo_usuario, ["cuenta"])
         logs.append("Usuario y cuenta guardados en la base de datos")
 
         # Generar token JWT
@@ -62,9 +80,10 @@ async def register_usuario(
         )
         logs.append("Token JWT generado")
 
-        # Almacenar el JWT en Redis
-        session_id = f"session_{nuevo_usuario.email}"
-        await session_manager.store_jwt(session_id, access_token)
+        # Crear una sesión propia para este dispositivo (un solo round trip a Redis)
+        session_id = await session_manager.create_session(
+            nuevo_usuario.id_usuario, access_token, metadata_sesion(request)
+        )
         logs.append("Token JWT almacenado en Redis")
 
         # Configurar la cookie con el session_id
@@ -82,22 +101,27 @@ async def register_usuario(
         print("\n".join(logs))
 
         return nuevo_usuario
+    except HTTPException:
+        # Errores controlados (por ejemplo, 503 si el pool de contraseñas está saturado)
+        await db.rollback()
+        raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Error en register_usuario: {e}")
         raise HTTPException(status_code=500, detail="Error al registrar el usuario.")
 
 @router.post("/login", summary="Iniciar sesión de un usuario")
 async def login(
     response: Response,
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     session_manager: security.SessionManager = Depends(get_session_manager)  # Usar la dependencia
 ):
     logs = [f"Intento de inicio de sesión - Email: {form_data.username}"]
 
     # Autenticar al usuario
-    user = security.authenticate_user(db, form_data.username, form_data.password)
+    user = await security.authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -111,9 +135,8 @@ async def login(
     )
     logs.append("Token JWT generado")
 
-    # Almacenar el JWT en Redis
-    session_id = f"session_{user.email}"
-    await session_manager.store_jwt(session_id, access_token)
+    # Crear una sesión nueva; las sesiones de otros dispositivos se conservan
+    session_id = await session_manager.create_session(user.id_usuario, access_token, metadata_sesion(request))
     logs.append("Token JWT almacenado en Redis")
 
     # Configurar la cookie con el session_id
@@ -143,7 +166,8 @@ async def logout(
     # Obtener el session_id de la cookie
     session_id = request.cookies.get("session_id")
     if session_id:
-        await session_manager.delete_jwt(session_id)  # Eliminar el JWT de Redis
+        token = await session_manager.delete_session(session_id)  # Eliminar la sesión de Redis
+        await revocar_sesion(session_id, token)       # El token deja de ser válido en todos los workers
         response.delete_cookie("session_id")          # Eliminar la cookie de sesión
         logs.append("Sesión cerrada y JWT eliminado de Redis")
     else:
@@ -155,6 +179,49 @@ async def logout(
     return {"message": "Sesión cerrada"}
 
 @router.get("/check_session", summary="Verificar sesión")
-async def check_session(current_user: Usuario = Depends(security.get_current_user)):
+async def check_session(current_user: UsuarioActual = Depends(security.get_current_user)):
     print(f"Verificación de sesión para el usuario: {current_user.email}")
-    return {"message": "Sesión válida", "user": current_user.email}
\ No newline at end of file
+    return {"message": "Sesión válida", "user": current_user.email}
+
+@router.get("/sessions", summary="Listar mis sesiones activas")
+async def listar_sesiones(
+    request: Request,
+    current_user: UsuarioActual = Depends(security.get_current_user),
+    session_manager: security.SessionManager = Depends(get_session_manager)
+):
+    session_actual = request.cookies.get("session_id")
+    sesiones = await session_manager.list_sessions(current_user.id_usuario)
+    for sesion in sesiones:
+        sesion["actual"] = sesion["session_id"] == session_actual
+    return {"sesiones": sesiones}
+
+@router.delete("/sessions/{session_id}", summary="Revocar una sesión")
+async def revocar_una_sesion(
+    session_id: str,
+    response: Response,
+    request: Request,
+    current_user: UsuarioActual = Depends(security.get_current_user),
+    session_manager: security.SessionManager = Depends(get_session_manager)
+):
+    # Solo se eliminan sesiones del propio usuario
+    token = await session_manager.delete_session(session_id, id_usuario=current_user.id_usuario)
+    if token is None:
+        raise HTTPException(status_code=404, detail="Sesión no encontrada.")
+    await revocar_sesion(session_id, token)
+    if session_id == request.cookies.get("session_id"):
+        response.delete_cookie("session_id")
+    return {"message": "Sesión revocada"}
+
+@router.delete("/sessions", summary="Cerrar las demás sesiones")
+async def revocar_otras_sesiones(
+    request: Request,
+    current_user: UsuarioActual = Depends(security.get_current_user),
+    session_manager: security.SessionManager = Depends(get_session_manager)
+):
+    tokens = await session_manager.delete_user_sessions(
+        current_user.id_usuario, except_session_id=request.cookies.get("session_id")
+    )
+    for token in tokens:
+        await revocaciones.revocar(token)
+    await principal_cache.invalidar(id_usuario=current_user.id_usuario)
+    return {"message": "Sesiones revocadas", "revocadas": len(tokens)}
@@ -1,11 +1,17 @@
 from fastapi import Depends, HTTPException, status, Request
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
-from common.database.database import get_db
+from jose.exceptions import ExpiredSignatureError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from common.database.database import get_async_db
 from common.models.usuario import Usuario
 from passlib.context import CryptContext
 from common.utils.session_manager import SessionManager  # Importar SessionManager
+from services.auth_service.password_pool import password_pool
+from services.auth_service.principal_cache import principal_cache, UsuarioActual
+from common.utils.token_verifier import TokenVerifier, revocaciones, digest_token
 import os
+import secrets
 from datetime import datetime, timedelta, timezone
 import logging
 
@@ -22,6 +28,9 @@ if not SECRET_KEY:
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Verificador de JWT con caché de tokens ya validados
+verificador = TokenVerifier(SECRET_KEY, ALGORITHM)
+
 # Función para inicializar `SessionManager` como dependencia
 async def get_session_manager() -> SessionManager:
     """Devuelve una instancia de SessionManager."""
@@ -33,22 +42,44 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verifica la contraseña en el pool acotado, sin bloquear el event loop."""
+    return await password_pool.ejecutar(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hashea la contraseña en el pool acotado, sin bloquear el event loop."""
+    return await password_pool.ejecutar(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # `jti` distingue tokens emitidos en el mismo segundo (revocar uno no debe revocar otro)
+    to_encode.update({"exp": expire, "jti": secrets.token_urlsafe(16)})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+async def renovar_token(session_manager: SessionManager, session_id: str, token: str) -> str:
+    """Emite un JWT nuevo para una sesión activa cuyo token expiró y lo guarda en la sesión."""
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"verify_exp": False})
+    nuevo_token = create_access_token(data={"sub": payload.get("sub")})
+    if not await session_manager.update_jwt(session_id, nuevo_token):
+        # La sesión expiró entre la lectura del token y la renovación
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Sesión inválida o expirada.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return nuevo_token
+
 async def get_current_user(
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     session_manager: SessionManager = Depends(get_session_manager),
 ):
-    """Obtiene al usuario actual a partir de un token almacenado en Redis."""
+    """Obtiene al usuario actual (como UsuarioActual) a partir de un token almacenado en Redis."""
     session_id = request.cookies.get("session_id")
     if not session_id:
         raise HTTPException(
@@ -70,6 +101,8 @@ async def get_current_user(
         # Convertir bytes a string si es necesario
         if isinstance(token, bytes):
             token = token.decode("utf-8")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error al obtener el token desde Redis: {e}")
         raise HTTPException(
@@ -77,9 +110,28 @@ async def get_current_user(
             detail="Error interno del servidor.",
         )
 
+    token_hash = digest_token(token)
+    if await revocaciones.esta_revocado(token_hash):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token revocado.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    # Si la sesión y el token ya fueron validados hace poco, se evita el decode y la consulta
+    usuario_cacheado = principal_cache.obtener(session_id, token_hash)
+    if usuario_cacheado is not None:
+        return usuario_cacheado
+
     try:
         # Decodificar el token y verificar su validez
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        try:
+            payload = verificador.decodificar(token, token_hash)
+        except ExpiredSignatureError:
+            # La sesión sigue viva en Redis (expiración deslizante): se emite un token nuevo
+            token = await renovar_token(session_manager, session_id, token)
+            token_hash = digest_token(token)
+            payload = verificador.decodificar(token, token_hash)
         email: str = payload.get("sub")
         if email is None:
             raise HTTPException(
@@ -95,7 +147,8 @@ async def get_current_user(
         )
 
     # Buscar al usuario en la base de datos
-    user = db.query(Usuario).filter(Usuario.email == email).first()
+    result = await db.execute(select(Usuario).where(Usuario.email == email))
+    user = result.scalars().first()
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -103,13 +156,16 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    return user
+    usuario_actual = UsuarioActual.desde_usuario(user)
+    principal_cache.guardar(session_id, token_hash, usuario_actual, payload.get("exp"))
+    return usuario_actual
 
-def authenticate_user(db: Session, email: str, password: str):
+async def authenticate_user(db: AsyncSession, email: str, password: str):
     """Autentica a un usuario verificando su email y contraseña."""
-    user = db.query(Usuario).filter(Usuario.email == email).first()
+    result = await db.execute(select(Usuario).where(Usuario.email == email))
+    user = result.scalars().first()
     if not user:
         return False
-    if not verify_password(password, user.contraseña):
+    if not await verify_password_async(password, user.contraseña):
         return False
     return user
\ No newline at end of file
@@ -0,0 +1,213 @@
+import math
+import os
+import re
+import unicodedata
+from collections import Counter, OrderedDict, defaultdict
+from sqlalchemy import event, func, literal_column, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from services.ai_content_service.models import Documento
+from services.document_service.proyeccion import seleccionar_documentos
+
+# Configuración de búsqueda de texto de PostgreSQL (diccionario y stemming en español)
+CONFIG_BUSQUEDA = literal_column("'spanish'::regconfig")
+# Columna generada `tsvector` con índice GIN; solo existe en PostgreSQL (se crea en las migraciones)
+_BUSQUEDA = literal_column("documentos.busqueda")
+# Usuarios con índice invertido en memoria por proceso (solo fuera de PostgreSQL)
+DOCUMENT_SEARCH_MAX_INDEXES = int(os.getenv("DOCUMENT_SEARCH_MAX_INDEXES", "256"))
+
+async def buscar(db: AsyncSession, id_usuario: int, q: str, despues: tuple = None, limite: int = 20, campos: list = None) -> list:
+    """Documentos del usuario que contienen todos los términos de `q`, del más al menos relevante.
+
+    Devuelve pares (fila, rango). `despues` es el (rango, id_documento) del último
+    resultado de la página anterior. En PostgreSQL busca en la columna `busqueda` (índice
+    GIN) y ordena con ts_rank_cd; en otras bases usa un índice invertido en memoria.
+    """
+    if db.bind.dialect.name == "postgresql":
+        return await _buscar_postgresql(db, id_usuario, q, despues, limite, campos)
+    return await _buscar_en_memoria(db, id_usuario, q, despues, limite, campos)
+
+async def _buscar_postgresql(db: AsyncSession, id_usuario: int, q: str, despues: tuple, limite: int, campos: list) -> list:
+    # websearch_to_tsquery acepta lo que escribe un usuario: "frases", -exclusiones y OR
+    consulta_texto = func.websearch_to_tsquery(CONFIG_BUSQUEDA, q)
+    rango = func.ts_rank_cd(_BUSQUEDA, consulta_texto)
+    consulta = (
+        seleccionar_documentos(campos)
+        .add_columns(rango.label("rango"))
+        .where(Documento.id_usuario == id_usuario, _BUSQUEDA.op("@@")(consulta_texto))
+    )
+    if despues is not None:
+        consulta = consulta.where(tuple_(rango, Documento.id_documento) < tuple_(*despues))
+    consulta = consulta.order_by(rango.desc(), Documento.id_documento.desc()).limit(limite)
+    filas = (await db.execute(consulta)).all()
+    return [(fila if campos else fila[0], fila.rango) for fila in filas]
+
+async def _buscar_en_memoria(db: AsyncSession, id_usuario: int, q: str, despues: tuple, limite: int, campos: list) -> list:
+    async def construir():
+        indice = IndiceInvertido()
+        resultado = await db.execute(
+            select(Documento.id_documento, Documento.contenido).where(Documento.id_usuario == id_usuario)
+        )
+        for id_documento, contenido in resultado:
+            indice.agregar(id_documento, contenido)
+        return indice
+
+    indice = await _indices.obtener(id_usuario, construir)
+    aciertos = indice.buscar(q)
+    if despues is not None:
+        aciertos = [acierto for acierto in aciertos if acierto < tuple(despues)]
+    aciertos = aciertos[:limite]
+    if not aciertos:
+        return []
+    rangos = {id_documento: rango for rango, id_documento in aciertos}
+    resultado = await db.execute(seleccionar_documentos(campos).where(Documento.id_documento.in_(rangos)))
+    filas = {fila.id_documento: fila for fila in (resultado.all() if campos else resultado.scalars())}
+    return [(filas[id_documento], rango) for rango, id_documento in aciertos if id_documento in filas]
+
+# --- Índice invertido en memoria (SQLite y desarrollo) ---
+
+_PALABRA = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a al algo con como cual de del desde donde e el ella en entre era es esa ese eso esta este esto "
+    "ha hay la las le les lo los mas me mi muy ni no nos o para pero por que se si sin sobre su sus "
+    "te tu un una uno unos y ya".split()
+)
+_SUFIJOS = ("aciones", "acion", "amente", "mente", "es", "s")
+
+def _sin_acentos(texto: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", texto.lower()) if not unicodedata.combining(c))
+
+def _raiz(palabra: str) -> str:
+    """Stemming mínimo en español: plurales y algunos sufijos frecuentes."""
+    for sufijo in _SUFIJOS:
+        if palabra.endswith(sufijo) and len(palabra) - len(sufijo) >= 4:
+            return palabra[:-len(sufijo)]
+    return palabra
+
+def terminos(texto: str) -> list:
+    return [_raiz(palabra) for palabra in _PALABRA.findall(_sin_acentos(texto)) if palabra not in _STOPWORDS]
+
+def _textos(valor):
+    """Todos los textos de un valor JSON (como jsonb_to_tsvector con '["string"]')."""
+    if isinstance(valor, str):
+        yield valor
+    elif isinstance(valor, dict):
+        for v in valor.values():
+            yield from _textos(v)
+    elif isinstance(valor, list):
+        for v in valor:
+            yield from _textos(v)
+
+class IndiceInvertido:
+    """Índice invertido de los documentos de un usuario con ranking BM25.
+
+    Es el respaldo de la búsqueda cuando la base no es PostgreSQL: se construye al primer
+    uso con los documentos del usuario y se descarta cuando este proceso confirma un cambio
+    en alguno de ellos. Como ts_rank_cd, solo devuelve documentos con todos los términos.
+
+    Solo sirve con un único proceso: los cambios que confirma otro proceso no invalidan
+    este índice, que seguiría devolviendo resultados viejos.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self._postings = defaultdict(dict)  # termino -> {id_documento: frecuencia}
+        self._longitudes = {}               # id_documento -> términos del documento
+
+    def agregar(self, id_documento: int, contenido):
+        conteo = Counter(termino for texto in _textos(contenido) for termino in terminos(texto))
+        for termino, frecuencia in conteo.items():
+            self._postings[termino][id_documento] = frecuencia
+        self._longitudes[id_documento] = sum(conteo.values())
+
+    def buscar(self, q: str) -> list:
+        """(rango, id_documento) de los documentos con todos los términos, de mayor a menor."""
+        consulta = set(terminos(q))
+        if not consulta or not self._longitudes:
+            return []
+        postings = [self._postings.get(termino, {}) for termino in consulta]
+        candidatos = set.intersection(*(set(p) for p in postings))
+        total = len(self._longitudes)
+        promedio = sum(self._longitudes.values()) / total or 1
+        aciertos = []
+        for id_documento in candidatos:
+            normalizacion = self.K1 * (1 - self.B + self.B * self._longitudes[id_documento] / promedio)
+            rango = 0.0
+            for posting in postings:
+                frecuencia = posting[id_documento]
+                idf = math.log(1 + (total - len(posting) + 0.5) / (len(posting) + 0.5))
+                rango += idf * frecuencia * (self.K1 + 1) / (frecuencia + normalizacion)
+            aciertos.append((round(rango, 6), id_documento))
+        return sorted(aciertos, reverse=True)
+
+class IndicesPorUsuario:
+    """LRU de índices invertidos por usuario, acotado a `max_items`.
+
+    Cada invalidación avanza una generación. Una construcción recuerda la generación en
+    que empezó y, si mientras leía la base se invalidó el mismo usuario, devuelve su
+    índice a quien lo pidió pero no lo guarda: podría no incluir el cambio confirmado.
+    """
+
+    def __init__(self, max_items: int = DOCUMENT_SEARCH_MAX_INDEXES):
+        self.max_items = max_items
+        self._indices = OrderedDict()     # id_usuario -> IndiceInvertido
+        self._generacion = 0
+        self._construyendo = Counter()    # id_usuario -> construcciones en curso
+        self._invalidado_en = {}          # id_usuario -> generación (solo con construcciones en curso)
+
+    async def obtener(self, id_usuario: int, construir) -> IndiceInvertido:
+        indice = self._indices.get(id_usuario)
+        if indice is not None:
+            self._indices.move_to_end(id_usuario)
+            return indice
+        generacion = self._generacion
+        self._construyendo[id_usuario] += 1
+        try:
+            indice = await construir()
+        finally:
+            vigente = self._invalidado_en.get(id_usuario, generacion) <= generacion
+            self._construyendo[id_usuario] -= 1
+            if not self._construyendo[id_usuario]:
+                del self._construyendo[id_usuario]
+                self._invalidado_en.pop(id_usuario, None)
+        if vigente:
+            self._indices[id_usuario] = indice
+            self._indices.move_to_end(id_usuario)
+            while len(self._indices) > self.max_items:
+                self._indices.popitem(last=False)
+        return indice
+
+    def invalidar(self, id_usuario: int):
+        self._generacion += 1
+        self._indices.pop(id_usuario, None)
+        if id_usuario in self._construyendo:
+            self._invalidado_en[id_usuario] = self._generacion
+
+    def limpiar(self):
+        self._indices.clear()
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+# Índices de este proceso
+_indices = IndicesPorUsuario()
+
+@event.listens_for(Session, "after_flush")
+def _anotar_cambios(session, contexto):
+    usuarios = session.info.setdefault("documentos_modificados", set())
+    for objeto in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(objeto, Documento):
+            usuarios.add(objeto.id_usuario)
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_indices(session):
+    # Tras el commit: si se descartara al hacer flush, otra sesión podría reconstruir el
+    # índice antes del commit y guardarlo sin los cambios
+    for id_usuario in session.info.pop("documentos_modificados", ()):
+        _indices.invalidar(id_usuario)
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_cambios(session):
+    session.info.pop("documentos_modificados", None)
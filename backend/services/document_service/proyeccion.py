@@ -0,0 +1,54 @@
+import re
+from typing import Optional
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from services.ai_content_service.models import Documento
+
+CAMPOS_MAXIMOS = 20
+# Clave del contenido o ruta con puntos hacia una clave anidada ("objetivo_campana.objetivo")
+_CAMPO = re.compile(r"^\w+(\.\w+)*$")
+_COLUMNAS = (
+    Documento.id_documento,
+    Documento.id_usuario,
+    Documento.tipo_documento,
+    Documento.version_prompt,
+    Documento.fecha_creacion,
+)
+
+def leer_campos(fields: Optional[str]) -> Optional[list]:
+    """Rutas del contenido pedidas en `?fields=` (separadas por comas), o None si no se pidió proyección."""
+    if fields is None:
+        return None
+    campos = list(dict.fromkeys(campo.strip() for campo in fields.split(",") if campo.strip()))
+    if not campos or len(campos) > CAMPOS_MAXIMOS or not all(_CAMPO.match(campo) for campo in campos):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"fields debe listar entre 1 y {CAMPOS_MAXIMOS} claves del contenido separadas por comas (por ejemplo: encabezados).",
+        )
+    return campos
+
+def seleccionar_documentos(campos: list = None):
+    """SELECT de documentos. Con `campos`, la base extrae solo esas rutas del contenido."""
+    if campos is None:
+        return select(Documento)
+    rutas = [Documento.contenido[tuple(campo.split("."))].label(f"campo_{i}") for i, campo in enumerate(campos)]
+    return select(*_COLUMNAS, *rutas)
+
+def documento_proyectado(fila, campos: list) -> dict:
+    """Documento con el contenido reducido a los campos pedidos (los ausentes se omiten)."""
+    documento = {columna.key: getattr(fila, columna.key) for columna in _COLUMNAS}
+    contenido = {}
+    for i, campo in enumerate(campos):
+        valor = getattr(fila, f"campo_{i}")
+        if valor is None:
+            continue
+        *ruta, clave = campo.split(".")
+        destino = contenido
+        for parte in ruta:
+            destino = destino.setdefault(parte, {})
+            if not isinstance(destino, dict):
+                break
+        else:
+            destino[clave] = valor
+    documento["contenido"] = contenido
+    return documento
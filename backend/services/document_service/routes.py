@@ -1,16 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from common.database.database import get_db
-from common.models.usuario import Usuario
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from common.database.database import get_async_db
+from common.utils.paginacion import PAGINA_POR_DEFECTO, PAGINA_MAXIMA, codificar_cursor, decodificar_cursor, pagina
+from services.auth_service.principal_cache import UsuarioActual
 from ..ai_content_service.models import Documento
-from services.document_service.schemas import DocumentoCreate, DocumentoUpdate, DocumentoResponse
+from services.document_service.proyeccion import leer_campos, seleccionar_documentos, documento_proyectado
+from services.document_service.busqueda import buscar
+from services.document_service.schemas import DocumentoCreate, DocumentoUpdate, DocumentoResponse, PaginaDocumentos, PaginaBusqueda
 from services.auth_service.security import get_current_user
 from datetime import datetime, timezone
+import hashlib
 
 router = APIRouter()
 
+def consulta_documentos_usuario(id_usuario: int, despues: tuple = None, limite: int = PAGINA_POR_DEFECTO, campos: list = None):
+    """Documentos del usuario, del más reciente al más antiguo (servida por ix_documentos_usuario_fecha).
+
+    `despues` es la posición (fecha_creacion, id_documento) del último documento de la
+    página anterior: la página siguiente empieza en el índice, sin recorrer las previas.
+    """
+    consulta = seleccionar_documentos(campos).where(Documento.id_usuario == id_usuario)
+    if despues is not None:
+        consulta = consulta.where(tuple_(Documento.fecha_creacion, Documento.id_documento) < tuple_(*despues))
+    return consulta.order_by(Documento.fecha_creacion.desc(), Documento.id_documento.desc()).limit(limite)
+
 @router.post("/", response_model=DocumentoResponse, status_code=status.HTTP_201_CREATED, summary="Crear un nuevo documento")
-def crear_documento(documento: DocumentoCreate, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
+async def crear_documento(documento: DocumentoCreate, db: AsyncSession = Depends(get_async_db), current_user: UsuarioActual = Depends(get_current_user)):
     nuevo_documento = Documento(
         tipo_documento=documento.tipo_documento,
         contenido=documento.contenido,
@@ -18,25 +35,86 @@ def crear_documento(documento: DocumentoCreate, db: Session = Depends(get_db), c
         fecha_creacion=datetime.now(timezone.utc)
     )
     db.add(nuevo_documento)
-    db.commit()
-    db.refresh(nuevo_documento)
+    await db.commit()
+    await db.refresh(nuevo_documento)
     return nuevo_documento
 
+@router.get("/search", response_model=PaginaBusqueda, summary="Buscar en los documentos del usuario, del más al menos relevante")
+async def buscar_documentos(
+    q: str = Query(..., min_length=1, max_length=200, description="Términos a buscar (admite \"frases\" y -exclusiones en PostgreSQL)"),
+    cursor: Optional[str] = Query(None, description="next_cursor de la página anterior"),
+    limit: int = Query(PAGINA_POR_DEFECTO, ge=1, le=PAGINA_MAXIMA),
+    fields: Optional[str] = Query(None, description="Claves del contenido a devolver, separadas por comas"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UsuarioActual = Depends(get_current_user),
+):
+    campos = leer_campos(fields)
+    # El cursor solo sirve para la misma búsqueda: los rangos de otra no son comparables
+    listado = "busqueda:" + hashlib.sha256(q.encode("utf-8")).hexdigest()[:16]
+    despues = tuple(decodificar_cursor(cursor, listado, current_user.id_usuario)) if cursor else None
+    aciertos = await buscar(db, current_user.id_usuario, q, despues, limit + 1, campos)
+    respuesta = pagina(
+        aciertos,
+        limit,
+        lambda acierto: codificar_cursor(listado, current_user.id_usuario, [acierto[1], acierto[0].id_documento]),
+    )
+    respuesta["items"] = [
+        {
+            **(documento_proyectado(fila, campos) if campos else DocumentoResponse.model_validate(fila).model_dump()),
+            "rango": rango,
+        }
+        for fila, rango in respuesta["items"]
+    ]
+    return respuesta
+
 @router.get("/{id_documento}", response_model=DocumentoResponse, summary="Obtener información de un documento")
-def obtener_documento(id_documento: int, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
-    documento = db.query(Documento).filter(Documento.id_documento == id_documento, Documento.id_usuario == current_user.id_usuario).first()
+async def obtener_documento(
+    id_documento: int,
+    fields: Optional[str] = Query(None, description="Claves del contenido a devolver, separadas por comas"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UsuarioActual = Depends(get_current_user),
+):
+    campos = leer_campos(fields)
+    result = await db.execute(
+        seleccionar_documentos(campos).where(Documento.id_documento == id_documento, Documento.id_usuario == current_user.id_usuario)
+    )
+    documento = result.first() if campos else result.scalars().first()
     if not documento:
         raise HTTPException(status_code=404, detail="Documento no encontrado.")
-    return documento
+    return documento_proyectado(documento, campos) if campos else documento
 
-@router.get("/", response_model=list[DocumentoResponse], summary="Obtener todos los documentos del usuario")
-def listar_documentos(db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
-    documentos = db.query(Documento).filter(Documento.id_usuario == current_user.id_usuario).all()
-    return documentos
+@router.get("/", response_model=PaginaDocumentos, summary="Listar los documentos del usuario, del más reciente al más antiguo")
+async def listar_documentos(
+    cursor: Optional[str] = Query(None, description="next_cursor de la página anterior"),
+    limit: int = Query(PAGINA_POR_DEFECTO, ge=1, le=PAGINA_MAXIMA),
+    fields: Optional[str] = Query(None, description="Claves del contenido a devolver, separadas por comas"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UsuarioActual = Depends(get_current_user),
+):
+    campos = leer_campos(fields)
+    despues = None
+    if cursor:
+        fecha, id_documento = decodificar_cursor(cursor, "documentos", current_user.id_usuario)
+        despues = (datetime.fromisoformat(fecha), id_documento)
+    result = await db.execute(consulta_documentos_usuario(current_user.id_usuario, despues, limit + 1, campos))
+    filas = result.all() if campos else result.scalars().all()
+    respuesta = pagina(
+        filas,
+        limit,
+        lambda documento: codificar_cursor(
+            "documentos", current_user.id_usuario, [documento.fecha_creacion.isoformat(), documento.id_documento]
+        ),
+    )
+    if campos:
+        respuesta["items"] = [documento_proyectado(fila, campos) for fila in respuesta["items"]]
+    return respuesta
 
 @router.put("/{id_documento}", response_model=DocumentoResponse, summary="Actualizar un documento existente")
-def actualizar_documento(id_documento: int, documento_update: DocumentoUpdate, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
-    documento = db.query(Documento).filter(Documento.id_documento == id_documento, Documento.id_usuario == current_user.id_usuario).first()
+async def actualizar_documento(id_documento: int, documento_update: DocumentoUpdate, db: AsyncSession = Depends(get_async_db), current_user: UsuarioActual = Depends(get_current_user)):
+    result = await db.execute(
+        select(Documento).where(Documento.id_documento == id_documento, Documento.id_usuario == current_user.id_usuario)
+    )
+    documento = result.scalars().first()
     if not documento:
         raise HTTPException(status_code=404, detail="Documento no encontrado.")
     
@@ -45,16 +123,19 @@ def actualizar_documento(id_documento: int, documento_update: DocumentoUpdate, d
     if documento_update.contenido is not None:
         documento.contenido = documento_update.contenido
     
-    db.commit()
-    db.refresh(documento)
+    await db.commit()
+    await db.refresh(documento)
     return documento
 
 @router.delete("/{id_documento}", status_code=status.HTTP_200_OK, summary="Eliminar un documento")
-def eliminar_documento(id_documento: int, db: Session = Depends(get_db), current_user: Usuario = Depends(get_current_user)):
-    documento = db.query(Documento).filter(Documento.id_documento == id_documento, Documento.id_usuario == current_user.id_usuario).first()
+async def eliminar_documento(id_documento: int, db: AsyncSession = Depends(get_async_db), current_user: UsuarioActual = Depends(get_current_user)):
+    result = await db.execute(
+        select(Documento).where(Documento.id_documento == id_documento, Documento.id_usuario == current_user.id_usuario)
+    )
+    documento = result.scalars().first()
     if not documento:
         raise HTTPException(status_code=404, detail="Documento no encontrado.")
     
-    db.delete(documento)
-    db.commit()
+    await db.delete(documento)
+    await db.commit()
     return {"msg": "Documento eliminado exitosamente."}
\ No newline at end of file
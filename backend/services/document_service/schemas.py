@@ -1,10 +1,11 @@
 from pydantic import BaseModel, Field, validator
-from typing import Optional
+from typing import List, Optional, Union
 from datetime import datetime
 
 class DocumentoCreate(BaseModel):
     tipo_documento: str = Field(..., example="Informe")
-    contenido: str = Field(..., example="Contenido del documento...")
+    # Texto libre o JSON (como el de los documentos generados)
+    contenido: Union[dict, list, str] = Field(..., example="Contenido del documento...")
 
     @validator('tipo_documento')
     def tipo_valido(cls, v):
@@ -15,7 +16,7 @@ class DocumentoCreate(BaseModel):
 
 class DocumentoUpdate(BaseModel):
     tipo_documento: Optional[str] = Field(None, example="Reporte")
-    contenido: Optional[str] = Field(None, example="Contenido actualizado del documento...")
+    contenido: Optional[Union[dict, list, str]] = Field(None, example="Contenido actualizado del documento...")
 
     @validator('tipo_documento')
     def tipo_valido(cls, v):
@@ -28,9 +29,23 @@ class DocumentoUpdate(BaseModel):
 class DocumentoResponse(BaseModel):
     id_documento: int
     tipo_documento: str
-    contenido: str
+    # Con ?fields= solo trae las claves pedidas
+    contenido: Union[dict, list, str]
     fecha_creacion: datetime
     id_usuario: int
+    version_prompt: Optional[str] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class PaginaDocumentos(BaseModel):
+    items: List[DocumentoResponse]
+    next_cursor: Optional[str] = None
+
+class ResultadoBusqueda(DocumentoResponse):
+    # Relevancia del documento para la búsqueda (mayor es más relevante)
+    rango: float
+
+class PaginaBusqueda(BaseModel):
+    items: List[ResultadoBusqueda]
+    next_cursor: Optional[str] = None
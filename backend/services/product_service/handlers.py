@@ -1,25 +1,50 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException, status
+from common.utils.paginacion import PAGINA_POR_DEFECTO, codificar_cursor, decodificar_cursor, pagina
 from . import models, schemas
 
-def obtener_productos_por_usuario(db: Session, usuario_id: int, skip: int = 0, limit: int = 10):
-    return db.query(models.Producto).filter(models.Producto.id_usuario == usuario_id).offset(skip).limit(limit).all()
+def consulta_productos_por_usuario(usuario_id: int, despues: int = None, limit: int = PAGINA_POR_DEFECTO):
+    """Productos del usuario en orden de creación (servida por ix_productos_usuario_producto).
 
-def crear_producto(db: Session, producto: schemas.ProductoCreate, usuario_id: int):
+    `despues` es el id_producto del último producto de la página anterior.
+    """
+    consulta = select(models.Producto).where(models.Producto.id_usuario == usuario_id)
+    if despues is not None:
+        consulta = consulta.where(models.Producto.id_producto > despues)
+    return consulta.order_by(models.Producto.id_producto).limit(limit)
+
+async def obtener_productos_por_usuario(db: AsyncSession, usuario_id: int, cursor: str = None, limit: int = PAGINA_POR_DEFECTO):
+    """Página de productos del usuario con el cursor de la siguiente (`next_cursor`)."""
+    despues = decodificar_cursor(cursor, "productos", usuario_id)[0] if cursor else None
+    result = await db.execute(consulta_productos_por_usuario(usuario_id, despues, limit + 1))
+    return pagina(
+        result.scalars().all(),
+        limit,
+        lambda producto: codificar_cursor("productos", usuario_id, [producto.id_producto]),
+    )
+
+async def crear_producto(db: AsyncSession, producto: schemas.ProductoCreate, usuario_id: int):
     nuevo_producto = models.Producto(**producto.dict(), id_usuario=usuario_id)
     db.add(nuevo_producto)
-    db.commit()
-    db.refresh(nuevo_producto)
+    await db.commit()
+    await db.refresh(nuevo_producto)
     return nuevo_producto
 
-def obtener_producto(db: Session, producto_id: int, usuario_id: int):
-    producto = db.query(models.Producto).filter(models.Producto.id_producto == producto_id, models.Producto.id_usuario == usuario_id).first()
+async def obtener_producto(db: AsyncSession, producto_id: int, usuario_id: int):
+    result = await db.execute(
+        select(models.Producto).where(models.Producto.id_producto == producto_id, models.Producto.id_usuario == usuario_id)
+    )
+    producto = result.scalars().first()
     if not producto:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
     return producto
 
-def actualizar_producto(db: Session, producto_id: int, producto_update: schemas.ProductoUpdate, usuario_id: int):
-    producto = db.query(models.Producto).filter(models.Producto.id_producto == producto_id, models.Producto.id_usuario == usuario_id).first()
+async def actualizar_producto(db: AsyncSession, producto_id: int, producto_update: schemas.ProductoUpdate, usuario_id: int):
+    result = await db.execute(
+        select(models.Producto).where(models.Producto.id_producto == producto_id, models.Producto.id_usuario == usuario_id)
+    )
+    producto = result.scalars().first()
     if not producto:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
     
@@ -27,15 +52,18 @@ def actualizar_producto(db: Session, producto_id: int, producto_update: schemas.
         if value is not None:
             setattr(producto, var, value)
     
-    db.commit()
-    db.refresh(producto)
+    await db.commit()
+    await db.refresh(producto)
     return producto
 
-def eliminar_producto(db: Session, producto_id: int, usuario_id: int):
-    producto = db.query(models.Producto).filter(models.Producto.id_producto == producto_id, models.Producto.id_usuario == usuario_id).first()
+async def eliminar_producto(db: AsyncSession, producto_id: int, usuario_id: int):
+    result = await db.execute(
+        select(models.Producto).where(models.Producto.id_producto == producto_id, models.Producto.id_usuario == usuario_id)
+    )
+    producto = result.scalars().first()
     if not producto:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
     
-    db.delete(producto)
-    db.commit()
+    await db.delete(producto)
+    await db.commit()
     return {"detail": "Producto eliminado exitosamente"}
\ No newline at end of file
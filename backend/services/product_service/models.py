@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Index
 from sqlalchemy.orm import relationship
 from common.database.database import Base
 from datetime import datetime, timezone
@@ -17,4 +17,9 @@ class Producto(Base):
     id_usuario = Column(Integer, ForeignKey("usuarios.id_usuario"), nullable=False)
 
     # Relación con Usuario
-    usuario = relationship("Usuario", back_populates="productos")
\ No newline at end of file
+    usuario = relationship("Usuario", back_populates="productos")
+
+    __table_args__ = (
+        # Listado paginado de productos del usuario y búsqueda de un producto propio
+        Index("ix_productos_usuario_producto", id_usuario, id_producto),
+    )
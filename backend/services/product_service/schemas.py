@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class ProductoBase(BaseModel):
@@ -24,4 +24,8 @@ class ProductoOut(ProductoBase):
     id_usuario: int
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class PaginaProductos(BaseModel):
+    items: List[ProductoOut]
+    next_cursor: Optional[str] = None
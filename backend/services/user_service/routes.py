@@ -1,40 +1,52 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from common.database.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from common.database.database import get_async_db
 from common.models.usuario import Usuario
+from services.auth_service.principal_cache import UsuarioActual, principal_cache
 from common.schemas.usuario import UsuarioResponse, UsuarioUpdate
 from datetime import datetime, timezone
-from services.auth_service.security import get_password_hash, get_current_user
+from services.auth_service.security import get_password_hash_async, get_current_user, get_session_manager, SessionManager
+from common.utils.token_verifier import revocaciones
 
 router = APIRouter()
 
+async def obtener_usuario_con_cuenta(db: AsyncSession, id_usuario: int):
+    """Carga el usuario junto con su cuenta (necesaria para UsuarioResponse)."""
+    result = await db.execute(
+        select(Usuario).options(selectinload(Usuario.cuenta)).where(Usuario.id_usuario == id_usuario)
+    )
+    return result.scalars().first()
+
 @router.get("/{id_usuario}", response_model=UsuarioResponse, summary="Obtener información de un usuario")
-def obtener_usuario(id_usuario: int, current_user: Usuario = Depends(get_current_user), db: Session = Depends(get_db)):
+async def obtener_usuario(id_usuario: int, current_user: UsuarioActual = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     if current_user.id_usuario != id_usuario:
         raise HTTPException(status_code=403, detail="No tienes permisos para acceder a este recurso.")
-    db_usuario = db.query(Usuario).filter(Usuario.id_usuario == id_usuario).first()
+    db_usuario = await obtener_usuario_con_cuenta(db, id_usuario)
     if not db_usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado.")
     return db_usuario
 
 @router.put("/{id_usuario}", response_model=UsuarioResponse, summary="Actualizar información del usuario")
-def actualizar_usuario(id_usuario: int, usuario: UsuarioUpdate, current_user: Usuario = Depends(get_current_user), db: Session = Depends(get_db)):
+async def actualizar_usuario(id_usuario: int, usuario: UsuarioUpdate, current_user: UsuarioActual = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     if current_user.id_usuario != id_usuario:
         raise HTTPException(status_code=403, detail="No tienes permisos para modificar este usuario.")
     
-    db_usuario = db.query(Usuario).filter(Usuario.id_usuario == id_usuario).first()
+    db_usuario = await obtener_usuario_con_cuenta(db, id_usuario)
     if not db_usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado.")
     
     if usuario.email:
         # Verificar si el nuevo email ya está en uso
-        email_existente = db.query(Usuario).filter(Usuario.email == usuario.email).first()
+        result = await db.execute(select(Usuario).where(Usuario.email == usuario.email))
+        email_existente = result.scalars().first()
         if email_existente and email_existente.id_usuario != id_usuario:
             raise HTTPException(status_code=400, detail="El email ya está registrado por otro usuario.")
         db_usuario.email = usuario.email
     
     if usuario.password:
-        hashed_password = get_password_hash(usuario.password)
+        hashed_password = await get_password_hash_async(usuario.password)
         db_usuario.contraseña = hashed_password
     
     if usuario.nombre is not None:
@@ -46,21 +58,31 @@ def actualizar_usuario(id_usuario: int, usuario: UsuarioUpdate, current_user: Us
     
     db_usuario.fecha_actualizacion_perfil = datetime.now(timezone.utc)
     
-    db.commit()
-    db.refresh(db_usuario)
+    await db.commit()
+    await db.refresh(db_usuario, ["cuenta"])
+    await principal_cache.invalidar(id_usuario=id_usuario)
     
     return db_usuario
 
 @router.delete("/{id_usuario}", status_code=status.HTTP_200_OK, summary="Eliminar un usuario")
-def eliminar_usuario(id_usuario: int, current_user: Usuario = Depends(get_current_user), db: Session = Depends(get_db)):
+async def eliminar_usuario(
+    id_usuario: int,
+    current_user: UsuarioActual = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    session_manager: SessionManager = Depends(get_session_manager),
+):
     if current_user.id_usuario != id_usuario:
         raise HTTPException(status_code=403, detail="No tienes permisos para eliminar este usuario.")
     
-    db_usuario = db.query(Usuario).filter(Usuario.id_usuario == id_usuario).first()
+    db_usuario = await obtener_usuario_con_cuenta(db, id_usuario)
     if not db_usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado.")
     
-    db.delete(db_usuario)
-    db.commit()
+    await db.delete(db_usuario)
+    await db.commit()
+    # Cerrar las sesiones del usuario en todos sus dispositivos
+    for token in await session_manager.delete_user_sessions(id_usuario):
+        await revocaciones.revocar(token)
+    await principal_cache.invalidar(id_usuario=id_usuario)
     
     return {"msg": "Usuario eliminado exitosamente."}
@@ -0,0 +1,25 @@
+import os
+import sys
+
+# El backend importa sus módulos desde backend/ (como en el contenedor y en Lambda)
+BACKEND = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+if BACKEND not in sys.path:
+    sys.path.insert(0, BACKEND)
+
+# Configuración mínima para importar el backend sin base de datos, Redis ni OpenAI reales
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "clave-de-pruebas-con-al-menos-32-caracteres")
+os.environ.setdefault("LLM_PROVIDER", "stub")
+
+import pytest
+
+@pytest.fixture
+def redis_falso():
+    """Redis en memoria (con scripts Lua) en lugar del cliente compartido de SessionManager."""
+    import fakeredis
+    from common.utils.session_manager import SessionManager
+
+    anterior = SessionManager.redis_client
+    SessionManager.redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    yield SessionManager.redis_client
+    SessionManager.redis_client = anterior
@@ -1,70 +1,46 @@
+import asyncio
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import AsyncMock, patch
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
-from backend.main import app
-from backend.common.database.database import Base, get_db
-from backend.common.models.usuario import Usuario, Cuenta
-
-# Crear una URL para la base de datos de prueba (en memoria)
-TEST_DATABASE_URL = "sqlite:///:memory:"
-
-# Crear el motor de la base de datos de prueba
-test_engine = create_engine(
-    TEST_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool  # Asegura que la base de datos en memoria persista durante toda la sesión de prueba
-)
-
-# Crear una clase de sesión configurada para las pruebas
-TestingSessionLocal = sessionmaker(
-    autocommit=False,
-    autoflush=False,
-    bind=test_engine
-)
-
-# Importar todos los modelos antes de crear las tablas
-# Esto asegura que SQLAlchemy conozca todos los modelos
-from backend.common.models.usuario import Usuario, Cuenta  # Asegúrate de importar todos los modelos necesarios
-
-# Crear las tablas en la base de datos de prueba
-Base.metadata.create_all(bind=test_engine)
-
-# Fixture para sobrescribir la dependencia get_db
-@pytest.fixture(scope="module")
-def override_get_db():
-    """
-    Esta fixture reemplaza la dependencia `get_db` en la aplicación FastAPI para usar la base de datos de prueba.
-    """
-    try:
-        # Crear una nueva sesión de la base de datos de prueba
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        # Cerrar la sesión después de las pruebas
-        db.close()
-
-# Aplicar la sobrescritura de la dependencia
-app.dependency_overrides[get_db] = override_get_db
-
-# Crear una instancia de TestClient usando la aplicación FastAPI con la dependencia sobrescrita
-client = TestClient(app)
-
-# Fixture para simular Redis usando mocks
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+# Los módulos se importan desde backend/ (ver conftest.py), igual que los importa la aplicación:
+# importarlos también como `backend.*` registraría los modelos dos veces en la misma MetaData
+import common.models  # noqa: F401 (registra todos los modelos)
+import services.product_service.models  # noqa: F401
+from main import app
+from common.database.database import Base, get_async_db
+from common.utils.token_verifier import revocaciones, digest_token
+
+# Fixture para usar una base SQLite nueva en cada prueba en lugar de la configurada
 @pytest.fixture(autouse=True)
-def mock_redis():
+def override_get_async_db(tmp_path):
     """
-    Esta fixture utiliza `unittest.mock` para simular las interacciones con Redis.
+    Reemplaza la dependencia `get_async_db` (la que usan las rutas) por una base de prueba.
+    Sin pool: el TestClient atiende cada request en su propio event loop.
     """
-    with patch("backend.services.auth_service.security.SessionManager") as MockSessionManager:
-        # Crear una instancia simulada de SessionManager
-        instance = MockSessionManager.return_value
-        instance.store_jwt = AsyncMock()
-        instance.get_jwt = AsyncMock()
-        instance.delete_jwt = AsyncMock()
-        yield instance
+    test_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'auth.db'}", poolclass=NullPool)
+    TestingSessionLocal = async_sessionmaker(test_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+    async def crear_tablas():
+        async with test_engine.begin() as conexion:
+            await conexion.run_sync(Base.metadata.create_all)
+
+    async def get_test_db():
+        async with TestingSessionLocal() as db:
+            yield db
+
+    asyncio.run(crear_tablas())
+    app.dependency_overrides[get_async_db] = get_test_db
+    yield
+    app.dependency_overrides.pop(get_async_db, None)
+    asyncio.run(test_engine.dispose())
+
+# Redis en memoria para las sesiones (fixture `redis_falso` de conftest.py)
+pytestmark = pytest.mark.usefixtures("redis_falso")
+
+# Crear una instancia de TestClient (sin `with`: no se ejecuta el startup que conecta a Redis)
+client = TestClient(app)
 
 # Fixture para proporcionar datos de usuario de prueba
 @pytest.fixture
@@ -75,6 +51,18 @@ def test_user():
         "password": "password123"
     }
 
+def iniciar_sesion(test_user) -> str:
+    """Inicia sesión y devuelve el session_id de la cookie."""
+    login_data = {
+        "username": test_user["email"],
+        "password": test_user["password"]
+    }
+    login_response = client.post("/auth/login", data=login_data)
+    assert login_response.status_code == 200
+    session_id = login_response.cookies.get("session_id")
+    assert session_id is not None
+    return session_id
+
 # Prueba para registrar un nuevo usuario
 def test_register_user(test_user):
     response = client.post("/auth/register", json=test_user)
@@ -82,6 +70,7 @@ def test_register_user(test_user):
     data = response.json()
     assert data["email"] == test_user["email"]
     assert "id_usuario" in data
+    assert response.cookies.get("session_id")
 
 # Prueba para intentar registrar un usuario existente
 def test_register_existing_user(test_user):
@@ -105,9 +94,9 @@ def test_login_user(test_user):
     }
     response = client.post("/auth/login", data=login_data)
     assert response.status_code == 200
-    # Dependiendo de la implementación, ajusta la aserción
-    # Aquí asumimos que devuelve un token de acceso
-    assert "access_token" in response.json()
+    # El JWT queda en Redis; el cliente solo recibe la cookie con el session_id
+    assert response.json()["message"] == "Inicio de sesión exitoso"
+    assert response.cookies.get("session_id")
 
 # Prueba para iniciar sesión con credenciales inválidas
 def test_login_invalid_credentials():
@@ -125,34 +114,33 @@ def test_logout_user(test_user):
     client.post("/auth/register", json=test_user)
 
     # Iniciar sesión para obtener la cookie de sesión
-    login_data = {
-        "username": test_user["email"],
-        "password": test_user["password"]
-    }
-    login_response = client.post("/auth/login", data=login_data)
-    assert login_response.status_code == 200
-    session_id = login_response.cookies.get("session_id")
-    assert session_id is not None
+    session_id = iniciar_sesion(test_user)
 
     # Cerrar sesión
     response = client.post("/auth/logout", cookies={"session_id": session_id})
     assert response.status_code == 200
     assert response.json()["message"] == "Sesión cerrada"
 
+    # La sesión ya no sirve
+    response = client.get("/auth/check_session", cookies={"session_id": session_id})
+    assert response.status_code == 401
+
+# Prueba para verificar que cerrar sesión revoca el JWT de la sesión
+def test_logout_revoca_el_token(test_user, redis_falso):
+    client.post("/auth/register", json=test_user)
+    session_id = iniciar_sesion(test_user)
+    token = asyncio.run(redis_falso.hget(f"session:{session_id}", "jwt"))
+
+    client.post("/auth/logout", cookies={"session_id": session_id})
+    assert asyncio.run(revocaciones.esta_revocado(digest_token(token)))
+
 # Prueba para verificar una sesión válida
 def test_check_session_valid(test_user):
     # Registrar el usuario primero
     client.post("/auth/register", json=test_user)
 
     # Iniciar sesión para obtener la cookie de sesión
-    login_data = {
-        "username": test_user["email"],
-        "password": test_user["password"]
-    }
-    login_response = client.post("/auth/login", data=login_data)
-    assert login_response.status_code == 200
-    session_id = login_response.cookies.get("session_id")
-    assert session_id is not None
+    session_id = iniciar_sesion(test_user)
 
     # Verificar la sesión válida
     response = client.get("/auth/check_session", cookies={"session_id": session_id})
@@ -165,4 +153,4 @@ def test_check_session_invalid():
     # Intentar verificar una sesión sin proporcionar la cookie de sesión
     response = client.get("/auth/check_session")
     assert response.status_code == 401
-    assert response.json()["detail"] == "Credenciales no proporcionadas."
\ No newline at end of file
+    assert response.json()["detail"] == "Credenciales no proporcionadas."
@@ -0,0 +1,69 @@
+import asyncio
+
+from services.document_service.busqueda import IndiceInvertido, IndicesPorUsuario
+
+def construccion(contenido: dict, llamadas: list = None, espera: asyncio.Event = None):
+    async def construir():
+        if llamadas is not None:
+            llamadas.append(contenido)
+        if espera is not None:
+            await espera.wait()
+        indice = IndiceInvertido()
+        indice.agregar(1, contenido)
+        return indice
+    return construir
+
+def test_lru_acotado_descarta_el_menos_usado():
+    indices = IndicesPorUsuario(max_items=2)
+
+    async def escenario():
+        for id_usuario in (1, 2):
+            await indices.obtener(id_usuario, construccion({"t": "café"}))
+        await indices.obtener(1, construccion({"t": "otro"}))  # acierto: 1 pasa al final
+        await indices.obtener(3, construccion({"t": "té"}))
+        llamadas = []
+        await indices.obtener(1, construccion({"t": "café"}, llamadas))
+        await indices.obtener(2, construccion({"t": "café"}, llamadas))
+        return llamadas
+
+    assert len(asyncio.run(escenario())) == 1  # solo se reconstruye el 2
+    assert len(indices) == 2
+
+def test_construccion_que_corre_con_una_invalidacion_no_se_guarda():
+    indices = IndicesPorUsuario()
+
+    async def escenario():
+        leyo_la_base = asyncio.Event()
+        vieja = asyncio.create_task(indices.obtener(7, construccion({"t": "viejo"}, espera=leyo_la_base)))
+        await asyncio.sleep(0)
+        indices.invalidar(7)  # otro request confirma un cambio mientras se construye
+        leyo_la_base.set()
+        indice_viejo = await vieja
+        llamadas = []
+        indice_nuevo = await indices.obtener(7, construccion({"t": "nuevo"}, llamadas))
+        return indice_viejo, indice_nuevo, llamadas
+
+    indice_viejo, indice_nuevo, llamadas = asyncio.run(escenario())
+    assert indice_viejo.buscar("viejo")  # quien lo pidió igual recibe su resultado
+    assert llamadas == [{"t": "nuevo"}]
+    assert indice_nuevo.buscar("nuevo") and not indice_nuevo.buscar("viejo")
+
+def test_invalidacion_anterior_no_descarta_una_construccion_posterior():
+    indices = IndicesPorUsuario()
+
+    async def escenario():
+        primera = asyncio.Event()
+        en_curso = asyncio.create_task(indices.obtener(7, construccion({"t": "a"}, espera=primera)))
+        await asyncio.sleep(0)
+        indices.invalidar(7)
+        # Empieza después de la invalidación: su lectura ya ve el cambio
+        segunda = await indices.obtener(7, construccion({"t": "b"}))
+        primera.set()
+        await en_curso
+        llamadas = []
+        await indices.obtener(7, construccion({"t": "c"}, llamadas))
+        return segunda, llamadas
+
+    segunda, llamadas = asyncio.run(escenario())
+    assert segunda.buscar("b")
+    assert llamadas == []
@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+
+from services.ai_content_service import utils
+from services.ai_content_service.cache import ResponseCache
+from services.ai_content_service.prompts import Prompt
+from services.ai_content_service.schemas import Encabezados
+
+PROMPT = Prompt("Genera encabezados", "create_heading", "v1")
+DATOS = {"nombreProducto": "Café"}
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ResponseCache(enabled=True)
+    monkeypatch.setattr(utils, "response_cache", cache)
+    return cache
+
+@pytest.fixture
+def respuestas(monkeypatch):
+    """Textos que devuelve el modelo, uno por llamada, en fragmentos de 5 caracteres."""
+    pendientes, llamadas = [], []
+
+    async def stream_falso(prompt, max_tokens, endpoint=None):
+        llamadas.append(prompt)
+        texto = pendientes.pop(0)
+        for i in range(0, len(texto), 5):
+            yield texto[i:i + 5]
+
+    monkeypatch.setattr(utils, "generar_respuesta_openai_stream", stream_falso)
+    return pendientes, llamadas
+
+async def consumir(modelo=Encabezados) -> list:
+    return [evento async for evento in utils.generar_json_stream("create_heading", DATOS, PROMPT, modelo)]
+
+def resultado(eventos: list):
+    return [payload for evento, payload in eventos if evento == "resultado"]
+
+def test_resultado_valido_se_guarda_y_se_reutiliza(cache, respuestas):
+    pendientes, llamadas = respuestas
+    pendientes.append('Aquí va:\n```json\n{"encabezados": ["Uno", "Dos",]}\n```')
+
+    primera, segunda = asyncio.run(consumir()), asyncio.run(consumir())
+    assert resultado(primera) == [{"encabezados": ["Uno", "Dos"]}]
+    assert segunda == [("resultado", {"encabezados": ["Uno", "Dos"]})]
+    assert len(llamadas) == 1
+
+def test_resultado_que_no_cumple_el_modelo_no_se_guarda(cache, respuestas):
+    pendientes, llamadas = respuestas
+    pendientes.append('{"titulos": ["Uno"]}')
+    pendientes.append('{"encabezados": ["Uno"]}')
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(consumir())
+    assert error.value.status_code == 500
+    # La respuesta inválida no quedó en la caché: se vuelve a generar
+    assert resultado(asyncio.run(consumir())) == [{"encabezados": ["Uno"]}]
+    assert len(llamadas) == 2
+
+def test_entrada_de_cache_con_formato_anterior_se_regenera(cache, respuestas):
+    pendientes, llamadas = respuestas
+    pendientes.append('{"encabezados": ["Nuevo"]}')
+    politica = utils.enrutador_modelos.politica("create_heading")
+    clave = cache.clave("create_heading", DATOS, politica.principal, politica.temperatura, PROMPT.etiqueta)
+    asyncio.run(cache.guardar("create_heading", clave, {"titulos": ["Viejo"]}))
+
+    assert resultado(asyncio.run(consumir())) == [{"encabezados": ["Nuevo"]}]
+    assert len(llamadas) == 1
@@ -0,0 +1,49 @@
+import os
+from datetime import datetime
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, text
+
+import common.models  # noqa: F401 (registra todos los modelos)
+from services.document_service.routes import consulta_documentos_usuario
+from services.product_service.handlers import consulta_productos_por_usuario
+
+MIGRACIONES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend", "migrations")
+
+# (consulta que ejecuta el endpoint, índice compuesto que debe usar): primera página y página por cursor
+CONSULTAS = {
+    "listar_documentos": (consulta_documentos_usuario(1, limite=21), "ix_documentos_usuario_fecha"),
+    "listar_documentos (cursor)": (
+        consulta_documentos_usuario(1, (datetime(2026, 1, 1), 500), 21),
+        "ix_documentos_usuario_fecha",
+    ),
+    "obtener_productos_por_usuario": (consulta_productos_por_usuario(1, limit=21), "ix_productos_usuario_producto"),
+    "obtener_productos_por_usuario (cursor)": (consulta_productos_por_usuario(1, 500, 21), "ix_productos_usuario_producto"),
+}
+
+@pytest.fixture(scope="module")
+def motor(tmp_path_factory):
+    """Base SQLite nueva con todas las migraciones aplicadas (los índices vienen de ellas)."""
+    url = f"sqlite:///{tmp_path_factory.mktemp('migraciones') / 'listados.db'}"
+    config = Config()
+    config.set_main_option("script_location", MIGRACIONES)
+    config.set_main_option("sqlalchemy.url", url)
+    command.upgrade(config, "head")
+    motor = create_engine(url)
+    yield motor
+    motor.dispose()
+
+def plan(motor, consulta) -> list:
+    sql = str(consulta.compile(dialect=motor.dialect, compile_kwargs={"literal_binds": True}))
+    with motor.connect() as conexion:
+        return [fila[-1] for fila in conexion.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+@pytest.mark.parametrize("nombre", CONSULTAS)
+def test_listado_usa_su_indice_compuesto(motor, nombre):
+    consulta, indice = CONSULTAS[nombre]
+    pasos = plan(motor, consulta)
+    assert any(indice in paso for paso in pasos), pasos
+    # Ni recorrido completo de la tabla ni ordenamiento en memoria
+    assert not any(paso.startswith("SCAN ") and "USING" not in paso for paso in pasos), pasos
+    assert not any("TEMP B-TREE" in paso for paso in pasos), pasos
@@ -0,0 +1,187 @@
+import json
+import random
+import string
+import pytest
+
+from services.ai_content_service.json_repair import extraer_objeto_json, bloques_de_codigo
+
+@pytest.mark.parametrize("texto, esperado", [
+    # Bloques ``` con y sin etiqueta de lenguaje, con prosa alrededor
+    ('Claro, aquí tienes:\n```json\n{"a": 1}\n```\nEspero que sirva.', {"a": 1}),
+    ('```\n{"a": [1, 2]}\n```', {"a": [1, 2]}),
+    ('```{"a": 1}```', {"a": 1}),
+    # Bloque sin cerrar (respuesta truncada)
+    ('Respuesta:\n```json\n{"a": {"b": "c"}}', {"a": {"b": "c"}}),
+    # El bloque tiene prioridad sobre un objeto suelto en la prosa
+    ('Ejemplo {"x": 0}\n```json\n{"a": 1}\n```', {"a": 1}),
+])
+def test_bloques_de_codigo(texto, esperado):
+    assert extraer_objeto_json(texto) == esperado
+
+def test_bloques_de_codigo_quita_la_etiqueta():
+    assert bloques_de_codigo("```json\n{}\n``` y ```python\nx\n```") == ["{}\n", "x\n"]
+
+@pytest.mark.parametrize("texto, esperado", [
+    ('{"a": 1,}', {"a": 1}),
+    ('{"a": [1, 2, ], "b": {"c": 3,},}', {"a": [1, 2], "b": {"c": 3}}),
+    ('{"a": [1,\n  2,\n]\n}', {"a": [1, 2]}),
+    # Una coma dentro de una cadena no se toca
+    ('{"a": "x,}", "b": "]",}', {"a": "x,}", "b": "]"}),
+])
+def test_comas_finales(texto, esperado):
+    assert extraer_objeto_json(texto) == esperado
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("{'a': 1, 'b': 'x'}", {"a": 1, "b": "x"}),
+    ("{'lista': ['x', 'y',], 'n': null}", {"lista": ["x", "y"], "n": None}),
+    # Escape de apóstrofo y comillas dobles dentro de una cadena con comillas simples
+    ("{'a': 'it\\'s', 'b': 'dijo \"hola\"'}", {"a": "it's", "b": 'dijo "hola"'}),
+    # Un apóstrofo dentro de una cadena normal se conserva
+    ('{"a": "it\'s"}', {"a": "it's"}),
+    ('{“titulo”: “Café de altura”}', {"titulo": "Café de altura"}),
+    ('{“a”: “dijo "hola"”}', {"a": 'dijo "hola"'}),
+])
+def test_comillas_simples_y_tipograficas(texto, esperado):
+    assert extraer_objeto_json(texto) == esperado
+
+@pytest.mark.parametrize("texto, esperado", [
+    ('{"a": "sin cerrar', {"a": "sin cerrar"}),
+    ('{"a": {"b": [1, 2', {"a": {"b": [1, 2]}}),
+    ('{"a": 1, "b":', {"a": 1, "b": None}),
+    ('{"a": 1,', {"a": 1}),
+    ('{"a": "termina en escape\\', {"a": "termina en escape\\"}),
+    ("{'a': 'truncado", {"a": "truncado"}),
+])
+def test_objetos_truncados(texto, esperado):
+    assert extraer_objeto_json(texto) == esperado
+
+@pytest.mark.parametrize("texto, esperado", [
+    ('{"a": "llaves {dentro} de [cadenas]", "b": 1}', {"a": "llaves {dentro} de [cadenas]", "b": 1}),
+    ('{"a": "comilla \\" escapada }", "b": {"c": "}"}}', {"a": 'comilla " escapada }', "b": {"c": "}"}}),
+    # Un candidato inválido se salta y la búsqueda sigue después de él
+    ('Nota: {revisar} antes.\n{"a": 1}', {"a": 1}),
+    ('{"a": 1} y luego {"b": 2}', {"a": 1}),
+])
+def test_llaves_anidadas_y_varios_candidatos(texto, esperado):
+    assert extraer_objeto_json(texto) == esperado
+
+@pytest.mark.parametrize("texto", [
+    "",
+    "Sin JSON en la respuesta.",
+    "[1, 2, 3]",
+    "{nota} {otra nota}",
+    "```json\n```",
+    "}}}{{{",
+])
+def test_sin_objeto_valido_lanza_value_error(texto):
+    with pytest.raises(ValueError):
+        extraer_objeto_json(texto)
+
+# --- Fuzzing: objetos aleatorios con las mutaciones que el extractor debe reparar ---
+
+PROSA = ["Claro, aquí tienes el resultado:", "Respuesta:", "Nota: {revisar} antes de publicar.", ""]
+CIERRE = ["", "Espero que te sirva.", "```", "¿Algo más?"]
+
+def valor_aleatorio(rnd: random.Random, profundidad: int = 0):
+    tipo = rnd.choice(["str", "int", "bool", "null", "list", "dict"] if profundidad < 3 else ["str", "int"])
+    if tipo == "str":
+        alfabeto = string.ascii_letters + " áéíñ{}[],:\\\"'\n"
+        return "".join(rnd.choice(alfabeto) for _ in range(rnd.randint(0, 20)))
+    if tipo == "int":
+        return rnd.randint(-1000, 1000)
+    if tipo == "bool":
+        return rnd.random() < 0.5
+    if tipo == "null":
+        return None
+    if tipo == "list":
+        return [valor_aleatorio(rnd, profundidad + 1) for _ in range(rnd.randint(0, 4))]
+    return objeto_aleatorio(rnd, profundidad + 1)
+
+def objeto_aleatorio(rnd: random.Random, profundidad: int = 0) -> dict:
+    return {f"clave_{i}": valor_aleatorio(rnd, profundidad) for i in range(rnd.randint(1, 5))}
+
+def comas_finales(texto: str, rnd: random.Random) -> str:
+    """Agrega comas antes de los cierres que están fuera de cadenas."""
+    salida, en_cadena, escape = [], False, False
+    for c in texto:
+        if en_cadena:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                en_cadena = False
+        elif c == '"':
+            en_cadena = True
+        elif c in "}]" and salida and salida[-1] not in "{[" and rnd.random() < 0.5:
+            salida.append(",")
+        salida.append(c)
+    return "".join(salida)
+
+def comillas_tipograficas(texto: str, rnd: random.Random) -> str:
+    """Reemplaza las comillas que delimitan algunas cadenas por comillas tipográficas."""
+    salida, en_cadena, escape, tipografica = [], False, False, False
+    for c in texto:
+        if en_cadena:
+            if escape:
+                escape = False
+            elif c == "\\":
+                escape = True
+            elif c == '"':
+                en_cadena = False
+                c = "”" if tipografica else c
+        elif c == '"':
+            en_cadena = True
+            tipografica = rnd.random() < 0.3
+            c = "“" if tipografica else c
+        salida.append(c)
+    return "".join(salida)
+
+def envolver(texto: str, rnd: random.Random) -> str:
+    if rnd.random() < 0.5:
+        texto = f"```json\n{texto}\n```"
+    return f"{rnd.choice(PROSA)}\n{texto}\n{rnd.choice(CIERRE)}"
+
+@pytest.mark.parametrize("semilla", range(5))
+def test_fuzz_recupera_el_objeto_original(semilla):
+    rnd = random.Random(semilla)
+    for _ in range(300):
+        original = objeto_aleatorio(rnd)
+        texto = json.dumps(original, ensure_ascii=rnd.random() < 0.5, indent=rnd.choice([None, 2]))
+        if rnd.random() < 0.5:
+            texto = comas_finales(texto, rnd)
+        if rnd.random() < 0.3:
+            texto = comillas_tipograficas(texto, rnd)
+        texto = envolver(texto, rnd)
+        assert extraer_objeto_json(texto) == original, texto
+
+@pytest.mark.parametrize("semilla", range(5))
+def test_fuzz_texto_arbitrario_solo_lanza_value_error(semilla):
+    rnd = random.Random(semilla)
+    for _ in range(500):
+        basura = "".join(rnd.choice("{}[]\",:\\“”' ab1\n`") for _ in range(rnd.randint(0, 200)))
+        try:
+            assert isinstance(extraer_objeto_json(basura), dict)
+        except ValueError:
+            pass
+
+@pytest.mark.parametrize("texto", [
+    '[[[[[{"a": ' + "[" * 100000,
+    '{"a": ' + "[" * 100000 + "]" * 100000 + "}",
+    "```json\n" + '{"a": ' + '{"b": ' * 50000,
+])
+def test_anidamiento_profundo_lanza_value_error(texto):
+    with pytest.raises(ValueError):
+        extraer_objeto_json(texto)
+
+@pytest.mark.parametrize("semilla", range(3))
+def test_fuzz_anidamiento_aleatorio_solo_lanza_value_error(semilla):
+    rnd = random.Random(semilla)
+    for _ in range(20):
+        profundidad = rnd.randint(1, 50000)
+        abre = "".join(rnd.choice(["[", '{"k": ']) for _ in range(profundidad))
+        basura = rnd.choice(PROSA) + '\n{"a": ' + abre + rnd.choice(["", "1", '"x'])
+        try:
+            assert isinstance(extraer_objeto_json(basura), dict)
+        except ValueError:
+            pass
@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import common.models  # noqa: F401 (registra todos los modelos)
+import services.product_service.models  # noqa: F401
+from common.database.database import Base
+from common.utils.paginacion import codificar_cursor, decodificar_cursor, pagina, _b64
+from services.ai_content_service.models import Documento
+from services.auth_service.principal_cache import UsuarioActual
+from services.document_service.routes import listar_documentos
+
+def rechazado(cursor: str, listado: str = "documentos", id_usuario: int = 1) -> bool:
+    with pytest.raises(HTTPException) as error:
+        decodificar_cursor(cursor, listado, id_usuario)
+    return error.value.status_code == 400
+
+def test_ida_y_vuelta_conserva_los_valores():
+    valores = ["2026-01-01T10:00:00+00:00", 42]
+    cursor = codificar_cursor("documentos", 1, valores)
+    assert decodificar_cursor(cursor, "documentos", 1) == valores
+
+def test_firma_alterada_se_rechaza():
+    carga, firma = codificar_cursor("documentos", 1, ["2026-01-01T10:00:00", 42]).split(".")
+    otra = ("A" if firma[0] != "A" else "B") + firma[1:]
+    assert rechazado(f"{carga}.{otra}")
+    assert rechazado(carga)
+    assert rechazado(f"{carga}.")
+    assert rechazado(f".{firma}")
+
+def test_carga_alterada_se_rechaza():
+    _, firma = codificar_cursor("documentos", 1, ["2026-01-01T10:00:00", 42]).split(".")
+    carga = _b64(b'["2026-01-01T10:00:00",41]')
+    assert rechazado(f"{carga}.{firma}")
+
+def test_cursor_de_otro_usuario_se_rechaza():
+    assert rechazado(codificar_cursor("documentos", 2, ["2026-01-01T10:00:00", 42]), id_usuario=1)
+
+def test_cursor_de_otro_orden_se_rechaza():
+    # Mismo formato de valores, pero cada listado ordena por otra clave
+    por_rango = codificar_cursor("busqueda:aaaa", 1, [0.5, 42])
+    assert rechazado(por_rango, listado="documentos")
+    assert rechazado(por_rango, listado="busqueda:bbbb")
+    assert rechazado(codificar_cursor("productos", 1, [42]), listado="documentos")
+
+def test_pagina_usa_la_fila_extra_solo_para_saber_si_hay_mas():
+    assert pagina([1, 2, 3], 2, str) == {"items": [1, 2], "next_cursor": "2"}
+    assert pagina([1, 2], 2, str) == {"items": [1, 2], "next_cursor": None}
+    assert pagina([], 2, str) == {"items": [], "next_cursor": None}
+
+@pytest.fixture
+def sesiones(tmp_path):
+    """Base SQLite nueva con documentos del usuario 1 que comparten fecha_creacion."""
+    motor = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'paginas.db'}")
+    fabrica = async_sessionmaker(motor, class_=AsyncSession, expire_on_commit=False)
+    fechas = [datetime(2026, 1, 2)] * 2 + [datetime(2026, 1, 1)] * 5 + [datetime(2025, 12, 31)]
+
+    async def preparar():
+        async with motor.begin() as conexion:
+            await conexion.run_sync(Base.metadata.create_all)
+        async with fabrica() as db:
+            for fecha in fechas:
+                db.add(Documento(tipo_documento="t", contenido={}, id_usuario=1, fecha_creacion=fecha))
+            db.add(Documento(tipo_documento="t", contenido={}, id_usuario=2, fecha_creacion=fechas[3]))
+            await db.commit()
+
+    asyncio.run(preparar())
+    yield fabrica
+    asyncio.run(motor.dispose())
+
+def test_empates_en_la_fecha_no_repiten_ni_saltan_documentos(sesiones):
+    usuario = UsuarioActual(1, "a@b.com", "A")
+
+    async def recorrer():
+        vistos, cursor = [], None
+        async with sesiones() as db:
+            while True:
+                respuesta = await listar_documentos(cursor=cursor, limit=2, fields=None, db=db, current_user=usuario)
+                vistos.extend((d.fecha_creacion, d.id_documento) for d in respuesta["items"])
+                cursor = respuesta["next_cursor"]
+                if cursor is None:
+                    return vistos
+
+    vistos = asyncio.run(recorrer())
+    assert len(vistos) == 8
+    assert len(set(vistos)) == 8
+    assert vistos == sorted(vistos, reverse=True)
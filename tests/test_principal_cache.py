@@ -0,0 +1,154 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import common.models  # noqa: F401 (registra todos los modelos)
+import services.product_service.models  # noqa: F401
+from common.database.database import Base
+from common.models.usuario import Usuario, Cuenta
+from common.schemas.usuario import UsuarioUpdate
+from common.utils import token_verifier
+from common.utils.session_manager import SessionManager
+from common.utils.token_verifier import RevocationList, BloomFilter, digest_token
+from services.auth_service import security
+from services.auth_service.principal_cache import PrincipalCache, UsuarioActual
+from services.user_service import routes as user_routes
+
+pytestmark = pytest.mark.usefixtures("redis_falso")
+
+@pytest.fixture
+def auth(monkeypatch):
+    """Caché de usuarios y lista de revocaciones nuevas en todos los módulos que las usan."""
+    cache, revocaciones = PrincipalCache(), RevocationList()
+    for modulo in (security, user_routes):
+        monkeypatch.setattr(modulo, "principal_cache", cache)
+        monkeypatch.setattr(modulo, "revocaciones", revocaciones)
+    return cache, revocaciones
+
+@pytest.fixture
+def sesiones(tmp_path):
+    """Base SQLite nueva con el usuario 1."""
+    motor = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'auth.db'}")
+    fabrica = async_sessionmaker(motor, class_=AsyncSession, expire_on_commit=False)
+
+    async def preparar():
+        async with motor.begin() as conexion:
+            await conexion.run_sync(Base.metadata.create_all)
+        async with fabrica() as db:
+            db.add(Usuario(id_usuario=1, nombre="Ana", email="a@b.com", contraseña="x"))
+            db.add(Cuenta(id_usuario=1, saldo=10.0))
+            await db.commit()
+
+    asyncio.run(preparar())
+    yield fabrica
+    asyncio.run(motor.dispose())
+
+async def iniciar_sesion() -> tuple:
+    token = security.create_access_token({"sub": "a@b.com"})
+    return await SessionManager().create_session(1, token), token
+
+async def usuario_actual(fabrica, session_id: str) -> UsuarioActual:
+    async with fabrica() as db:
+        return await security.get_current_user(SimpleNamespace(cookies={"session_id": session_id}), db, SessionManager())
+
+def test_token_revocado_se_rechaza_aunque_el_usuario_este_en_cache(auth, sesiones):
+    cache, revocaciones = auth
+
+    async def escenario():
+        session_id, token = await iniciar_sesion()
+        await usuario_actual(sesiones, session_id)
+        assert cache.obtener(session_id, digest_token(token)) is not None
+        await revocaciones.revocar(token)
+        await usuario_actual(sesiones, session_id)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(escenario())
+    assert (error.value.status_code, error.value.detail) == (401, "Token revocado.")
+
+def test_revocacion_de_otro_worker_llega_con_la_sincronizacion(auth, sesiones):
+    _, revocaciones = auth
+    otro_worker = RevocationList()
+
+    async def escenario():
+        session_id, token = await iniciar_sesion()
+        await revocaciones.sincronizar()
+        await usuario_actual(sesiones, session_id)
+        await otro_worker.revocar(token)
+        await revocaciones.sincronizar()
+        await usuario_actual(sesiones, session_id)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(escenario())
+    assert error.value.detail == "Token revocado."
+
+def test_falso_positivo_del_filtro_se_confirma_en_redis(monkeypatch):
+    # Un filtro de 8 bits queda lleno con pocas huellas: cualquier otra da positivo
+    monkeypatch.setattr(token_verifier, "BloomFilter", lambda: BloomFilter(bits=8, hashes=1))
+    revocaciones = RevocationList()
+    revocado, otro = digest_token("revocado"), digest_token("otro")
+
+    async def escenario():
+        for i in range(64):
+            revocaciones.agregar_local(digest_token(f"relleno-{i}"))
+        await revocaciones.revocar("revocado")
+        assert revocaciones.posiblemente_revocado(otro)
+        return await revocaciones.esta_revocado(revocado), await revocaciones.esta_revocado(otro)
+
+    assert asyncio.run(escenario()) == (True, False)
+
+def test_actualizar_el_usuario_invalida_su_cache(auth, sesiones):
+    cache, _ = auth
+
+    async def escenario():
+        session_id, token = await iniciar_sesion()
+        antes = await usuario_actual(sesiones, session_id)
+        async with sesiones() as db:
+            await user_routes.actualizar_usuario(1, UsuarioUpdate(nombre="Ana María"), antes, db)
+        en_cache = cache.obtener(session_id, digest_token(token))
+        return antes, en_cache, await usuario_actual(sesiones, session_id)
+
+    antes, en_cache, despues = asyncio.run(escenario())
+    assert antes.nombre == "Ana"
+    assert en_cache is None
+    assert despues.nombre == "Ana María"
+
+def test_eliminar_el_usuario_invalida_su_cache_y_sus_sesiones(auth, sesiones):
+    cache, revocaciones = auth
+
+    async def escenario():
+        session_id, token = await iniciar_sesion()
+        usuario = await usuario_actual(sesiones, session_id)
+        async with sesiones() as db:
+            await user_routes.eliminar_usuario(1, usuario, db, SessionManager())
+        return (
+            cache.obtener(session_id, digest_token(token)),
+            await revocaciones.esta_revocado(digest_token(token)),
+            session_id,
+        )
+
+    en_cache, revocado, session_id = asyncio.run(escenario())
+    assert en_cache is None
+    assert revocado
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(usuario_actual(sesiones, session_id))
+    assert error.value.detail == "Sesión inválida o expirada."
+
+def test_la_invalidacion_llega_a_otro_worker_por_pubsub():
+    local, remota = PrincipalCache(), PrincipalCache()
+    usuario = UsuarioActual(1, "a@b.com", "Ana")
+
+    async def escenario():
+        remota.guardar("s1", "h1", usuario)
+        remota.iniciar_listener()
+        await asyncio.sleep(0.1)  # Que el listener alcance a suscribirse
+        await local.invalidar(id_usuario=1)
+        for _ in range(50):
+            if remota.obtener("s1", "h1") is None:
+                break
+            await asyncio.sleep(0.02)
+        await remota.detener_listener()
+        return remota.obtener("s1", "h1")
+
+    assert asyncio.run(escenario()) is None
@@ -0,0 +1,54 @@
+import asyncio
+import time
+import pytest
+from fastapi import HTTPException
+
+from services.ai_content_service.rate_limiter import RateLimiter
+
+pytestmark = pytest.mark.usefixtures("redis_falso")
+
+def test_la_espera_del_turno_respeta_el_plazo():
+    # 6000 TPM = 100 tokens/s: con el bucket vacío, la cabeza de la cola duerme ~1 s
+    limitador = RateLimiter(rpm=600, tpm=6000, nombre="prueba")
+
+    async def escenario():
+        await limitador.adquirir(6000)
+        cabeza = asyncio.create_task(limitador.adquirir(100, time.monotonic() + 3))
+        await asyncio.sleep(0.05)
+        inicio = time.monotonic()
+        with pytest.raises(HTTPException) as error:
+            await limitador.adquirir(10, time.monotonic() + 0.2)
+        transcurrido = time.monotonic() - inicio
+        return error.value, transcurrido, await cabeza
+
+    error, transcurrido, reservados = asyncio.run(escenario())
+    assert error.status_code == 503
+    assert transcurrido < 0.5
+    assert reservados == 100
+
+def test_reserva_devuelve_los_intentos_fallidos():
+    limitador = RateLimiter(rpm=600, tpm=6000, nombre="prueba")
+
+    async def escenario():
+        reserva = limitador.reserva(1000)
+        await reserva.adquirir()  # intento fallido
+        await reserva.adquirir()  # intento exitoso
+        antes = (await limitador.niveles())["tokens_disponibles"]
+        await reserva.liquidar(300)
+        return antes, (await limitador.niveles())["tokens_disponibles"], reserva.reservados
+
+    antes, despues, pendientes = asyncio.run(escenario())
+    assert antes == pytest.approx(4000, abs=5)
+    assert despues == pytest.approx(5700, abs=5)
+    assert pendientes == 0
+
+def test_reserva_sin_uso_devuelve_todo():
+    limitador = RateLimiter(rpm=600, tpm=6000, nombre="prueba")
+
+    async def escenario():
+        reserva = limitador.reserva(1000)
+        await reserva.adquirir()
+        await reserva.liquidar()
+        return (await limitador.niveles())["tokens_disponibles"]
+
+    assert asyncio.run(escenario()) == pytest.approx(6000, abs=5)
@@ -0,0 +1,109 @@
+import asyncio
+import time
+import httpx
+import openai
+import pytest
+from fastapi import HTTPException
+
+from services.ai_content_service.resilience import (
+    CircuitBreaker,
+    PoliticaResiliencia,
+    CERRADO,
+    SEMIABIERTO,
+    ABIERTO,
+)
+
+def error_http(clase, codigo: int):
+    respuesta = httpx.Response(codigo, request=httpx.Request("POST", "http://openai/v1/chat/completions"))
+    return clase(f"error {codigo}", response=respuesta, body=None)
+
+def llamada_que_falla(errores: list, resultado="ok"):
+    """Corrutina que lanza los errores de `errores` en orden y luego devuelve `resultado`."""
+    llamadas = []
+
+    async def funcion():
+        llamadas.append(1)
+        if errores:
+            raise errores.pop(0)
+        return resultado
+
+    return funcion, llamadas
+
+def test_el_breaker_abre_al_llegar_a_la_tasa_con_el_minimo_de_llamadas():
+    breaker = CircuitBreaker("prueba", error_rate=0.5, min_calls=4, window=30, cooldown=30)
+    for fallo in (True, True, True):
+        breaker.registrar(fallo)
+    # 100 % de errores, pero con menos de min_calls el circuito sigue cerrado
+    assert breaker.estado == CERRADO
+    assert breaker.permitir()
+    breaker.registrar(False)  # 3 de 4: al llegar a min_calls se evalúa la tasa
+    assert breaker.estado == ABIERTO
+
+def test_el_breaker_abre_justo_en_la_tasa_configurada():
+    breaker = CircuitBreaker("prueba", error_rate=0.5, min_calls=4, window=30, cooldown=30)
+    for fallo in (False, False, True):
+        breaker.registrar(fallo)
+    assert breaker.estado == CERRADO
+    breaker.registrar(True)  # 2 de 4 = 0.5
+    assert breaker.estado == ABIERTO
+    assert not breaker.permitir()
+    assert breaker.reintentar_en() > 29
+
+def test_semiabierto_tras_el_cooldown_deja_pasar_una_sola_prueba():
+    breaker = CircuitBreaker("prueba", error_rate=0.5, min_calls=2, window=30, cooldown=0.05)
+    breaker.registrar(True)
+    breaker.registrar(True)
+    assert not breaker.permitir()
+
+    time.sleep(0.06)
+    assert breaker.permitir()
+    assert breaker.estado == SEMIABIERTO
+    assert not breaker.permitir()  # La prueba sigue en curso
+
+    breaker.registrar(fallo=False)
+    assert breaker.estado == CERRADO
+    assert breaker.permitir()
+
+def test_prueba_fallida_vuelve_a_abrir_el_circuito():
+    breaker = CircuitBreaker("prueba", error_rate=0.5, min_calls=2, window=30, cooldown=0.05)
+    breaker.registrar(True)
+    breaker.registrar(True)
+    time.sleep(0.06)
+    assert breaker.permitir()
+
+    breaker.registrar(fallo=True)
+    assert breaker.estado == ABIERTO
+    assert not breaker.permitir()
+
+def test_errores_4xx_no_se_reintentan_ni_cuentan_para_el_breaker():
+    politica = PoliticaResiliencia("prueba", max_retries=3, backoff_base=0.001)
+    breaker = CircuitBreaker("prueba", error_rate=0.5, min_calls=1)
+    funcion, llamadas = llamada_que_falla([error_http(openai.BadRequestError, 400)])
+
+    with pytest.raises(openai.BadRequestError):
+        asyncio.run(politica.ejecutar(funcion, breaker, limite=time.monotonic() + 5))
+    assert len(llamadas) == 1
+    assert breaker.estado == CERRADO
+
+def test_errores_429_y_5xx_se_reintentan():
+    politica = PoliticaResiliencia("prueba", max_retries=3, backoff_base=0.001)
+    breaker = CircuitBreaker("prueba", error_rate=0.9, min_calls=10)
+    funcion, llamadas = llamada_que_falla([
+        error_http(openai.RateLimitError, 429),
+        error_http(openai.InternalServerError, 500),
+    ])
+
+    assert asyncio.run(politica.ejecutar(funcion, breaker, limite=time.monotonic() + 5)) == "ok"
+    assert len(llamadas) == 3
+
+def test_circuito_abierto_rechaza_sin_llamar():
+    politica = PoliticaResiliencia("prueba")
+    breaker = CircuitBreaker("prueba", error_rate=0.5, min_calls=1, cooldown=30)
+    breaker.registrar(True)
+    funcion, llamadas = llamada_que_falla([])
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(politica.ejecutar(funcion, breaker))
+    assert error.value.status_code == 503
+    assert int(error.value.headers["Retry-After"]) >= 29
+    assert llamadas == []
@@ -0,0 +1,105 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+
+from services.ai_content_service import router
+from services.ai_content_service.router import EnrutadorModelos, PoliticaModelo, SANO, LENTO, FALLANDO
+
+ENDPOINT = "create_heading"
+
+@pytest.fixture
+def enrutador():
+    """Router con un principal y un respaldo (SLO de 50 ms) y sin sondeos salvo que el test los pida."""
+    enrutador = EnrutadorModelos(min_muestras=5, max_error_rate=0.2, probe_rate=0.0, window=60)
+    enrutador._politicas[ENDPOINT] = PoliticaModelo(("principal", "respaldo"), 0.05, 0.7)
+    return enrutador
+
+def modelo_que_anota(llamados: list, lentos=()):
+    async def crear(modelo):
+        llamados.append(modelo)
+        if modelo in lentos:
+            await asyncio.sleep(1)
+        return modelo
+    return crear
+
+def abrir_circuito(enrutador, modelo):
+    breaker = enrutador.breaker(ENDPOINT, modelo)
+    for _ in range(breaker.min_calls):
+        breaker.registrar(fallo=True)
+
+def degradar_por_latencia(enrutador, modelo, latencia=0.2):
+    for _ in range(enrutador.min_muestras):
+        enrutador.registrar(ENDPOINT, modelo, latencia)
+
+def test_circuito_abierto_del_principal_pasa_al_respaldo(enrutador):
+    abrir_circuito(enrutador, "principal")
+    llamados = []
+
+    assert asyncio.run(enrutador.ejecutar(ENDPOINT, modelo_que_anota(llamados))) == "respaldo"
+    assert llamados == ["respaldo"]
+
+def test_p95_sobre_el_slo_pone_al_principal_detras_del_respaldo(enrutador):
+    degradar_por_latencia(enrutador, "principal")
+    llamados = []
+
+    assert enrutador.salud(ENDPOINT, "principal") == LENTO
+    assert enrutador.candidatos(ENDPOINT) == ["respaldo", "principal"]
+    assert asyncio.run(enrutador.ejecutar(ENDPOINT, modelo_que_anota(llamados))) == "respaldo"
+    assert llamados == ["respaldo"]
+
+def test_errores_sobre_el_maximo_degradan_al_modelo(enrutador):
+    for _ in range(enrutador.min_muestras):
+        enrutador.registrar(ENDPOINT, "principal", fallo=True)
+
+    assert enrutador.salud(ENDPOINT, "principal") == FALLANDO
+    assert enrutador.candidatos(ENDPOINT) == ["respaldo", "principal"]
+
+def test_con_pocas_muestras_el_modelo_sigue_sano(enrutador):
+    for _ in range(enrutador.min_muestras - 1):
+        enrutador.registrar(ENDPOINT, "principal", 0.2)
+
+    assert enrutador.salud(ENDPOINT, "principal") == SANO
+    assert enrutador.candidatos(ENDPOINT) == ["principal", "respaldo"]
+
+def test_intento_que_tarda_mas_del_doble_del_slo_pasa_al_respaldo(enrutador):
+    llamados = []
+
+    resultado = asyncio.run(enrutador.ejecutar(ENDPOINT, modelo_que_anota(llamados, lentos={"principal"})))
+    assert resultado == "respaldo"
+    assert llamados == ["principal", "respaldo"]
+    # El corte cuenta como un intento lento y fallido del principal
+    muestras, p95, tasa = enrutador._estadisticas_de(ENDPOINT, "principal").resumen()
+    assert (muestras, tasa) == (1, 1.0)
+    assert p95 >= 0.1
+
+def test_sondeo_devuelve_trafico_al_modelo_degradado(enrutador, monkeypatch):
+    enrutador.probe_rate = 0.1
+    degradar_por_latencia(enrutador, "principal")
+
+    monkeypatch.setattr(router.random, "random", lambda: 0.05)
+    assert enrutador.candidatos(ENDPOINT) == ["principal", "respaldo"]
+    monkeypatch.setattr(router.random, "random", lambda: 0.5)
+    assert enrutador.candidatos(ENDPOINT) == ["respaldo", "principal"]
+
+def test_el_modelo_sondeado_recupera_su_lugar(enrutador):
+    enrutador.probe_rate = 1.0
+    degradar_por_latencia(enrutador, "principal")
+    llamados = []
+    crear = modelo_que_anota(llamados)
+
+    # Cada sondeo exitoso y rápido baja el p95 hasta que el principal vuelve a estar sano
+    for _ in range(100):
+        asyncio.run(enrutador.ejecutar(ENDPOINT, crear))
+    assert set(llamados) == {"principal"}
+    assert enrutador.salud(ENDPOINT, "principal") == SANO
+
+def test_todos_los_modelos_no_disponibles_responde_503(enrutador):
+    abrir_circuito(enrutador, "principal")
+    abrir_circuito(enrutador, "respaldo")
+    llamados = []
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(enrutador.ejecutar(ENDPOINT, modelo_que_anota(llamados)))
+    assert error.value.status_code == 503
+    assert "Retry-After" in error.value.headers
+    assert llamados == []
@@ -0,0 +1,45 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+
+from common.utils.session_manager import SessionManager, SESSION_TIMEOUT
+from services.auth_service.security import create_access_token, renovar_token
+
+pytestmark = pytest.mark.usefixtures("redis_falso")
+
+def test_renovar_una_sesion_activa_reemplaza_el_jwt_y_su_ttl(redis_falso):
+    async def escenario():
+        sesiones = SessionManager()
+        session_id = await sesiones.create_session(1, "viejo")
+        await redis_falso.expire(f"session:{session_id}", 5)
+        actualizada = await sesiones.update_jwt(session_id, "nuevo")
+        return actualizada, await redis_falso.hgetall(f"session:{session_id}"), await redis_falso.ttl(f"session:{session_id}")
+
+    actualizada, datos, ttl = asyncio.run(escenario())
+    assert actualizada is True
+    assert datos == {"jwt": "nuevo", "id_usuario": "1"}
+    assert ttl > SESSION_TIMEOUT.total_seconds() - 5
+
+def test_renovar_despues_de_expirar_no_recrea_la_sesion(redis_falso):
+    async def escenario():
+        sesiones = SessionManager()
+        session_id = await sesiones.create_session(1, "viejo")
+        await redis_falso.delete(f"session:{session_id}")  # expiró entre get_jwt y la renovación
+        actualizada = await sesiones.update_jwt(session_id, "nuevo")
+        existe = await redis_falso.exists(f"session:{session_id}")
+        return actualizada, existe, await sesiones.delete_session(session_id)
+
+    assert asyncio.run(escenario()) == (False, 0, None)
+
+def test_renovar_token_de_sesion_expirada_responde_401(redis_falso):
+    token = create_access_token({"sub": "a@b.com"})
+
+    async def escenario():
+        sesiones = SessionManager()
+        session_id = await sesiones.create_session(1, token)
+        await redis_falso.delete(f"session:{session_id}")
+        await renovar_token(sesiones, session_id, token)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(escenario())
+    assert error.value.status_code == 401
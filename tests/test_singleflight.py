@@ -0,0 +1,66 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+
+from services.ai_content_service.singleflight import SingleFlight
+
+pytestmark = pytest.mark.usefixtures("redis_falso")
+
+def trabajo(llamadas: list, valor: str, demora: float = 0.1, error: Exception = None):
+    async def funcion():
+        llamadas.append(valor)
+        await asyncio.sleep(demora)
+        if error is not None:
+            raise error
+        return valor
+    return funcion
+
+def test_seguidor_recibe_el_resultado_del_lider():
+    async def escenario():
+        lider, seguidor, llamadas = SingleFlight(wait_timeout=2), SingleFlight(wait_timeout=2), []
+        resultados = await asyncio.gather(
+            lider.ejecutar("h", trabajo(llamadas, "lider")),
+            seguidor.ejecutar("h", trabajo(llamadas, "seguidor")),
+        )
+        return resultados, llamadas
+
+    resultados, llamadas = asyncio.run(escenario())
+    assert resultados == ["lider", "lider"]
+    assert llamadas == ["lider"]
+
+def test_un_vuelo_posterior_no_reutiliza_el_resultado_anterior():
+    async def escenario():
+        a, b, llamadas = SingleFlight(wait_timeout=2), SingleFlight(wait_timeout=2), []
+        await a.ejecutar("h", trabajo(llamadas, "primero", demora=0))
+        resultados = await asyncio.gather(
+            a.ejecutar("h", trabajo(llamadas, "segundo")),
+            b.ejecutar("h", trabajo(llamadas, "segundo-b")),
+        )
+        return resultados, llamadas
+
+    resultados, llamadas = asyncio.run(escenario())
+    assert resultados == ["segundo", "segundo"]
+    assert llamadas == ["primero", "segundo"]
+
+def test_seguidor_recibe_el_mismo_error_http_que_el_lider():
+    cuota = HTTPException(status_code=429, detail="Cuota agotada.", headers={"Retry-After": "7"})
+
+    async def escenario():
+        lider, seguidor, llamadas = SingleFlight(wait_timeout=2), SingleFlight(wait_timeout=2), []
+        return await asyncio.gather(
+            lider.ejecutar("h", trabajo(llamadas, "lider", error=cuota)),
+            seguidor.ejecutar("h", trabajo(llamadas, "seguidor")),
+            return_exceptions=True,
+        )
+
+    errores = asyncio.run(escenario())
+    assert [(e.status_code, e.detail, e.headers) for e in errores] == [(429, "Cuota agotada.", {"Retry-After": "7"})] * 2
+
+def test_un_error_anterior_no_afecta_al_siguiente_vuelo():
+    async def escenario():
+        a, b, llamadas = SingleFlight(wait_timeout=2), SingleFlight(wait_timeout=2), []
+        with pytest.raises(HTTPException):
+            await a.ejecutar("h", trabajo(llamadas, "falla", demora=0, error=HTTPException(status_code=503)))
+        return await b.ejecutar("h", trabajo(llamadas, "ok", demora=0))
+
+    assert asyncio.run(escenario()) == "ok"
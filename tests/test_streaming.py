@@ -0,0 +1,65 @@
+import json
+import random
+import pytest
+
+from services.ai_content_service.streaming import ParserJSONIncremental, formato_sse
+
+RESPUESTA = (
+    'Aquí tienes:\n```json\n'
+    '{"encabezados": ["Uno \\"dos\\"", "Tres\\nlíneas", 4, true, {"a": [1, 2]}], "otro": [null]}'
+    '\n```'
+)
+ESPERADO = [
+    ("encabezados", 'Uno "dos"'),
+    ("encabezados", "Tres\nlíneas"),
+    ("encabezados", 4),
+    ("encabezados", True),
+    ("a", 1),
+    ("a", 2),
+    ("encabezados", {"a": [1, 2]}),
+    ("otro", None),
+]
+
+def alimentar(fragmentos) -> list:
+    parser = ParserJSONIncremental()
+    return [completado for fragmento in fragmentos for completado in parser.alimentar(fragmento)]
+
+def test_texto_completo_de_una_vez():
+    assert alimentar([RESPUESTA]) == ESPERADO
+
+def test_un_caracter_por_fragmento():
+    assert alimentar(list(RESPUESTA)) == ESPERADO
+
+@pytest.mark.parametrize("semilla", range(20))
+def test_cortes_aleatorios_dan_el_mismo_resultado(semilla):
+    azar = random.Random(semilla)
+    cortes = sorted(azar.sample(range(1, len(RESPUESTA)), azar.randint(1, 30)))
+    fragmentos = [RESPUESTA[i:j] for i, j in zip([0, *cortes], [*cortes, len(RESPUESTA)])]
+    assert alimentar(fragmentos) == ESPERADO
+
+@pytest.mark.parametrize("fragmentos, esperado", [
+    (['{"a": ["ca', 'fé"]}'], [("a", "café")]),                    # a mitad de una cadena
+    (['{"a": ["x\\', 'n y"]}'], [("a", "x\n y")]),                  # a mitad de un escape
+    (['{"a": ["x\\', '"y"]}'], [("a", 'x"y')]),                     # comilla escapada partida
+    (['{"encab', 'ezados": ["Uno"]}'], [("encabezados", "Uno")]),   # a mitad de una clave
+    (['{"a": [12', '34, 5]}'], [("a", 1234), ("a", 5)]),            # a mitad de un número
+])
+def test_cortes_en_lugares_delicados(fragmentos, esperado):
+    assert alimentar(fragmentos) == esperado
+
+def test_elementos_se_emiten_antes_de_cerrar_el_arreglo():
+    parser = ParserJSONIncremental()
+    assert parser.alimentar('{"a": ["uno", {"b": 1}') == [("a", "uno"), ("a", {"b": 1})]
+    assert parser.alimentar(', 3') == []  # El escalar sigue abierto hasta el separador
+    assert parser.alimentar(']}') == [("a", 3)]
+
+def test_entrada_truncada_solo_emite_los_elementos_completos():
+    assert alimentar(['{"a": ["uno", "do']) == [("a", "uno")]
+    assert alimentar(['{"a": [{"b": 1}, {"b": ']) == [("a", {"b": 1})]
+
+def test_texto_despues_del_objeto_se_ignora():
+    assert alimentar(['{"a": [1]}', ' y además ["b"]']) == [("a", 1)]
+
+def test_formato_sse():
+    assert formato_sse("item", {"texto": "café"}) == 'event: item\ndata: {"texto": "café"}\n\n'
+    assert json.loads(formato_sse("token", "a\nb").split("data: ", 1)[1]) == "a\nb"
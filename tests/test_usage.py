@@ -0,0 +1,164 @@
+import asyncio
+import json
+import time
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import common.models  # noqa: F401 (registra todos los modelos)
+import services.product_service.models  # noqa: F401
+from common.database.database import Base
+from common.models.usuario import Usuario, Cuenta
+from common.models.uso import RegistroUso
+from services.ai_content_service import usage, utils
+from services.auth_service.principal_cache import UsuarioActual
+from services.ai_content_service.usage import LibroUso, PENDIENTES_KEY, LIQUIDADORES_KEY, PROCESANDO_PREFIX, LEASE_PREFIX
+
+pytestmark = pytest.mark.usefixtures("redis_falso")
+
+@pytest.fixture
+def sesiones(tmp_path, monkeypatch):
+    """Base SQLite nueva con un usuario de saldo 10; `usage` la usa en lugar de la configurada."""
+    motor = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'uso.db'}")
+
+    async def preparar():
+        async with motor.begin() as conexion:
+            await conexion.run_sync(Base.metadata.create_all)
+        async with fabrica() as db:
+            db.add(Usuario(id_usuario=1, nombre="A", email="a@b.com", contraseña="x"))
+            db.add(Cuenta(id_usuario=1, saldo=10.0))
+            await db.commit()
+
+    fabrica = async_sessionmaker(motor, class_=AsyncSession, expire_on_commit=False)
+    asyncio.run(preparar())
+    monkeypatch.setattr(usage, "AsyncSessionLocal", fabrica)
+    yield fabrica
+    asyncio.run(motor.dispose())
+
+def registro(id_evento: str, costo: float = 1.0) -> str:
+    return json.dumps({
+        "id": id_evento, "id_usuario": 1, "endpoint": "create_heading", "modelo": "m",
+        "tokens_prompt": 10, "tokens_respuesta": 5, "costo": costo, "fecha": time.time(),
+    })
+
+async def filas_y_saldo(fabrica):
+    async with fabrica() as db:
+        filas = (await db.execute(select(func.count()).select_from(RegistroUso))).scalar_one()
+        saldo = (await db.execute(select(Cuenta.saldo).where(Cuenta.id_usuario == 1))).scalar_one()
+    return filas, saldo
+
+def test_commit_fallido_deja_el_lote_y_se_reintenta(redis_falso, sesiones, monkeypatch):
+    libro = LibroUso(lote=10)
+
+    class SesionQueFalla(AsyncSession):
+        async def commit(self):
+            raise RuntimeError("base caída")
+
+    async def escenario():
+        await redis_falso.rpush(PENDIENTES_KEY, registro("e1"), registro("e2"))
+        monkeypatch.setattr(usage, "AsyncSessionLocal", async_sessionmaker(sesiones.kw["bind"], class_=SesionQueFalla))
+        with pytest.raises(RuntimeError):
+            await libro.liquidar()
+        en_proceso = await redis_falso.lrange(libro._procesando, 0, -1)
+        monkeypatch.setattr(usage, "AsyncSessionLocal", sesiones)
+        liquidados = await libro.liquidar()
+        return en_proceso, liquidados, await redis_falso.exists(libro._procesando), await filas_y_saldo(sesiones)
+
+    en_proceso, liquidados, sigue, (filas, saldo) = asyncio.run(escenario())
+    assert len(en_proceso) == 2
+    assert liquidados == 2
+    assert not sigue
+    assert (filas, saldo) == (2, pytest.approx(8.0))
+
+def test_reliquidar_un_lote_no_duplica_ni_descuenta_dos_veces(redis_falso, sesiones):
+    libro = LibroUso(lote=10)
+
+    async def escenario():
+        await redis_falso.rpush(PENDIENTES_KEY, registro("e1"), registro("e2"))
+        await libro.liquidar()
+        # El proceso murió entre el commit y el DEL: el lote vuelve a la cola
+        await redis_falso.rpush(PENDIENTES_KEY, registro("e1"), registro("e2"), registro("e3"))
+        await libro.liquidar()
+        return await filas_y_saldo(sesiones)
+
+    filas, saldo = asyncio.run(escenario())
+    assert (filas, saldo) == (3, pytest.approx(7.0))
+
+def test_recupera_solo_los_lotes_sin_lease(redis_falso, sesiones):
+    libro = LibroUso(lote=10)
+
+    async def escenario():
+        for dueno, vivo in (("caido", False), ("vivo", True)):
+            procesando = f"{PROCESANDO_PREFIX}{dueno}"
+            await redis_falso.sadd(LIQUIDADORES_KEY, procesando)
+            await redis_falso.rpush(procesando, registro(f"{dueno}-1"), registro(f"{dueno}-2"))
+            if vivo:
+                await redis_falso.set(f"{LEASE_PREFIX}{dueno}", 1, ex=60)
+        await redis_falso.rpush(PENDIENTES_KEY, registro("nuevo"))
+        recuperados = await libro.recuperar_huerfanos()
+        return (
+            recuperados,
+            [json.loads(e)["id"] for e in await redis_falso.lrange(PENDIENTES_KEY, 0, -1)],
+            await redis_falso.smembers(LIQUIDADORES_KEY),
+        )
+
+    recuperados, cola, liquidadores = asyncio.run(escenario())
+    assert recuperados == 2
+    assert cola == ["caido-1", "caido-2", "nuevo"]
+    assert liquidadores == {f"{PROCESANDO_PREFIX}vivo"}
+
+# --- Facturación de llamadas compartidas por single-flight ---
+
+def llamada_compartida(monkeypatch, llamadas: list, demora: float = 0.1):
+    async def llamar(mensajes, max_tokens, formato=None, endpoint=None):
+        llamadas.append(mensajes)
+        await asyncio.sleep(demora)
+        return {"texto": "ok", "uso": {"tokens_prompt": 30, "tokens_respuesta": 12, "modelo": "m"}}
+
+    monkeypatch.setattr(utils, "_llamar_openai", llamar)
+
+def libro_que_anota(facturado: dict) -> LibroUso:
+    libro = LibroUso()
+
+    async def registrar(id_usuario, endpoint, consumo):
+        facturado[id_usuario] = consumo.total
+
+    libro.registrar = registrar
+    return libro
+
+def test_cada_usuario_que_comparte_la_llamada_la_paga(monkeypatch):
+    llamadas, facturado = [], {}
+    llamada_compartida(monkeypatch, llamadas)
+    libro = libro_que_anota(facturado)
+
+    async def generar(id_usuario: int):
+        async with libro.medir(UsuarioActual(id_usuario, f"{id_usuario}@b.com", "U"), "create_heading", verificar=False):
+            return await utils.generar_respuesta_openai("mismo prompt", endpoint="create_heading")
+
+    async def escenario():
+        return await asyncio.gather(generar(1), generar(2))
+
+    assert asyncio.run(escenario()) == ["ok", "ok"]
+    assert len(llamadas) == 1
+    assert facturado == {1: 42, 2: 42}
+
+def test_si_se_cancela_quien_inicio_la_llamada_el_resto_igual_paga(monkeypatch):
+    llamadas, facturado = [], {}
+    llamada_compartida(monkeypatch, llamadas, demora=0.2)
+    libro = libro_que_anota(facturado)
+
+    async def generar(id_usuario: int):
+        async with libro.medir(UsuarioActual(id_usuario, f"{id_usuario}@b.com", "U"), "create_heading", verificar=False):
+            return await utils.generar_respuesta_openai("mismo prompt", endpoint="create_heading")
+
+    async def escenario():
+        primero = asyncio.create_task(generar(1))
+        await asyncio.sleep(0.05)
+        segundo = asyncio.create_task(generar(2))
+        await asyncio.sleep(0.05)
+        primero.cancel()
+        return await segundo, primero.cancelled()
+
+    assert asyncio.run(escenario()) == ("ok", True)
+    assert len(llamadas) == 1
+    assert facturado == {2: 42}